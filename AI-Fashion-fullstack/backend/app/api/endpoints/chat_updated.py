@@ -1,18 +1,19 @@
 """Updated chat endpoints with user authentication and personalization."""
 
 from fastapi import APIRouter, Request, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
 from app.services.chat_service import ChatService
-from app.services.search_engine import FashionSearchEngine
+from app.services.async_search import get_async_search_engine
 from app.services.rag_service import FashionRAGPipeline
 from app.core.agent import FashionAgent
 from app.core.memory import ConversationMemory
 from app.core.personalization import PersonalizationEngine
+from app.core.catalog import get_catalog
 from app.middleware.auth_middleware import get_current_user, get_optional_user
 from app.models.auth_models import UserResponse
 from app.database import get_favorites_collection, get_history_collection, get_profiles_collection
-import pandas as pd
 from datetime import datetime
 import logging
 
@@ -26,17 +27,31 @@ rag_pipeline = FashionRAGPipeline()
 _agents = {}
 _memories = {}
 _personalization_engine = None
+_personalization_initialized = False
 
 
-def get_personalization_engine():
-    """Get or initialize personalization engine."""
-    global _personalization_engine
-    if _personalization_engine is None:
+def init_personalization_engine():
+    """
+    Load the personalization engine once; main.py runs this in a background
+    thread at startup.
+    
+    A missing or stale product matrix is built here (minutes on first start);
+    until then `get_personalization_engine` returns None and searches are
+    served unpersonalized instead of waiting.
+    """
+    global _personalization_engine, _personalization_initialized
+    if not _personalization_initialized:
+        _personalization_initialized = True
         try:
-            products_df = pd.read_csv("data/meta_ssot.csv")
-            _personalization_engine = PersonalizationEngine(products_df)
+            _personalization_engine = PersonalizationEngine(get_catalog(), build_if_missing=True)
+            logger.info("✅ Personalization engine ready")
         except Exception as e:
-            logger.error(f"Failed to initialize personalization engine: {e}")
+            logger.error(f"❌ Personalization disabled: {e}")
+    return _personalization_engine
+
+
+def get_personalization_engine():
+    """Get the personalization engine (None while loading or when it failed to load)."""
     return _personalization_engine
 
 
@@ -146,12 +161,12 @@ async def chat_message(
     search_results = None
     
     if req.include_search:
-        engine = FashionSearchEngine(request.app.state.ml_loader)
+        engine = get_async_search_engine(request)
         
         # Get more results for personalization
         k = 20 if (current_user and req.use_personalization) else 5
-        results = engine.search(text=req.message, k=k)
-        search_results = [r.__dict__ for r in results]
+        results = await engine.search(text=req.message, k=k)
+        search_results = [r.to_dict() for r in results]
         
         # ✅ Apply personalization if user is authenticated
         if current_user and req.use_personalization:
@@ -177,7 +192,7 @@ async def chat_message(
                 logger.error(f"Failed to save search history: {e}")
     
     # Generate chat response
-    response = chat_service.chat(req.session_id, req.message, search_results)
+    response = await run_in_threadpool(chat_service.chat, req.session_id, req.message, search_results)
     
     return {
         "response": response,
@@ -200,12 +215,12 @@ async def chat_rag(
     - **use_cache**: Use cached responses
     - **use_personalization**: Apply user preferences
     """
-    engine = FashionSearchEngine(request.app.state.ml_loader)
+    engine = get_async_search_engine(request)
     
     # Get more results for personalization
     k = req.top_k * 2 if (current_user and req.use_personalization) else req.top_k
-    search_results = engine.search(text=req.query, k=k)
-    products = [r.__dict__ for r in search_results]
+    search_results = await engine.search(text=req.query, k=k)
+    products = [r.to_dict() for r in search_results]
     
     # ✅ Apply personalization
     if current_user and req.use_personalization:
@@ -216,7 +231,7 @@ async def chat_rag(
         )
     
     # Generate RAG response
-    rag_result = rag_pipeline.query(req.query, products, use_cache=req.use_cache)
+    rag_result = await run_in_threadpool(rag_pipeline.query, req.query, products, use_cache=req.use_cache)
     
     # Save to history
     if current_user:
@@ -272,17 +287,14 @@ async def agent_query(
     - **use_memory**: Use conversation memory
     - **use_personalization**: Apply user preferences
     """
-    import pandas as pd
-    
     # Initialize agent for session if needed
     if req.session_id not in _agents:
-        engine = FashionSearchEngine(request.app.state.ml_loader)
-        products_df = pd.read_csv("data/meta_ssot.csv")
+        engine = get_async_search_engine(request).engine
         memory = ConversationMemory(max_turns=10, summarize_threshold=5)
         
         _agents[req.session_id] = FashionAgent(
             search_engine=engine,
-            products_df=products_df,
+            catalog=get_catalog(),
             max_iterations=5,
             memory=memory
         )
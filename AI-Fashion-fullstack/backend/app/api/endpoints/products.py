@@ -0,0 +1,55 @@
+"""Product endpoints: precomputed similar products."""
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from typing import Any, Dict, Optional
+import logging
+
+from app.api.endpoints.search_updated import parse_filters
+from app.core.config import settings
+from app.core.neighbors import NEIGHBOR_KINDS
+from app.services.async_search import get_async_search_engine
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/{product_id}/similar")
+async def similar_products(
+    product_id: int,
+    request: Request,
+    k: int = Query(10, ge=1, le=100),
+    kind: Optional[str] = Query(None, description=f"One of {', '.join(NEIGHBOR_KINDS)}"),
+    filters: Optional[str] = Query(None, description='JSON object, e.g. {"gender": "Women"}')
+):
+    """
+    "More like this" for a product page, from the precomputed neighbor table
+    (live search with the product's vectors when the table cannot answer).
+    """
+    if kind is not None and kind not in NEIGHBOR_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {list(NEIGHBOR_KINDS)}")
+    filter_dict = parse_filters(filters)
+    timings: Dict[str, Any] = {}
+    sources: Dict[str, str] = {}
+    engine = get_async_search_engine(request)
+    if engine.ml is not None and not engine.ml.catalog.contains(product_id):
+        raise HTTPException(status_code=404, detail=f"Product {product_id} not found")
+
+    try:
+        results = await engine.similar(product_id, k=k, kind=kind, filters=filter_dict,
+                                      timings=timings, sources=sources)
+        results_list = [r.to_dict() for r in results]
+        return JSONResponse(content={
+            "status": "success",
+            "product_id": product_id,
+            "kind": kind or settings.neighbors_default_kind,
+            "results_count": len(results_list),
+            "timings": timings,
+            "sources": sources,
+            "results": results_list
+        })
+
+    except Exception as e:
+        logger.error(f"Similar products error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
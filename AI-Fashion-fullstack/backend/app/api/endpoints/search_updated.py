@@ -1,41 +1,146 @@
 """Updated search endpoints with authentication and personalization."""
 
-from fastapi import APIRouter, File, UploadFile, Form, Request, Depends, HTTPException
-from fastapi.responses import JSONResponse
-from PIL import Image
-import io
-from typing import Optional
-from app.services.search_engine import FashionSearchEngine
+from fastapi import APIRouter, BackgroundTasks, File, UploadFile, Form, Request, Depends, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.core.catalog import FILTER_FIELDS
+from app.core.config import settings
+from app.core.deadline import Deadline
+from app.services.async_search import get_async_search_engine
 from app.middleware.auth_middleware import get_optional_user
 from app.models.auth_models import UserResponse
 from app.database import get_profiles_collection, get_favorites_collection, get_history_collection
 from datetime import datetime
+import asyncio
+import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_CHUNK_BYTES = 1 << 20
+
 router = APIRouter()
 
-# Global search engine instance (lazy loaded)
-_search_engine = None
+def parse_filters(filters: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Parse the JSON `filters` form field, e.g. '{"gender": "Women", "color": ["Red", "Pink"]}'."""
+    if not filters:
+        return None
+    try:
+        parsed = json.loads(filters)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"filters must be a JSON object: {e}")
+    if not isinstance(parsed, dict):
+        raise HTTPException(status_code=400, detail="filters must be a JSON object")
+    unknown = set(parsed) - set(FILTER_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported filters {sorted(unknown)}, expected any of {sorted(FILTER_FIELDS)}"
+        )
+    return parsed
 
 
-def get_search_engine(request: Request = None) -> FashionSearchEngine:
-    """Get or create search engine instance with ML loader."""
-    global _search_engine
-    if _search_engine is None:
-        try:
-            ml_loader = None
-            if request and hasattr(request.app, 'state'):
-                ml_loader = getattr(request.app.state, 'ml_loader', None)
-            
-            _search_engine = FashionSearchEngine(ml_loader)
-            logger.info("✅ Search engine initialized")
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize search engine: {e}")
-            raise RuntimeError(f"Search engine initialization failed: {e}")
+async def read_upload(upload: UploadFile, timings: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Read an uploaded image in chunks, rejecting it (413) as soon as it
+    exceeds `settings.max_upload_mb` instead of buffering the whole body.
+    """
+    start = time.perf_counter()
+    max_bytes = int(settings.max_upload_mb * 2**20)
+    too_large = HTTPException(
+        status_code=413, detail=f"{upload.filename} exceeds the {settings.max_upload_mb:g} MB upload limit"
+    )
+    if getattr(upload, "size", None) and upload.size > max_bytes:
+        raise too_large
+    
+    chunks, size = [], 0
+    while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        chunks.append(chunk)
+    if size == 0:
+        raise HTTPException(status_code=400, detail=f"Empty image file: {upload.filename}")
+    
+    if timings is not None:
+        timings["read_ms"] = round(timings.get("read_ms", 0.0) + (time.perf_counter() - start) * 1000, 3)
+    return b"".join(chunks)
+
+
+def parse_batch_queries(queries: Optional[str]) -> List[str]:
+    """Parse the JSON `queries` form field, e.g. '["black boots", "red dress"]'."""
+    if not queries:
+        return []
+    try:
+        parsed = json.loads(queries)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"queries must be a JSON list of strings: {e}")
+    if not isinstance(parsed, list) or not all(isinstance(q, str) and q.strip() for q in parsed):
+        raise HTTPException(status_code=400, detail="queries must be a JSON list of non-empty strings")
+    return parsed
+
+
+async def load_personalization(user_id: str) -> Tuple[Optional[dict], List[Any]]:
+    """Fetch a user's profile and favorite product ids (both queries run concurrently)."""
+    profiles_collection = get_profiles_collection()
+    favorites_collection = get_favorites_collection()
+    
+    profile, favorites = await asyncio.gather(
+        profiles_collection.find_one({"user_id": user_id}),
+        favorites_collection.find({"user_id": user_id}).to_list(length=100)
+    )
+    return profile, [f["product_id"] for f in favorites]
+
+
+def personalize_results(
+    results: list,
+    profile: Optional[dict],
+    favorite_ids: List[Any],
+    limit: int = 10
+) -> list:
+    """Boost and re-rank results by a user's favorites, colors and styles."""
+    # If no personalization data, return original results
+    if not profile and not favorite_ids:
+        return results[:limit]
+    
+    # Get user preferences
+    user_colors = [c.lower() for c in profile.get("colors", [])] if profile else []
+    user_styles = [s.lower() for s in profile.get("style", [])] if profile else []
+    
+    # Apply personalization boost
+    for result in results:
+        base_score = result.get("score", 0.5)
+        boost = 0.0
+        
+        # Favorite boost (highest priority)
+        if result.get("product_id") in favorite_ids:
+            boost += 0.3
+            logger.debug(f"Favorite boost: product_id={result.get('product_id')}")
+        
+        # Color boost
+        result_color = result.get("color", "").lower()
+        if result_color in user_colors:
+            boost += 0.15
+            logger.debug(f"Color boost: {result_color}")
+        
+        # Style/Category boost
+        result_category = result.get("category", "").lower()
+        if result_category in user_styles:
+            boost += 0.1
+            logger.debug(f"Category boost: {result_category}")
+        
+        # Calculate personalized score
+        result["personalized_score"] = min(base_score + boost, 1.0)
+        result["is_favorite"] = result.get("product_id") in favorite_ids
     
-    return _search_engine
+    # Sort by personalized score
+    results = sorted(
+        results, 
+        key=lambda x: x.get("personalized_score", x.get("score", 0)), 
+        reverse=True
+    )
+    return results[:limit]
 
 
 async def apply_user_personalization(
@@ -45,69 +150,40 @@ async def apply_user_personalization(
 ) -> list:
     """Apply personalization boosting to search results."""
     try:
-        profiles_collection = get_profiles_collection()
-        favorites_collection = get_favorites_collection()
+        profile, favorite_ids = await load_personalization(user_id)
         
-        # Get user profile
-        profile = await profiles_collection.find_one({"user_id": user_id})
-        
-        # Get favorites
-        favorites_cursor = favorites_collection.find({"user_id": user_id})
-        favorites = await favorites_cursor.to_list(length=100)
-        favorite_ids = [f["product_id"] for f in favorites]
-        
-        # If no personalization data, return original results
-        if not profile and not favorites:
+        if not profile and not favorite_ids:
             logger.info(f"No personalization data for user: {user_id}")
             return results[:limit]
         
-        # Get user preferences
-        user_colors = [c.lower() for c in profile.get("colors", [])] if profile else []
-        user_styles = [s.lower() for s in profile.get("style", [])] if profile else []
-        
-        logger.info(f"✅ Personalizing for user {user_id}: colors={user_colors}, styles={user_styles}, favorites={len(favorite_ids)}")
-        
-        # Apply personalization boost
-        for result in results:
-            base_score = result.get("score", 0.5)
-            boost = 0.0
-            
-            # Favorite boost (highest priority)
-            if result.get("product_id") in favorite_ids:
-                boost += 0.3
-                logger.debug(f"Favorite boost: product_id={result.get('product_id')}")
-            
-            # Color boost
-            result_color = result.get("color", "").lower()
-            if result_color in user_colors:
-                boost += 0.15
-                logger.debug(f"Color boost: {result_color}")
-            
-            # Style/Category boost
-            result_category = result.get("category", "").lower()
-            if result_category in user_styles:
-                boost += 0.1
-                logger.debug(f"Category boost: {result_category}")
-            
-            # Calculate personalized score
-            result["personalized_score"] = min(base_score + boost, 1.0)
-            result["is_favorite"] = result.get("product_id") in favorite_ids
-        
-        # Sort by personalized score
-        results = sorted(
-            results, 
-            key=lambda x: x.get("personalized_score", x.get("score", 0)), 
-            reverse=True
+        preferences = profile or {}
+        logger.info(
+            f"✅ Personalizing for user {user_id}: colors={preferences.get('colors', [])}, "
+            f"styles={preferences.get('style', [])}, favorites={len(favorite_ids)}"
         )
-        
+        results = personalize_results(results, profile, favorite_ids, limit)
         logger.info(f"✅ Personalization applied: {len(results)} results re-ranked")
-        return results[:limit]
+        return results
         
     except Exception as e:
         logger.error(f"Personalization failed: {e}", exc_info=True)
         return results[:limit]
 
 
+def personalization_allowed(deadline: Deadline) -> bool:
+    """Personalization (two Mongo round trips) only runs with enough budget left."""
+    return deadline.allows("personalization", settings.deadline_personalization_reserve_ms)
+
+
+async def save_history_within(deadline: Deadline, background_tasks: BackgroundTasks, *args):
+    """Write search history now, or after the response when the budget is nearly spent."""
+    if deadline.remaining_ms() >= settings.deadline_history_reserve_ms:
+        await save_search_history(*args)
+    else:
+        deadline.degrade("history", "deferred")
+        background_tasks.add_task(save_search_history, *args)
+
+
 async def save_search_history(user_id: str, query: str, query_type: str, results_count: int):
     """Save search query to user's history."""
     try:
@@ -129,12 +205,21 @@ async def search_text(
     query: str = Form(...),
     k: int = Form(20),
     personalized: bool = Form(True),
+    filters: Optional[str] = Form(None),
+    ef_search: Optional[int] = Form(None, ge=1, le=4096),
+    nprobe: Optional[int] = Form(None, ge=1, le=65536),
+    deadline_ms: Optional[float] = Form(None, ge=0, le=60000),
     request: Request = None,
+    background_tasks: BackgroundTasks = None,
     current_user: Optional[UserResponse] = Depends(get_optional_user)
 ):
-    """Text-based product search with optional personalization."""
+    """Text-based product search with optional personalization and attribute filters."""
+    deadline = Deadline(deadline_ms)
+    filter_dict = parse_filters(filters)
+    timings: Dict[str, Any] = {}
+    sources: Dict[str, str] = {}
     try:
-        engine = get_search_engine(request)
+        engine = get_async_search_engine(request)
         
         # Determine search parameters
         user_id = current_user.user_id if current_user else None
@@ -146,12 +231,16 @@ async def search_text(
         logger.info(f"Text search: query='{query}', k={search_k}, personalized={is_personalized}")
         
         # Perform search
-        results = engine.search(text=query, k=search_k)
-        results_list = [r.__dict__ for r in results]
+        results = await engine.search(
+            text=query, k=search_k, filters=filter_dict, ef_search=ef_search, nprobe=nprobe,
+            timings=timings, deadline=deadline, sources=sources
+        )
+        results_list = [r.to_dict() for r in results]
         
         logger.info(f"Found {len(results_list)} results")
         
-        # Apply personalization if enabled
+        # Apply personalization if enabled (and the deadline allows it)
+        is_personalized = is_personalized and personalization_allowed(deadline)
         if is_personalized:
             results_list = await apply_user_personalization(
                 results_list, 
@@ -163,13 +252,16 @@ async def search_text(
         
         # Save search history
         if user_id:
-            await save_search_history(user_id, query, "text", len(results_list))
+            await save_history_within(deadline, background_tasks, user_id, query, "text", len(results_list))
         
         return JSONResponse(content={
             "status": "success",
             "query": query,
             "results_count": len(results_list),
             "personalized": is_personalized,
+            "timings": timings,
+            "sources": sources,
+            "deadline": deadline.report(),
             "results": results_list
         })
         
@@ -183,20 +275,24 @@ async def search_image(
     image: UploadFile = File(...),
     k: int = Form(10),
     personalized: bool = Form(True),
+    filters: Optional[str] = Form(None),
+    ef_search: Optional[int] = Form(None, ge=1, le=4096),
+    nprobe: Optional[int] = Form(None, ge=1, le=65536),
+    deadline_ms: Optional[float] = Form(None, ge=0, le=60000),
     request: Request = None,
+    background_tasks: BackgroundTasks = None,
     current_user: Optional[UserResponse] = Depends(get_optional_user)
 ):
-    """Image-based product search with optional personalization."""
+    """Image-based product search with optional personalization and attribute filters."""
+    deadline = Deadline(deadline_ms)
+    filter_dict = parse_filters(filters)
+    timings: Dict[str, Any] = {}
+    sources: Dict[str, str] = {}
+    contents = await read_upload(image, timings)
     try:
-        engine = get_search_engine(request)
-        
-        # Validate image
-        contents = await image.read()
-        if len(contents) == 0:
-            raise ValueError("Empty image file")
+        engine = get_async_search_engine(request)
         
-        img = Image.open(io.BytesIO(contents)).convert('RGB')
-        logger.info(f"Image loaded: {img.size}, mode: {img.mode}")
+        logger.info(f"Image received: {image.filename}, {len(contents)} bytes")
         
         # Search with expanded k if personalization is enabled
         search_k = k * 2 if (current_user and personalized) else k
@@ -205,16 +301,21 @@ async def search_image(
         
         # Perform search
         try:
-            results = engine.search(image=img, k=search_k)
+            # Raw bytes: decoding and CLIP are skipped for a re-submitted image
+            results = await engine.search(
+                image=contents, k=search_k, filters=filter_dict, ef_search=ef_search, nprobe=nprobe,
+                timings=timings, deadline=deadline, sources=sources
+            )
         except Exception as search_error:
             logger.error(f"Search engine error: {search_error}", exc_info=True)
             raise RuntimeError(f"Search failed: {str(search_error)}")
         
-        results_list = [r.__dict__ for r in results]
-        logger.info(f"Found {len(results_list)} results")
+        results_list = [r.to_dict() for r in results]
+        logger.info(f"Found {len(results_list)} results, timings={timings}")
         
-        # Apply personalization if enabled
-        if current_user and personalized:
+        # Apply personalization if enabled (and the deadline allows it)
+        personalized = bool(current_user and personalized and personalization_allowed(deadline))
+        if personalized:
             results_list = await apply_user_personalization(
                 results_list, 
                 current_user.user_id, 
@@ -225,7 +326,9 @@ async def search_image(
         
         # Save search history
         if current_user:
-            await save_search_history(
+            await save_history_within(
+                deadline,
+                background_tasks,
                 current_user.user_id, 
                 f"image:{image.filename}", 
                 "image", 
@@ -236,7 +339,10 @@ async def search_image(
             "status": "success",
             "image_filename": image.filename,
             "results_count": len(results_list),
-            "personalized": current_user is not None and personalized,
+            "personalized": personalized,
+            "timings": timings,
+            "sources": sources,
+            "deadline": deadline.report(),
             "results": results_list
         })
         
@@ -252,20 +358,24 @@ async def search_multimodal(
     k: int = Form(10),
     alpha: float = Form(0.7),
     personalized: bool = Form(True),
+    filters: Optional[str] = Form(None),
+    ef_search: Optional[int] = Form(None, ge=1, le=4096),
+    nprobe: Optional[int] = Form(None, ge=1, le=65536),
+    deadline_ms: Optional[float] = Form(None, ge=0, le=60000),
     request: Request = None,
+    background_tasks: BackgroundTasks = None,
     current_user: Optional[UserResponse] = Depends(get_optional_user)
 ):
-    """Multimodal product search (text + image) with optional personalization."""
+    """Multimodal product search (text + image) with optional personalization and attribute filters."""
+    deadline = Deadline(deadline_ms)
+    filter_dict = parse_filters(filters)
+    timings: Dict[str, Any] = {}
+    sources: Dict[str, str] = {}
+    contents = await read_upload(image, timings)
     try:
-        engine = get_search_engine(request)
+        engine = get_async_search_engine(request)
         
-        # Validate image
-        contents = await image.read()
-        if len(contents) == 0:
-            raise ValueError("Empty image file")
-            
-        img = Image.open(io.BytesIO(contents)).convert('RGB')
-        logger.info(f"Multimodal search: query='{query}', image={img.size}, alpha={alpha}")
+        logger.info(f"Multimodal search: query='{query}', image={len(contents)} bytes, alpha={alpha}")
         
         # Search with expanded k if personalization is enabled
         search_k = k * 2 if (current_user and personalized) else k
@@ -274,16 +384,21 @@ async def search_multimodal(
         
         # Perform search
         try:
-            results = engine.search(text=query, image=img, k=search_k, alpha=alpha)
+            results = await engine.search(
+                text=query, image=contents, k=search_k, alpha=alpha,
+                filters=filter_dict, ef_search=ef_search, nprobe=nprobe,
+                timings=timings, deadline=deadline, sources=sources
+            )
         except Exception as search_error:
             logger.error(f"Search engine error: {search_error}", exc_info=True)
             raise RuntimeError(f"Search failed: {str(search_error)}")
         
-        results_list = [r.__dict__ for r in results]
-        logger.info(f"Found {len(results_list)} results")
+        results_list = [r.to_dict() for r in results]
+        logger.info(f"Found {len(results_list)} results, timings={timings}")
         
-        # Apply personalization if enabled
-        if current_user and personalized:
+        # Apply personalization if enabled (and the deadline allows it)
+        personalized = bool(current_user and personalized and personalization_allowed(deadline))
+        if personalized:
             results_list = await apply_user_personalization(
                 results_list, 
                 current_user.user_id, 
@@ -294,7 +409,9 @@ async def search_multimodal(
         
         # Save search history
         if current_user:
-            await save_search_history(
+            await save_history_within(
+                deadline,
+                background_tasks,
                 current_user.user_id, 
                 f"{query} + image:{image.filename}", 
                 "multimodal", 
@@ -307,10 +424,205 @@ async def search_multimodal(
             "image_filename": image.filename,
             "alpha": alpha,
             "results_count": len(results_list),
-            "personalized": current_user is not None and personalized,
+            "personalized": personalized,
+            "timings": timings,
+            "sources": sources,
+            "deadline": deadline.report(),
             "results": results_list
         })
         
     except Exception as e:
         logger.error(f"Multimodal search error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/batch")
+async def search_batch(
+    queries: Optional[str] = Form(None),
+    images: Optional[List[UploadFile]] = File(None),
+    k: int = Form(10, ge=1, le=100),
+    alpha: float = Form(0.7, ge=0.0, le=1.0),
+    filters: Optional[str] = Form(None),
+    ef_search: Optional[int] = Form(None, ge=1, le=4096),
+    nprobe: Optional[int] = Form(None, ge=1, le=65536),
+    request: Request = None
+):
+    """
+    Batch product search for offline jobs and evaluation.
+    
+    `queries` is a JSON list of text queries and `images` a list of files;
+    when both are sent, queries[i] and images[i] form one multimodal query.
+    All queries are encoded together and searched with one multi-row index
+    call. Results are not personalized and not written to search history.
+    """
+    texts = parse_batch_queries(queries)
+    images = images or []
+    n_queries = max(len(texts), len(images))
+    if n_queries == 0:
+        raise HTTPException(status_code=400, detail="Provide queries and/or images")
+    if texts and images and len(texts) != len(images):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Got {len(texts)} queries and {len(images)} images, expected one of each per query"
+        )
+    if n_queries > settings.search_batch_max_queries:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.search_batch_max_queries} queries per batch, got {n_queries}"
+        )
+    filter_dict = parse_filters(filters)
+    timings: Dict[str, Any] = {}
+    uploads = [await read_upload(upload, timings) for upload in images]
+    
+    try:
+        engine = get_async_search_engine(request)
+        
+        logger.info(f"Batch search: {n_queries} queries (text={len(texts)}, image={len(uploads)}), k={k}")
+        
+        batch_results = await engine.search_batch(
+            texts=texts or None, images=uploads or None, k=k, alpha=alpha,
+            filters=filter_dict, ef_search=ef_search, nprobe=nprobe, timings=timings
+        )
+        
+        response = []
+        for i, results in enumerate(batch_results):
+            entry = {"results_count": len(results), "results": [r.to_dict() for r in results]}
+            if texts:
+                entry["query"] = texts[i]
+            if images:
+                entry["image_filename"] = images[i].filename
+            response.append(entry)
+        
+        return JSONResponse(content={
+            "status": "success",
+            "queries_count": n_queries,
+            "timings": timings,
+            "results": response
+        })
+        
+    except Exception as e:
+        logger.error(f"Batch search error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def stream_frame(event: str, data: Dict[str, Any], stream_format: str) -> str:
+    """Encode one stream event as an NDJSON line or a Server-Sent Events message."""
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, **data}) + "\n"
+
+
+@router.post("/stream")
+async def search_stream(
+    query: Optional[str] = Form(None),
+    image: Optional[UploadFile] = File(None),
+    k: int = Form(10, ge=1, le=100),
+    alpha: float = Form(0.7, ge=0.0, le=1.0),
+    personalized: bool = Form(True),
+    filters: Optional[str] = Form(None),
+    ef_search: Optional[int] = Form(None, ge=1, le=4096),
+    nprobe: Optional[int] = Form(None, ge=1, le=65536),
+    stream_format: str = Form("ndjson", alias="format", pattern="^(ndjson|sse)$"),
+    deadline_ms: Optional[float] = Form(None, ge=0, le=60000),
+    request: Request = None,
+    current_user: Optional[UserResponse] = Depends(get_optional_user)
+):
+    """
+    Streaming text, image or multimodal search (NDJSON lines or SSE).
+    
+    Events, in order:
+      - `results`: raw top-k as soon as the index search returns
+      - `personalized`: top-k re-ranked with the user's profile and favorites
+        (fetched while the search runs; logged-in users only, skipped if the
+        profile does not arrive within the deadline)
+      - `done`: final count, per-stage timings and the deadline report (or
+        `error` on failure)
+    Search history is written after the last event.
+    """
+    if not query and image is None:
+        raise HTTPException(status_code=400, detail="Provide a query and/or an image")
+    deadline = Deadline(deadline_ms)
+    filter_dict = parse_filters(filters)
+    timings: Dict[str, Any] = {}
+    sources: Dict[str, str] = {}
+    contents = await read_upload(image, timings) if image is not None else None
+    
+    engine = get_async_search_engine(request)
+    user_id = current_user.user_id if current_user else None
+    is_personalized = personalized and user_id is not None
+    search_k = k * 2 if is_personalized else k
+    query_type = "multimodal" if query and contents else ("text" if query else "image")
+    history_query = " + ".join(
+        part for part in (query, f"image:{image.filename}" if image is not None else None) if part
+    )
+    
+    # Profile and favorites load from Mongo while the index search runs
+    profile_task = asyncio.create_task(load_personalization(user_id)) if is_personalized else None
+    logger.info(f"Stream search: type={query_type}, k={search_k}, personalized={is_personalized}, format={stream_format}")
+    
+    async def events() -> AsyncIterator[str]:
+        start = time.perf_counter()
+        results_list: List[Dict[str, Any]] = []
+        try:
+            results = await engine.search(
+                text=query, image=contents, k=search_k, alpha=alpha,
+                filters=filter_dict, ef_search=ef_search, nprobe=nprobe,
+                timings=timings, deadline=deadline, sources=sources
+            )
+            results_list = [r.to_dict() for r in results]
+            timings["first_results_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            yield stream_frame("results", {
+                "query_type": query_type,
+                "results_count": min(k, len(results_list)),
+                "results": results_list[:k]
+            }, stream_format)
+            
+            # Personalize only if the profile arrives within the remaining budget
+            applied = False
+            if profile_task is not None:
+                try:
+                    timeout = None if deadline.unlimited else max(0.0, deadline.remaining_ms()) / 1000
+                    profile, favorite_ids = await asyncio.wait_for(profile_task, timeout)
+                    results_list = personalize_results(results_list, profile, favorite_ids, limit=k)
+                    applied = True
+                except asyncio.TimeoutError:
+                    deadline.skip("personalization")
+                except Exception as e:
+                    logger.error(f"Personalization failed: {e}", exc_info=True)
+            if applied:
+                yield stream_frame("personalized", {
+                    "results_count": len(results_list),
+                    "results": results_list
+                }, stream_format)
+            else:
+                results_list = results_list[:k]
+            
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            logger.info(f"Stream search done: {len(results_list)} results, timings={timings}")
+            yield stream_frame("done", {
+                "results_count": len(results_list),
+                "personalized": applied,
+                "timings": timings,
+                "sources": sources,
+                "deadline": deadline.report()
+            }, stream_format)
+            
+        except Exception as e:
+            logger.error(f"Stream search error: {str(e)}", exc_info=True)
+            yield stream_frame("error", {"detail": str(e)}, stream_format)
+            return
+        finally:
+            if profile_task is not None and not profile_task.done():
+                profile_task.cancel()
+        
+        if user_id:
+            await save_search_history(user_id, history_query, query_type, len(results_list))
+    
+    return StreamingResponse(
+        events(),
+        media_type=STREAM_MEDIA_TYPES[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
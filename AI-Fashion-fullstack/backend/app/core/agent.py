@@ -6,6 +6,7 @@ from enum import Enum
 import re
 import numpy as np
 
+from app.core.catalog import CatalogStore
 from app.core.memory import ConversationMemory
 from app.services.search_engine import FashionSearchEngine
 import logging
@@ -46,7 +47,7 @@ class FashionAgent:
     def __init__(
         self,
         search_engine: FashionSearchEngine,
-        products_df: Any,
+        catalog: CatalogStore,
         max_iterations: int = 5,
         memory: Optional[ConversationMemory] = None
     ):
@@ -55,12 +56,12 @@ class FashionAgent:
         
         Args:
             search_engine: FashionSearchEngine instance
-            products_df: Products DataFrame with metadata
+            catalog: Shared product catalog
             max_iterations: Max ReAct loop iterations
             memory: Conversation memory (optional)
         """
         self.search_engine = search_engine
-        self.products_df = products_df
+        self.catalog = catalog
         self.max_iterations = max_iterations
         self.memory = memory or ConversationMemory()
         self.iterations = 0
@@ -79,10 +80,11 @@ class FashionAgent:
     def _search_products_tool(self, query: str, k: int = 5) -> List[Dict]:
         """Search products by query."""
         try:
-            results = self.search_engine.search(query=query, k=k, mode="text")
+            results = self.search_engine.search(text=query, k=k)[:k]
+            rows = self.catalog.rows_for_ids([r.product_id for r in results])
+            found = [r for r, row in zip(results, rows) if row >= 0]
             products = []
-            for result in results[:k]:
-                prod_data = self.products_df[self.products_df['product_id'] == result.product_id].iloc[0]
+            for result, prod_data in zip(found, self.catalog.products(rows)):
                 products.append({
                     "product_id": result.product_id,
                     "name": prod_data.get('product_name', 'Unknown'),
@@ -98,26 +100,18 @@ class FashionAgent:
             return []
     
     def _recommend_similar_tool(self, product_id: int, k: int = 3) -> List[Dict]:
-        """Get similar products to a given product ID."""
+        """Get visually similar products to a given product ID (precomputed neighbor lookup)."""
         try:
-            # Find product in embeddings
-            if product_id not in self.products_df['product_id'].values:
+            if not self.catalog.contains(product_id):
                 return []
             
-            # Use image search for similarity
-            results = self.search_engine.search(query=str(product_id), k=k+1, mode="image")
-            similar = []
-            for result in results:
-                if result.product_id != product_id:  # Exclude input product
-                    prod_data = self.products_df[self.products_df['product_id'] == result.product_id].iloc[0]
-                    similar.append({
-                        "product_id": result.product_id,
-                        "name": prod_data.get('product_name', 'Unknown'),
-                        "category": prod_data.get('category', 'Unknown'),
-                        "color": prod_data.get('color', 'Unknown'),
-                        "similarity_score": float(result.score)
-                    })
-            return similar[:k]
+            return [{
+                "product_id": result.product_id,
+                "name": result.product_name,
+                "category": result.category,
+                "color": result.color,
+                "similarity_score": float(result.score)
+            } for result in self.search_engine.similar(product_id, k=k, kind="image")]
         except Exception as e:
             logger.error(f"Recommend tool error: {e}")
             return []
@@ -125,10 +119,10 @@ class FashionAgent:
     def _get_product_details_tool(self, product_id: int) -> Optional[Dict]:
         """Get full details for a product."""
         try:
-            if product_id not in self.products_df['product_id'].values:
+            prod_data = self.catalog.product(product_id)
+            if prod_data is None:
                 return None
             
-            prod_data = self.products_df[self.products_df['product_id'] == product_id].iloc[0]
             return {
                 "product_id": product_id,
                 "name": prod_data.get('product_name', 'Unknown'),
@@ -0,0 +1,133 @@
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent callers `submit()` single items; a background thread collects them
+for up to `max_wait_ms` (or until `max_batch_size` items are queued) and runs
+one batched forward pass. Each caller gets its own row back through a Future.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Sequence
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item requests into batched calls."""
+
+    def __init__(
+        self,
+        name: str,
+        process_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        """
+        Args:
+            name: Name used in logs and metrics
+            process_batch: Function mapping a list of items to one result per item
+            max_batch_size: Largest batch passed to `process_batch`
+            max_wait_ms: How long the first queued item may wait for company
+        """
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_seen = 0
+        self._errors = 0
+
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item; the Future resolves to its result."""
+        future: Future = Future()
+        # Checked and queued under the lock so nothing lands behind the stop marker
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Batcher '{self.name}' is closed")
+            self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        """Submit one item and block until its result is ready."""
+        return self.submit(item).result()
+
+    def close(self):
+        """Stop the worker after draining already queued items."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join(timeout=5)
+
+    def _collect(self) -> List:
+        first = self._queue.get()
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)  # re-queue the stop marker for the run loop
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(futures):
+                    # zip would leave the extra callers blocked forever
+                    raise ValueError(f"process_batch returned {len(results)} results for {len(futures)} items")
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"❌ Batch '{self.name}' failed ({len(items)} items): {e}")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                with self._lock:
+                    self._errors += 1
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(items)
+                self._max_seen = max(self._max_seen, len(items))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and batch-size metrics."""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "max_batch_size_seen": self._max_seen,
+                "errors": self._errors,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
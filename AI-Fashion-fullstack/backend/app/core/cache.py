@@ -0,0 +1,274 @@
+"""
+Bounded, thread-safe LRU caches with TTL expiry.
+
+`TTLCache` is the generic building block; `EmbeddingCache` specializes it for
+query embeddings keyed on ``(model_id, normalized_text)`` and can persist its
+contents to an ``.npz`` file so a restart starts warm. `ImageEmbeddingCache`
+keys uploaded query images on a hash of their bytes, with an optional
+perceptual-hash lookup for near-duplicates. `ResponseCache` holds whole search
+responses and is invalidated when the catalog/index version changes.
+"""
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import logging
+
+import numpy as np
+
+from app.core.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after `ttl_seconds`."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: Optional[float] = 3600, name: str = "cache",
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        """
+        Args:
+            max_entries: Entries kept before the least recently used is evicted
+            ttl_seconds: Entry lifetime (None = never expires)
+            name: Name used in logs and stats
+            max_bytes: Optional bound on the summed `sizeof` of all values
+            sizeof: Estimated value size in bytes (default ``sys.getsizeof``)
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.name = name
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or sys.getsizeof
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value (refreshing its LRU position) or None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Insert or replace a value, evicting LRU entries when over a bound."""
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # would evict everything else; not worth caching
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic(), value)
+            self._sizes[key] = size
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        del self._data[key]
+        self._bytes -= self._sizes.pop(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class EmbeddingCache(TTLCache):
+    """Query-embedding cache keyed on (model id, normalized query text)."""
+
+    @staticmethod
+    def key(model_id: str, text: str) -> Tuple[str, str]:
+        return (model_id, normalize_text(text))
+
+    def save(self, path: Path):
+        """Write live entries to an .npz file (grouped per model)."""
+        with self._lock:
+            entries = [(key, value) for key, (_, value) in self._data.items()]
+
+        groups: Dict[str, list] = {}
+        for (model_id, text), vector in entries:
+            groups.setdefault(model_id, []).append((text, vector))
+
+        arrays = {"models": np.array(list(groups), dtype=str)}
+        for i, items in enumerate(groups.values()):
+            arrays[f"texts_{i}"] = np.array([text for text, _ in items], dtype=str)
+            arrays[f"vectors_{i}"] = np.stack([vector for _, vector in items]).astype(np.float32)
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        logger.info(f"✅ {self.name}: saved {len(entries)} entries to {path}")
+
+    def load(self, path: Path) -> int:
+        """Warm the cache from an .npz file written by `save`. Returns entries loaded."""
+        path = Path(path)
+        if not path.exists():
+            return 0
+        try:
+            with np.load(path) as data:
+                loaded = 0
+                for i, model_id in enumerate(data["models"]):
+                    for text, vector in zip(data[f"texts_{i}"], data[f"vectors_{i}"]):
+                        self.put((str(model_id), str(text)), vector)
+                        loaded += 1
+        except Exception as e:
+            logger.warning(f"⚠️ {self.name}: could not load warm-start file {path}: {e}")
+            return 0
+        logger.info(f"✅ {self.name}: warm-started with {loaded} entries from {path}")
+        return loaded
+
+
+class ImageEmbeddingCache(TTLCache):
+    """
+    Query-image embedding cache keyed on (model id, sha256 of the uploaded bytes).
+
+    Entries may carry a 64-bit perceptual hash; `get_similar` then finds a
+    cached embedding for a re-encoded or resized copy of the same picture.
+    """
+
+    def __init__(self, *args, max_distance: int = 0, **kwargs):
+        """
+        Args:
+            max_distance: Max Hamming distance between perceptual hashes for a
+                near-duplicate hit (0 = exact bytes only)
+        """
+        super().__init__(*args, **kwargs)
+        self.max_distance = max_distance
+        self._phashes: Dict[Hashable, int] = {}
+        self.near_duplicate_hits = 0
+
+    @staticmethod
+    def key(model_id: str, contents: bytes) -> Tuple[str, str]:
+        return (model_id, hashlib.sha256(contents).hexdigest())
+
+    def put(self, key: Hashable, value: Any, phash: Optional[int] = None):
+        """Insert an embedding, optionally with its perceptual hash."""
+        super().put(key, value)
+        if phash is not None:
+            with self._lock:
+                if key in self._data:
+                    self._phashes[key] = phash
+
+    def _remove(self, key: Hashable):
+        super()._remove(key)
+        self._phashes.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._phashes.clear()
+        super().clear()
+
+    def get_similar(self, model_id: str, phash: int) -> Optional[Any]:
+        """Embedding of the closest cached image within `max_distance` bits, or None."""
+        if not self.max_distance:
+            return None
+        with self._lock:
+            keys = [key for key in self._phashes if key[0] == model_id]
+            if not keys:
+                return None
+            hashes = np.fromiter((self._phashes[key] for key in keys), dtype=np.uint64, count=len(keys))
+            diff = (hashes ^ np.uint64(phash)).view(np.uint8).reshape(-1, 8)
+            distances = np.unpackbits(diff, axis=1).sum(axis=1)
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                return None
+        value = self.get(keys[best])
+        if value is not None:
+            with self._lock:
+                self.near_duplicate_hits += 1
+        return value
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["near_duplicate_hits"] = self.near_duplicate_hits
+        return stats
+
+
+class ResponseCache(TTLCache):
+    """
+    Search-response cache for user-independent (non-personalized) results.
+
+    Keys include every parameter that changes the ranking; `check_version`
+    drops all entries when the catalog or index version changes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version: Optional[Hashable] = None
+        self.invalidations = 0
+
+    @staticmethod
+    def key(mode: str, query: str, k: int, alpha: float, filters: Optional[Dict[str, Any]] = None,
+            **params) -> Tuple:
+        """Cache key from the normalized query and the ranking parameters."""
+        filter_key = tuple(sorted(
+            (str(name), tuple(sorted(map(str, value))) if isinstance(value, (list, tuple, set)) else str(value))
+            for name, value in (filters or {}).items()
+        ))
+        return (mode, normalize_text(query), int(k), round(float(alpha), 4), filter_key,
+                tuple(sorted(params.items())))
+
+    def check_version(self, version: Hashable):
+        """Clear the cache if the catalog/index version differs from the cached one."""
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            if self.version is not None:
+                self.invalidations += 1
+                logger.info(f"🔄 {self.name}: catalog/index version changed, cache cleared")
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+            self.version = version
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["invalidations"] = self.invalidations
+        return stats
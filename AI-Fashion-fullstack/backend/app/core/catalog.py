@@ -0,0 +1,282 @@
+"""
+Process-wide product catalog with O(1) id lookups.
+
+`meta_ssot.csv` is parsed once per process by `get_catalog()`. Categorical
+columns are dictionary-encoded (small integer codes + a categories array) and
+product ids map to row positions through a dense array, so lookups and
+attribute checks never scan the DataFrame. The images directory is scanned
+once as well, into a per-row image URL array.
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Columns stored as integer codes
+CATEGORICAL_COLUMNS = (
+    "gender", "masterCategory", "subCategory", "articleType",
+    "baseColour", "season", "usage"
+)
+
+# Canonical product dict field -> catalog column
+PRODUCT_FIELDS = {
+    "product_name": "productDisplayName",
+    "category": "masterCategory",
+    "sub_category": "subCategory",
+    "article_type": "articleType",
+    "color": "baseColour",
+    "gender": "gender",
+    "season": "season",
+    "usage": "usage",
+}
+
+# Columns whose text feeds derived artifacts (embeddings, recommender matrix);
+# hashed into the catalog fingerprint along with the ids
+FINGERPRINT_COLUMNS = ("desc", "productDisplayName", "masterCategory", "baseColour", "gender")
+
+# Local product image file name: <images_dir>/<id>.jpg
+IMAGE_SUFFIX = ".jpg"
+
+# Filter key -> catalog column (canonical product keys or raw column names)
+FILTER_FIELDS = {
+    **{column: column for column in CATEGORICAL_COLUMNS},
+    **{field: column for field, column in PRODUCT_FIELDS.items() if column in CATEGORICAL_COLUMNS},
+}
+
+
+class CatalogStore:
+    """Columnar, read-only view of the product catalog."""
+
+    def __init__(self, products_df: pd.DataFrame, images_dir: Optional[Path] = None,
+                 image_base_url: str = ""):
+        """
+        Build the columnar catalog.
+
+        Args:
+            products_df: Catalog DataFrame (meta_ssot schema, `id` column required)
+            images_dir: Directory with local ``<id>.jpg`` images (scanned once)
+            image_base_url: URL prefix under which ``images_dir`` is served
+        """
+        self.df = products_df.reset_index(drop=True)
+        self.ids = self.df["id"].to_numpy(dtype=np.int64)
+
+        # id -> row position (dense; -1 marks unknown ids)
+        self._row_of_id = np.full(int(self.ids.max()) + 1 if len(self.ids) else 0, -1, dtype=np.int32)
+        self._row_of_id[self.ids] = np.arange(len(self.ids), dtype=np.int32)
+
+        # Dictionary-encoded categorical columns
+        self.codes: Dict[str, np.ndarray] = {}
+        self.categories: Dict[str, np.ndarray] = {}
+        self._code_lookup: Dict[str, Dict[str, int]] = {}
+        for column in CATEGORICAL_COLUMNS:
+            if column not in self.df.columns:
+                continue
+            values = pd.Categorical(self.df[column].fillna("Unknown").astype(str))
+            self.codes[column] = values.codes.astype(np.int16)
+            self.categories[column] = np.asarray(values.categories, dtype=object)
+            self._code_lookup[column] = {
+                str(value).lower(): code for code, value in enumerate(values.categories)
+            }
+
+        # (column, code) -> row bitmap, built on first use and reused
+        self._bitmaps: Dict[Tuple[str, int], np.ndarray] = {}
+
+        self.names = self.df["productDisplayName"].fillna("").astype(str).to_numpy(dtype=object)
+
+        # Row -> image URL (local file first, then a remote `image_path`), or None
+        self.has_local_image = np.zeros(len(self.ids), dtype=bool)
+        self.image_urls = self._build_image_urls(images_dir, image_base_url)
+
+        # Identifies this catalog build (used to detect stale derived artifacts)
+        self.fingerprint = self._fingerprint()
+
+        logger.info(f"✅ Catalog ready: {len(self)} products, {len(self.codes)} encoded columns")
+
+    @classmethod
+    def from_csv(cls, path: Path, images_dir: Optional[Path] = None,
+                 image_base_url: str = "") -> "CatalogStore":
+        """Load the catalog from a meta_ssot CSV file."""
+        path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(f"Product data not found: {path}")
+        return cls(pd.read_csv(path), images_dir=images_dir, image_base_url=image_base_url)
+
+    def _build_image_urls(self, images_dir: Optional[Path], base_url: str) -> np.ndarray:
+        urls = np.full(len(self.ids), None, dtype=object)
+
+        if "image_path" in self.df.columns:
+            paths = self.df["image_path"].fillna("").astype(str)
+            remote = paths.str.startswith("http").to_numpy()
+            urls[remote] = paths.to_numpy(dtype=object)[remote]
+
+        if images_dir is not None and Path(images_dir).is_dir():
+            with os.scandir(images_dir) as entries:
+                stems = [
+                    entry.name[:-len(IMAGE_SUFFIX)] for entry in entries
+                    if entry.name.endswith(IMAGE_SUFFIX) and entry.name[:-len(IMAGE_SUFFIX)].isdigit()
+                ]
+            rows = self.rows_for_ids(np.asarray(stems, dtype=np.int64))
+            rows = rows[rows >= 0]
+            self.has_local_image[rows] = True
+            base_url = base_url.rstrip("/")
+            urls[rows] = [f"{base_url}/{product_id}{IMAGE_SUFFIX}" for product_id in self.ids[rows].tolist()]
+            logger.info(f"✅ Images indexed: {len(rows)} of {len(self)} products have a local image")
+
+        return urls
+
+    def _fingerprint(self) -> str:
+        """Hash of the ids and FINGERPRINT_COLUMNS, so edited text invalidates artifacts too."""
+        digest = hashlib.sha1(self.ids.tobytes())
+        for column in FINGERPRINT_COLUMNS:
+            if column in self.df.columns:
+                digest.update(column.encode("utf8"))
+                digest.update("\x1f".join(self.df[column].fillna("").astype(str)).encode("utf8"))
+        return digest.hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ==================== ID LOOKUPS ====================
+
+    def rows_for_ids(self, product_ids: Iterable[Any]) -> np.ndarray:
+        """
+        Map product ids to row positions in one vectorized gather.
+
+        Ids may be ints or numeric strings; unknown ids map to -1.
+        """
+        ids = np.asarray(list(product_ids) if not isinstance(product_ids, np.ndarray) else product_ids)
+        if ids.dtype.kind not in "iu":
+            ids = pd.to_numeric(pd.Series(ids.ravel(), dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+            valid = np.isfinite(ids)
+            ids = np.where(valid, ids, -1).astype(np.int64)
+
+        ids = ids.astype(np.int64, copy=False)
+        rows = np.full(ids.shape, -1, dtype=np.int64)
+        in_range = (ids >= 0) & (ids < len(self._row_of_id))
+        rows[in_range] = self._row_of_id[ids[in_range]]
+        return rows
+
+    def row_for_id(self, product_id: Any) -> Optional[int]:
+        """Row position of a single product id, or None if unknown."""
+        row = int(self.rows_for_ids([product_id])[0])
+        return row if row >= 0 else None
+
+    def contains(self, product_id: Any) -> bool:
+        """Check whether a product id exists in the catalog."""
+        return self.row_for_id(product_id) is not None
+
+    # ==================== COLUMN ACCESS ====================
+
+    def column(self, name: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Decoded column values, optionally gathered for the given rows."""
+        if name in self.codes:
+            codes = self.codes[name] if rows is None else self.codes[name][rows]
+            return self.categories[name][codes]
+        values = self.df[name].to_numpy()
+        return values if rows is None else values[rows]
+
+    def code_for(self, column: str, value: str) -> int:
+        """Integer code of a categorical value (case-insensitive), -1 if absent."""
+        return self._code_lookup.get(column, {}).get(str(value).lower(), -1)
+
+    # ==================== FILTERS ====================
+
+    def bitmap(self, column: str, value: str) -> np.ndarray:
+        """Read-only boolean row mask of products whose `column` equals `value`."""
+        code = self.code_for(column, value)
+        key = (column, code)
+        mask = self._bitmaps.get(key)
+        if mask is None:
+            mask = self.codes[column] == code if code >= 0 else np.zeros(len(self), dtype=bool)
+            mask.setflags(write=False)
+            self._bitmaps[key] = mask
+        return mask
+
+    def filter_mask(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Combine attribute filters into one row mask.
+
+        Args:
+            filters: Filter key (see FILTER_FIELDS) -> value or list of values.
+                Values of one key are OR-ed, different keys are AND-ed;
+                matching is case-insensitive.
+
+        Returns:
+            Boolean mask over catalog rows, or None when there are no filters
+        """
+        if not filters:
+            return None
+
+        mask = None
+        for key, value in filters.items():
+            column = FILTER_FIELDS.get(key)
+            if column is None or column not in self.codes:
+                raise ValueError(f"Unsupported filter '{key}', expected one of {sorted(FILTER_FIELDS)}")
+
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            column_mask = np.zeros(len(self), dtype=bool)
+            for v in values:
+                column_mask |= self.bitmap(column, v)
+            mask = column_mask if mask is None else mask & column_mask
+        return mask
+
+    # ==================== BATCH GETTERS ====================
+
+    def products(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """Canonical product dicts for the given row positions (-1 rows skipped)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[rows >= 0]
+
+        columns = {"product_id": self.ids[rows].tolist()}
+        for field, column in PRODUCT_FIELDS.items():
+            if column in self.codes or column in self.df.columns:
+                columns[field] = self.column(column, rows).tolist()
+        if "year" in self.df.columns:
+            columns["year"] = self.df["year"].to_numpy()[rows].tolist()
+
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    def display_columns(self, rows: np.ndarray) -> Dict[str, np.ndarray]:
+        """Search-result display fields for the given (valid) row positions, as arrays."""
+        rows = np.asarray(rows, dtype=np.int64)
+        unknown = np.full(len(rows), "Unknown", dtype=object)
+        columns = {"product_id": self.ids[rows], "product_name": self.names[rows]}
+        for field, column in (("category", "masterCategory"), ("gender", "gender"), ("color", "baseColour")):
+            columns[field] = self.column(column, rows) if column in self.codes else unknown
+        columns["image_url"] = self.image_urls[rows]
+        return columns
+
+    def product(self, product_id: Any) -> Optional[Dict[str, Any]]:
+        """Canonical product dict for a single product id, or None."""
+        row = self.row_for_id(product_id)
+        if row is None:
+            return None
+        return self.products(np.array([row]))[0]
+
+
+# Process-wide catalog instance (lazy loaded)
+_catalog: Optional[CatalogStore] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> CatalogStore:
+    """Get or load the process-wide catalog."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = CatalogStore.from_csv(
+                    Path(settings.catalog_path),
+                    images_dir=Path(settings.images_dir),
+                    image_base_url=settings.image_base_url,
+                )
+    return _catalog
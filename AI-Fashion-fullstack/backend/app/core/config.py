@@ -1,9 +1,22 @@
 """Application configuration with MongoDB and JWT settings."""
 
 from pydantic_settings import BaseSettings
+from pathlib import Path
 from typing import List
+import json
 import os
 
+PIPELINE_CONFIG_PATH = Path(__file__).resolve().parents[2] / "config" / "pipeline_config.json"
+
+
+def _pipeline_target_ms(default: float = 1000.0) -> float:
+    """Target response time from the pipeline config (used as the default search deadline)."""
+    try:
+        with open(PIPELINE_CONFIG_PATH) as f:
+            return float(json.load(f)["performance"]["target_response_time_ms"])
+    except (OSError, KeyError, TypeError, ValueError):
+        return default
+
 
 class Settings(BaseSettings):
     """Application settings."""
@@ -31,6 +44,129 @@ class Settings(BaseSettings):
     # LLM Model
     llm_model: str = "llama-3.3-70b-versatile"
     
+    # Product catalog
+    catalog_path: str = "data/meta_ssot.csv"
+    
+    # ML models
+    text_model_name: str = "sentence-transformers/all-mpnet-base-v2"
+    clip_model_name: str = "openai/clip-vit-base-patch32"
+    
+    # Query encoder micro-batching
+    encode_max_batch_text: int = 64
+    encode_max_batch_image: int = 16
+    encode_max_wait_ms: float = 5.0
+    
+    # Query embedding cache ("" disables the warm-start file)
+    query_cache_size: int = 10000
+    query_cache_ttl_seconds: float = 86400.0
+    query_cache_path: str = "data/cache/query_embeddings.npz"
+    
+    # Query image embedding cache (sha256 of upload bytes; optional dHash near-duplicates)
+    image_cache_size: int = 2000
+    image_cache_ttl_seconds: float = 3600.0
+    # Max differing dHash bits for reusing a re-encoded copy's embedding; 0 = exact bytes only.
+    # Opt-in: a few bits can also match a different photo on the same plain background.
+    image_cache_phash_distance: int = 0
+    
+    # Query image uploads (streamed size cap, decoded in their own thread pool)
+    max_upload_mb: float = 10.0
+    image_decode_workers: int = 4
+    
+    # Search response cache (non-personalized base results; 0 entries disables it)
+    response_cache_size: int = 5000
+    response_cache_ttl_seconds: float = 600.0
+    response_cache_max_mb: float = 64.0
+    
+    # Async search executor
+    search_executor_workers: int = 8
+    search_max_concurrency: int = 32
+    search_batch_max_queries: int = 256  # /search/batch limit per request
+    
+    # Per-request deadline (performance.target_response_time_ms in config/pipeline_config.json)
+    search_deadline_ms: float = _pipeline_target_ms()  # 0 = no deadline
+    deadline_image_reserve_ms: float = 250.0  # budget needed to decode + encode an uncached image
+    deadline_ann_reserve_ms: float = 150.0  # below this, ANN searches use the reduced effort
+    deadline_ef_search: int = 32
+    deadline_nprobe: int = 4
+    deadline_lexical_reserve_ms: float = 10.0
+    deadline_rewrite_reserve_ms: float = 60.0  # budget needed to encode and search query rewrites
+    deadline_cross_modal_reserve_ms: float = 40.0  # budget needed to encode and search the CLIP text leg
+    deadline_rerank_reserve_ms: float = 20.0
+    deadline_personalization_reserve_ms: float = 100.0
+    deadline_history_reserve_ms: float = 50.0  # below this, history is written after the response
+    
+    # Product images (served under /images, scanned once at startup)
+    images_dir: str = "data/images"
+    image_base_url: str = "http://localhost:8000/images"
+    
+    # Offline embedding build (scripts/build_embeddings.py; batch sizes mirror ModelConfig)
+    batch_size_text: int = 128
+    batch_size_image: int = 64
+    embedding_shard_size: int = 4096
+    embedding_workers: int = 0  # 0 = one decode worker per CPU core
+    
+    # Search indexes
+    embeddings_dir: str = "data/embeddings"
+    index_store_dir: str = "data/indexes"
+    
+    # Index type: Flat | HNSW | IVF | IVFPQ (parameters mirror RetrievalConfig)
+    index_type: str = "Flat"
+    index_hnsw_m: int = 32
+    index_hnsw_ef_construction: int = 200
+    index_hnsw_ef_search: int = 128
+    index_ivf_nlist: int = 0  # 0 = 4 * sqrt(ntotal)
+    index_ivf_nprobe: int = 16
+    index_pq_m: int = 64
+    index_pq_nbits: int = 8
+    
+    # Vector storage: float32 | fp16 | int8 (scalar quantized, exact float32 re-rank)
+    index_storage: str = "float32"
+    index_rerank_k: int = 100  # candidates re-scored with the float32 vectors (0 = off)
+    
+    # Lexical leg of text search (sparse index in index_store_dir, fused with RRF); off until
+    # scripts/evaluate_baselines.py shows the BM25+Dense gain on this catalog (results then
+    # carry fusion_score)
+    lexical_search: bool = False
+    lexical_scheme: str = "bm25"  # bm25 | tfidf
+    lexical_bm25_k1: float = 1.5
+    lexical_bm25_b: float = 0.75
+    lexical_candidates: int = 50  # lexical hits fused per text query
+    lexical_weight: float = 1.0  # RRF weight of the lexical leg (dense leg = 1)
+    lexical_rrf_k: int = 60
+    
+    # Cross-modal leg of text search: CLIP text features searched against the image index;
+    # off until scripts/evaluate_baselines.py shows a gain over Text-only (it costs a CLIP
+    # text encode per uncached query)
+    cross_modal_search: bool = False
+    cross_modal_weight: float = 0.3  # image leg weight of text-only queries (MPNet leg = 1 - weight)
+    
+    # Multi-query rewriting of text queries (RetrievalConfig.enable_rewrite / num_rewrites /
+    # rewrite_merge_strategy, query_rewriting.rrf_k in configs/default.yaml); off until
+    # scripts/evaluate_baselines.py shows a recall / NDCG gain, since rewrites can drift
+    # off the query ("sandals" -> "flats")
+    query_rewrite: bool = False
+    query_rewrite_variants: int = 3
+    query_rewrite_merge: str = "weighted"  # weighted (original 1, rewrites query_rewrite_weight) | union
+    query_rewrite_weight: float = 0.3  # RRF weight of each rewrite with "weighted"
+    query_rewrite_rrf_k: int = 60
+    query_rewrite_cache_size: int = 10000
+    query_expander_path: str = "data/models/query_expander.pkl"
+    
+    # Second-stage reranker over retrieval candidates: fusion | advanced | none
+    # (off until scripts/evaluate_baselines.py shows a gain; results then carry rerank_score)
+    reranker: str = "none"
+    reranker_models_dir: str = "data/models"
+    reranker_candidates: int = 50  # retrieval depth re-scored per text query
+    
+    # Precomputed item-to-item neighbors (scripts/build_neighbors.py, stored in index_store_dir)
+    neighbors_k: int = 50  # neighbors kept per product; larger requests use live search
+    neighbors_alpha: float = 0.7  # text weight of the fused neighbors
+    neighbors_block_rows: int = 1024  # products scored per blocked matrix multiply
+    neighbors_default_kind: str = "fused"  # text | image | fused
+    
+    # Personalization
+    recommender_embeddings_path: str = "data/embeddings/minilm_products_384d.npy"
+    
     # Case-insensitive property accessors
     @property
     def GROQ_API_KEY(self):
@@ -0,0 +1,68 @@
+"""
+Per-request time budgets for the search pipeline.
+
+A `Deadline` starts when the endpoint receives the request. Before each
+optional or tunable stage (image leg, ANN effort, personalization, history
+write) the pipeline asks whether enough budget remains; when it does not, the
+stage is skipped or cheapened and the decision is recorded, so the response
+can report exactly how it was degraded.
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+
+class Deadline:
+    """Time budget of one request, with a record of skipped/degraded stages."""
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        """
+        Args:
+            budget_ms: Budget in milliseconds (defaults to settings.search_deadline_ms;
+                0 or less means unlimited)
+        """
+        self.budget_ms = settings.search_deadline_ms if budget_ms is None else budget_ms
+        self.skipped: List[str] = []
+        self.degraded: Dict[str, Any] = {}
+        self._start = time.perf_counter()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.budget_ms <= 0
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def remaining_ms(self) -> float:
+        if self.unlimited:
+            return float("inf")
+        return self.budget_ms - self.elapsed_ms()
+
+    def allows(self, stage: str, cost_ms: float) -> bool:
+        """
+        True if at least `cost_ms` of the budget is left for `stage`;
+        otherwise the stage is recorded as skipped.
+        """
+        if self.remaining_ms() >= cost_ms:
+            return True
+        self.skip(stage)
+        return False
+
+    def skip(self, stage: str):
+        """Record that `stage` was skipped."""
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+
+    def degrade(self, stage: str, detail: Any):
+        """Record that `stage` ran in a cheaper mode."""
+        self.degraded[stage] = detail
+
+    def report(self) -> Dict[str, Any]:
+        """Budget summary for the response body."""
+        return {
+            "budget_ms": None if self.unlimited else self.budget_ms,
+            "elapsed_ms": round(self.elapsed_ms(), 3),
+            "skipped": list(self.skipped),
+            "degraded": dict(self.degraded),
+        }
@@ -0,0 +1,430 @@
+"""
+Offline catalog embedding build.
+
+Encodes the `meta_ssot.csv` descriptions with MPNet and CLIP text, and the
+product images with CLIP, in configurable batches. Each encoder ("leg") writes
+fixed-size shards under ``<output_dir>/shards/<leg>/`` so an interrupted build
+resumes at the first missing shard. Images are decoded and resized in a worker
+pool, one batch at a time, and the final matrices are assembled shard by shard
+into memory-mapped files, so neither the images nor the full matrices are ever
+held in RAM.
+"""
+import json
+import multiprocessing
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from app.core.catalog import CatalogStore
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "embeddings_manifest.json"
+SHARD_STATE_NAME = "state.json"
+
+# Encoder legs and their output dimension
+LEGS = {
+    "mpnet": 768,
+    "clip_text": 512,
+    "clip_image": 512,
+}
+
+# Final artifacts: file name -> legs it is derived from
+OUTPUTS = {
+    "mpnet_768d.npy": ("mpnet",),
+    "clip_image_512d_normalized.npy": ("clip_image",),
+    "combined_1280d_normalized.npy": ("mpnet", "clip_text"),
+}
+
+
+def _save_atomic(path: Path, array: np.ndarray):
+    tmp_path = path.with_name(path.name + ".tmp.npy")
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def _l2_normalize(chunk: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return chunk / norms
+
+
+class EmbeddingBuilder:
+    """Batched, resumable catalog encoder."""
+
+    def __init__(
+        self,
+        catalog: CatalogStore,
+        output_dir: Path,
+        images_dir: Path,
+        batch_size_text: int = 128,
+        batch_size_image: int = 64,
+        shard_size: int = 4096,
+        num_workers: int = 0,
+        device: Optional[str] = None,
+    ):
+        """
+        Args:
+            catalog: Product catalog (row order defines embedding order)
+            output_dir: Directory for the final .npy files and manifest
+            images_dir: Directory with `{product_id}.jpg` images
+            batch_size_text: Texts per encoder forward pass
+            batch_size_image: Images per encoder forward pass
+            shard_size: Rows per checkpoint shard
+            num_workers: Image decode processes (0 = one per CPU core)
+            device: Torch device ("cuda"/"cpu", auto-detected if None)
+        """
+        self.catalog = catalog
+        self.output_dir = Path(output_dir)
+        self.images_dir = Path(images_dir)
+        self.shard_dir = self.output_dir / "shards"
+        self.batch_size_text = batch_size_text
+        self.batch_size_image = batch_size_image
+        self.shard_size = shard_size
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.device = device
+        self.text_model = None
+        self.clip_model = None
+        self.clip_processor = None
+
+    # ==================== MODELS ====================
+
+    def _load_models(self, legs: Sequence[str]):
+        """Load only the encoders the pending shards need."""
+        import torch
+
+        if self.device is None:
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        if "mpnet" in legs and self.text_model is None:
+            from sentence_transformers import SentenceTransformer
+            self.text_model = SentenceTransformer(settings.text_model_name, device=self.device)
+            logger.info(f"✅ Text model loaded ({settings.text_model_name})")
+
+        if {"clip_text", "clip_image"} & set(legs) and self.clip_model is None:
+            from transformers import CLIPModel, CLIPProcessor
+            self.clip_model = CLIPModel.from_pretrained(settings.clip_model_name).to(self.device).eval()
+            self.clip_processor = CLIPProcessor.from_pretrained(settings.clip_model_name)
+            logger.info(f"✅ CLIP model loaded ({settings.clip_model_name})")
+
+    def _encode_mpnet(self, texts: List[str]) -> np.ndarray:
+        return self.text_model.encode(
+            texts, batch_size=self.batch_size_text, convert_to_numpy=True, show_progress_bar=False
+        ).astype(np.float32)
+
+    def _encode_clip_text(self, texts: List[str]) -> np.ndarray:
+        import torch
+
+        out = []
+        for start in range(0, len(texts), self.batch_size_text):
+            tokens = self.clip_processor.tokenizer(
+                texts[start:start + self.batch_size_text],
+                padding=True, truncation=True, max_length=77, return_tensors="pt"
+            ).to(self.device)
+            with torch.inference_mode():
+                out.append(self.clip_model.get_text_features(**tokens).cpu().numpy())
+        return np.concatenate(out).astype(np.float32)
+
+    def _encode_clip_images(self, rows: np.ndarray, pool) -> np.ndarray:
+        """Encode images for `rows`; missing/unreadable images get zero vectors."""
+        import torch
+        from app.services.image_preprocessing import load_image_for_clip, to_pixel_values
+
+        paths = [str(self.images_dir / f"{pid}.jpg") for pid in self.catalog.ids[rows]]
+        out = np.zeros((len(paths), LEGS["clip_image"]), dtype=np.float32)
+
+        batch, batch_pos = [], []
+
+        def flush():
+            pixels = torch.from_numpy(to_pixel_values(batch)).to(self.device)
+            with torch.inference_mode():
+                out[batch_pos] = self.clip_model.get_image_features(pixel_values=pixels).cpu().numpy()
+            batch.clear()
+            batch_pos.clear()
+
+        # imap keeps decoding ahead of the encoder without materializing every image
+        decoded = pool.imap(load_image_for_clip, paths, chunksize=max(1, self.batch_size_image // 4))
+        for pos, image in enumerate(decoded):
+            if image is None:
+                continue
+            batch.append(image)
+            batch_pos.append(pos)
+            if len(batch) == self.batch_size_image:
+                flush()
+        if batch:
+            flush()
+
+        return out
+
+    # ==================== SHARDS ====================
+
+    def _shard_state(self) -> Dict:
+        return {
+            "catalog_fingerprint": self.catalog.fingerprint,
+            "ntotal": len(self.catalog),
+            "shard_size": self.shard_size,
+            "text_model": settings.text_model_name,
+            "clip_model": settings.clip_model_name,
+        }
+
+    def _prepare_shard_dir(self):
+        """Reuse existing shards only if they were built for this catalog and models."""
+        state_path = self.shard_dir / SHARD_STATE_NAME
+        state = self._shard_state()
+        if state_path.exists() and json.loads(state_path.read_text()) != state:
+            logger.warning("⚠️ Existing shards belong to a different catalog/model, discarding them")
+            shutil.rmtree(self.shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        state_path.write_text(json.dumps(state, indent=2))
+
+    def _shard_ranges(self) -> List[Tuple[int, int]]:
+        n = len(self.catalog)
+        return [(start, min(start + self.shard_size, n)) for start in range(0, n, self.shard_size)]
+
+    def _shard_path(self, leg: str, start: int) -> Path:
+        return self.shard_dir / leg / f"{start:08d}.npy"
+
+    def _shard_done(self, leg: str, start: int, end: int) -> bool:
+        path = self._shard_path(leg, start)
+        if not path.exists():
+            return False
+        try:
+            return np.load(path, mmap_mode="r").shape == (end - start, LEGS[leg])
+        except (ValueError, OSError):
+            return False
+
+    def _iter_shards(self, leg: str) -> Iterator[Tuple[int, np.ndarray]]:
+        for start, _ in self._shard_ranges():
+            yield start, np.load(self._shard_path(leg, start))
+
+    # ==================== BUILD ====================
+
+    def encode(self, legs: Sequence[str] = tuple(LEGS)):
+        """Encode every pending shard of the requested legs."""
+        self._prepare_shard_dir()
+        texts = self.catalog.df["desc"].fillna("").astype(str).tolist()
+
+        pending = {
+            leg: [(s, e) for s, e in self._shard_ranges() if not self._shard_done(leg, s, e)]
+            for leg in legs
+        }
+        for leg in legs:
+            done = len(self._shard_ranges()) - len(pending[leg])
+            logger.info(f"{leg}: {done} shards done, {len(pending[leg])} pending")
+
+        todo = [leg for leg in legs if pending[leg]]
+        if not todo:
+            return
+        self._load_models(todo)
+
+        pool = None
+        if pending.get("clip_image"):
+            pool = multiprocessing.get_context("spawn").Pool(self.num_workers)
+
+        try:
+            for leg in todo:
+                (self.shard_dir / leg).mkdir(parents=True, exist_ok=True)
+                for i, (start, end) in enumerate(pending[leg], 1):
+                    if leg == "mpnet":
+                        emb = self._encode_mpnet(texts[start:end])
+                    elif leg == "clip_text":
+                        emb = self._encode_clip_text(texts[start:end])
+                    else:
+                        emb = self._encode_clip_images(np.arange(start, end), pool)
+                    _save_atomic(self._shard_path(leg, start), emb)
+                    logger.info(f"{leg}: shard {start}-{end} done ({i}/{len(pending[leg])})")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def assemble(self) -> Dict:
+        """
+        Concatenate shards into the float32/float16 outputs and write the manifest.
+
+        Outputs whose legs are not fully encoded are skipped.
+        """
+        n = len(self.catalog)
+        complete = {
+            leg for leg in LEGS
+            if all(self._shard_done(leg, s, e) for s, e in self._shard_ranges())
+        }
+
+        files = {}
+        for name, legs in OUTPUTS.items():
+            if not set(legs) <= complete:
+                logger.warning(f"⚠️ Skipping {name}: shards for {', '.join(legs)} are incomplete")
+                continue
+            if name == "mpnet_768d.npy":
+                dim, normalized = LEGS["mpnet"], False
+            elif name == "clip_image_512d_normalized.npy":
+                dim, normalized = LEGS["clip_image"], True
+            else:
+                dim, normalized = LEGS["mpnet"] + LEGS["clip_text"], True
+
+            f32_path = self.output_dir / name
+            f16_path = self.output_dir / name.replace(".npy", ".f16.npy")
+            f32 = np.lib.format.open_memmap(f32_path.with_name(f32_path.name + ".tmp"), mode="w+",
+                                            dtype=np.float32, shape=(n, dim))
+            f16 = np.lib.format.open_memmap(f16_path.with_name(f16_path.name + ".tmp"), mode="w+",
+                                            dtype=np.float16, shape=(n, dim))
+
+            shard_iters = [self._iter_shards(leg) for leg in legs]
+            empty_rows = 0
+            for parts in zip(*shard_iters):
+                start = parts[0][0]
+                chunk = np.concatenate([p[1] for p in parts], axis=1)
+                empty_rows += int((~chunk.any(axis=1)).sum())
+                if normalized:
+                    chunk = _l2_normalize(chunk)
+                f32[start:start + len(chunk)] = chunk
+                f16[start:start + len(chunk)] = chunk
+            f32.flush()
+            f16.flush()
+            del f32, f16
+            os.replace(f32_path.with_name(f32_path.name + ".tmp"), f32_path)
+            os.replace(f16_path.with_name(f16_path.name + ".tmp"), f16_path)
+
+            files[name] = {
+                "float16": f16_path.name,
+                "dim": dim,
+                "ntotal": n,
+                "normalized": normalized,
+                "legs": list(legs),
+                "empty_rows": empty_rows,
+            }
+            logger.info(f"✅ {name}: {n} x {dim} ({empty_rows} empty rows)")
+
+        manifest = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "catalog_fingerprint": self.catalog.fingerprint,
+            "text_model": settings.text_model_name,
+            "clip_model": settings.clip_model_name,
+            "files": files,
+        }
+        (self.output_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+        return manifest
+
+    def build(self, legs: Sequence[str] = tuple(LEGS)) -> Dict:
+        """Encode pending shards, then assemble the final outputs."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.encode(legs)
+        return self.assemble()
+
+
+# Pre-native-dimension image file: CLIP 512d zero-padded to 768d
+LEGACY_IMAGE_OUTPUT = "clip_image_768d_normalized.npy"
+
+# Rows copied per chunk when stripping padding
+_MIGRATE_CHUNK_ROWS = 16384
+
+
+def strip_zero_padding(source: Path, target: Path, dim: int, atol: float = 1e-6) -> Tuple[int, int]:
+    """
+    Copy the first `dim` columns of an embedding matrix, re-normalizing rows.
+
+    Refuses matrices whose trailing columns are not zero (e.g. genuine 768d
+    ViT-L/14 embeddings), since truncating those would corrupt them.
+
+    Args:
+        source: Zero-padded ``.npy`` matrix
+        target: Output ``.npy`` path (written atomically, source dtype kept)
+        dim: Native embedding dimension to keep
+        atol: Largest absolute value still counted as padding
+
+    Returns:
+        (rows, dropped columns)
+    """
+    raw = np.load(source, mmap_mode="r")
+    if raw.ndim != 2 or raw.shape[1] < dim:
+        raise ValueError(f"Expected an (n, >={dim}) matrix in {source}, got shape {raw.shape}")
+
+    n_rows, padded_dim = raw.shape
+    for start in range(0, n_rows, _MIGRATE_CHUNK_ROWS):
+        tail = np.abs(np.asarray(raw[start:start + _MIGRATE_CHUNK_ROWS, dim:], dtype=np.float32))
+        if tail.size and tail.max() > atol:
+            raise ValueError(
+                f"{source.name} has non-zero values beyond column {dim} (max {tail.max():.3g}); "
+                f"it is not zero-padded {dim}d data, re-encode it with `python -m scripts.build_embeddings`"
+            )
+
+    tmp_path = target.with_name(target.name + ".tmp")
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=raw.dtype, shape=(n_rows, dim))
+    for start in range(0, n_rows, _MIGRATE_CHUNK_ROWS):
+        chunk = np.asarray(raw[start:start + _MIGRATE_CHUNK_ROWS, :dim], dtype=np.float32)
+        out[start:start + len(chunk)] = _l2_normalize(chunk)
+    out.flush()
+    del out
+    os.replace(tmp_path, target)
+    return n_rows, padded_dim - dim
+
+
+def migrate_image_embeddings(embeddings_dir: Path, remove_source: bool = False) -> Dict:
+    """
+    Convert the legacy zero-padded image embeddings to native CLIP dimension.
+
+    Migrates the float32 file and its ``.f16.npy`` companion when present, and
+    updates the embeddings manifest entry.
+
+    Returns:
+        Mapping of migrated file name -> {"source", "ntotal", "dim", "dropped"}
+    """
+    embeddings_dir = Path(embeddings_dir)
+    dim = LEGS["clip_image"]
+    target_name = f"clip_image_{dim}d_normalized.npy"
+    pairs = [
+        (LEGACY_IMAGE_OUTPUT, target_name),
+        (LEGACY_IMAGE_OUTPUT.replace(".npy", ".f16.npy"), target_name.replace(".npy", ".f16.npy")),
+    ]
+
+    migrated = {}
+    for source_name, out_name in pairs:
+        source = embeddings_dir / source_name
+        if not source.exists():
+            continue
+        n_rows, dropped = strip_zero_padding(source, embeddings_dir / out_name, dim)
+        migrated[out_name] = {"source": source_name, "ntotal": n_rows, "dim": dim, "dropped": dropped}
+        logger.info(f"✅ {source_name} -> {out_name}: {n_rows} x {dim} ({dropped} padding columns dropped)")
+
+    if not migrated:
+        raise FileNotFoundError(f"No {LEGACY_IMAGE_OUTPUT} found in {embeddings_dir}")
+
+    manifest_path = embeddings_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        entry = manifest.get("files", {}).pop(LEGACY_IMAGE_OUTPUT, None)
+        if entry is not None:
+            entry.update(dim=dim, float16=target_name.replace(".npy", ".f16.npy"))
+            manifest["files"][target_name] = entry
+            manifest_path.write_text(json.dumps(manifest, indent=2))
+
+    if remove_source:
+        for info in migrated.values():
+            (embeddings_dir / info["source"]).unlink()
+    return migrated
+
+
+def ensure_native_image_embeddings(embeddings_dir: Path) -> bool:
+    """
+    Strip the padding in place when only the legacy image embeddings exist.
+
+    Lets an old data directory start without a manual migration; a legacy file
+    that is not actually zero-padded raises (see `strip_zero_padding`) rather
+    than being served at the wrong dimension.
+
+    Returns:
+        Whether a migration ran
+    """
+    embeddings_dir = Path(embeddings_dir)
+    target = embeddings_dir / f"clip_image_{LEGS['clip_image']}d_normalized.npy"
+    if target.exists() or not (embeddings_dir / LEGACY_IMAGE_OUTPUT).exists():
+        return False
+    logger.warning(f"⚠️ Only zero-padded {LEGACY_IMAGE_OUTPUT} found, migrating it to {target.name}")
+    migrate_image_embeddings(embeddings_dir)
+    return True
@@ -0,0 +1,114 @@
+"""
+Late fusion of per-modality search legs.
+
+Each leg contributes its own candidate rows. Fusion scores the union of all
+candidates exactly on every leg (dotting the query against the stored vectors),
+so a product found by only one leg still gets its real similarity on the
+other, then combines the legs with one weighted sum and a partial top-k.
+"""
+from typing import Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.vector_ops import top_k
+
+# (index, query embedding, candidate rows from that index; -1 = missing)
+Leg = Tuple[object, np.ndarray, np.ndarray]
+
+
+def cosine_to_unit(scores: np.ndarray) -> np.ndarray:
+    """Map cosine similarities from [-1, 1] onto [0, 1]."""
+    return np.clip((scores + 1.0) / 2.0, 0.0, 1.0)
+
+
+def exact_leg_scores(index, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Exact inner products of one query against the stored vectors of `rows`."""
+    if not len(rows):
+        return np.empty(0, dtype=np.float32)
+    vectors = index.reconstruct_batch(np.asarray(rows, dtype=np.int64))
+    return vectors @ np.asarray(query, dtype=np.float32).ravel()
+
+
+def fuse_legs(legs: Sequence[Leg], weights: Sequence[float], k: int,
+              transform: Optional[Callable[[np.ndarray], np.ndarray]] = None
+              ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Weighted fusion over the union of the legs' candidates.
+
+    Args:
+        legs: (index, query, candidate rows) per modality; indexes must expose
+            ``reconstruct_batch`` and share row ids
+        weights: Weight per leg (e.g. ``(alpha, 1 - alpha)``)
+        k: Number of fused results
+        transform: Optional per-leg score calibration applied before weighting
+
+    Returns:
+        (fused_scores, rows, leg_scores, found), sorted by fused score;
+        leg_scores is (n_legs, n) with each leg's exact (transformed) score and
+        found is (n_legs, n), True where the row was a candidate of that leg
+    """
+    candidates = [np.asarray(rows, dtype=np.int64).ravel() for _, _, rows in legs]
+    union = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+    union = union[union >= 0]
+
+    leg_scores = np.vstack([exact_leg_scores(index, query, union) for index, query, _ in legs])
+    if transform is not None:
+        leg_scores = transform(leg_scores)
+    fused = np.asarray(weights, dtype=np.float32) @ leg_scores
+
+    top_scores, order = top_k(fused[None, :], k)
+    order = order[0][order[0] >= 0]
+    found = np.vstack([np.isin(union[order], rows) for rows in candidates])
+    return top_scores[0][:len(order)], union[order], leg_scores[:, order], found
+
+
+def rrf_aggregate(ranked_lists: Sequence[np.ndarray], k: int, c: int = 60,
+                  weights: Optional[Sequence[float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reciprocal Rank Fusion of several rankings for a batch of queries.
+
+    Each list contributes ``weight / (c + rank)`` (rank starting at 1) to every
+    row it returns; contributions of the same row are summed with one
+    ``bincount`` over (query, row) keys, without per-query Python loops.
+    Equal scores keep the order in which rows first appear (lists in order).
+
+    Args:
+        ranked_lists: (n_queries, depth_i) row ids per ranking, best first, -1 = missing
+        k: Number of fused results per query
+        c: RRF constant
+        weights: Optional weight per ranking (default 1 each)
+
+    Returns:
+        (scores, rows), (n_queries, k), sorted by fused score; padded with 0 / -1
+    """
+    lists = [np.atleast_2d(np.asarray(rows, dtype=np.int64)) for rows in ranked_lists]
+    n_queries = lists[0].shape[0]
+    weights = np.ones(len(lists)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    rows = np.hstack(lists)
+    contrib = np.hstack([
+        np.broadcast_to(w / (c + np.arange(1, r.shape[1] + 1)), r.shape) for w, r in zip(weights, lists)
+    ])
+    queries = np.broadcast_to(np.arange(n_queries)[:, None], rows.shape)
+    valid = rows >= 0
+
+    # One key per (query, row); summed contributions per key
+    stride = int(rows.max(initial=0)) + 1
+    keys, first, inverse = np.unique(
+        queries[valid] * stride + rows[valid], return_index=True, return_inverse=True
+    )
+    fused = np.bincount(inverse, weights=contrib[valid], minlength=len(keys))
+    key_queries, key_rows = keys // stride, keys % stride
+
+    # Best first within each query (ties: first seen, in list order), then the first k of every query
+    order = np.lexsort((first, -fused, key_queries))
+    starts = np.searchsorted(key_queries[order], np.arange(n_queries))
+    position = np.arange(len(order)) - starts[key_queries[order]]
+    keep = order[position < k]
+
+    scores = np.zeros((n_queries, k), dtype=np.float32)
+    top_rows = np.full((n_queries, k), -1, dtype=np.int64)
+    slots = (key_queries[keep], position[position < k])
+    scores[slots] = fused[keep]
+    top_rows[slots] = key_rows[keep]
+    return scores, top_rows
@@ -0,0 +1,191 @@
+"""
+FAISS index factory for the search index store.
+
+Builds Flat, HNSW, IVF-Flat and IVF-PQ inner-product indexes from the
+``index_*`` settings, which mirror ``RetrievalConfig`` in
+v2.0-baseline/src/config.py, and maps per-request tuning knobs (``ef_search``
+for HNSW, ``nprobe`` for IVF) onto FAISS search parameters.
+
+Flat, HNSW and IVF indexes can store their vectors scalar-quantized (fp16 or
+int8 per dimension) instead of float32; the index store then re-scores the
+top ``rerank_k`` candidates exactly against the memory-mapped float32 matrix.
+"""
+import math
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+import logging
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Supported index types ("IVF" is IVF-Flat, as in RetrievalConfig)
+INDEX_TYPES = ("Flat", "HNSW", "IVF", "IVFPQ")
+
+# Vector storage -> FAISS encoding (IVFPQ always uses its own PQ codes)
+STORAGE_TYPES = {
+    "float32": "Flat",
+    "fp16": "SQfp16",
+    "int8": "SQ8",
+}
+
+# Vectors added per chunk (keeps memory flat when adding from a memmap)
+_ADD_CHUNK_ROWS = 16384
+
+
+@dataclass
+class IndexSpec:
+    """Index type and build/search parameters."""
+    index_type: str = "Flat"
+    m: int = 32                  # HNSW graph degree
+    ef_construction: int = 200   # HNSW build beam width
+    ef_search: int = 128         # HNSW default search beam width
+    nlist: int = 0               # IVF cells (0 = 4 * sqrt(ntotal))
+    nprobe: int = 16             # IVF default cells visited per query
+    pq_m: int = 64               # PQ sub-quantizers (must divide the dimension)
+    pq_nbits: int = 8            # Bits per PQ code
+    train_size: int = 100000     # Max vectors sampled for IVF/PQ training
+    storage: str = "float32"     # Vector encoding: float32 | fp16 | int8
+    rerank_k: int = 100          # Candidates re-scored exactly for lossy indexes (0 = off)
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{self.index_type}', expected one of {INDEX_TYPES}")
+        if self.storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage '{self.storage}', expected one of {tuple(STORAGE_TYPES)}")
+
+    @classmethod
+    def from_settings(cls) -> "IndexSpec":
+        return cls(
+            index_type=settings.index_type,
+            m=settings.index_hnsw_m,
+            ef_construction=settings.index_hnsw_ef_construction,
+            ef_search=settings.index_hnsw_ef_search,
+            nlist=settings.index_ivf_nlist,
+            nprobe=settings.index_ivf_nprobe,
+            pq_m=settings.index_pq_m,
+            pq_nbits=settings.index_pq_nbits,
+            storage=settings.index_storage,
+            rerank_k=settings.index_rerank_k,
+        )
+
+    @property
+    def uses_faiss(self) -> bool:
+        """Whether the store needs a FAISS index file (anything but float32 Flat)."""
+        return self.index_type != "Flat" or self.storage != "float32"
+
+    @property
+    def is_lossy(self) -> bool:
+        """Whether index scores are approximate (quantized vectors or PQ codes)."""
+        return self.storage != "float32" or self.index_type == "IVFPQ"
+
+    @property
+    def label(self) -> str:
+        """Short name used in index file names, e.g. ``hnsw`` or ``flat-int8``."""
+        if self.storage == "float32" or self.index_type == "IVFPQ":
+            return self.index_type.lower()
+        return f"{self.index_type.lower()}-{self.storage}"
+
+    def resolved_nlist(self, ntotal: int) -> int:
+        return self.nlist or max(1, min(65536, int(4 * math.sqrt(ntotal))))
+
+    def factory_string(self, dim: int, ntotal: int) -> str:
+        """FAISS index_factory description for this spec."""
+        encoding = STORAGE_TYPES[self.storage]
+        if self.index_type == "Flat":
+            return encoding
+        if self.index_type == "HNSW":
+            return f"HNSW{self.m},{encoding}"
+        nlist = self.resolved_nlist(ntotal)
+        if self.index_type == "IVF":
+            return f"IVF{nlist},{encoding}"
+        if dim % self.pq_m:
+            raise ValueError(f"pq_m={self.pq_m} must divide the vector dimension {dim}")
+        return f"IVF{nlist},PQ{self.pq_m}x{self.pq_nbits}"
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def build_faiss_index(vectors: np.ndarray, spec: IndexSpec, seed: int = 0) -> faiss.Index:
+    """
+    Build an inner-product index over (normalized) vectors.
+
+    Args:
+        vectors: (n, d) float32 matrix; may be a read-only memmap
+        spec: Index type and parameters
+        seed: Seed for the training sample
+
+    Returns:
+        Populated FAISS index with the spec's default search parameters set
+    """
+    n_rows, dim = vectors.shape
+    index = faiss.index_factory(dim, spec.factory_string(dim, n_rows), faiss.METRIC_INNER_PRODUCT)
+
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efConstruction = spec.ef_construction
+
+    if not index.is_trained:
+        n_train = min(n_rows, spec.train_size)
+        sample = np.sort(np.random.default_rng(seed).choice(n_rows, n_train, replace=False))
+        index.train(np.ascontiguousarray(vectors[sample], dtype=np.float32))
+
+    for start in range(0, n_rows, _ADD_CHUNK_ROWS):
+        index.add(np.ascontiguousarray(vectors[start:start + _ADD_CHUNK_ROWS], dtype=np.float32))
+
+    set_default_search_params(index, spec)
+    return index
+
+
+def set_default_search_params(index: faiss.Index, spec: IndexSpec):
+    """Store the spec's ef_search / nprobe on the index itself."""
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = spec.ef_search
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = spec.nprobe
+
+
+def search_parameters(
+    index: faiss.Index,
+    ef_search: Optional[int] = None,
+    nprobe: Optional[int] = None,
+    selector: Optional[faiss.IDSelector] = None,
+) -> Optional[faiss.SearchParameters]:
+    """
+    Per-request FAISS search parameters.
+
+    Unset knobs fall back to the values stored on the index; returns None when
+    nothing differs from a plain search.
+    """
+    if ef_search is None and nprobe is None and selector is None:
+        return None
+
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = ef_search or base.hnsw.efSearch
+    elif isinstance(base, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = min(nprobe or base.nprobe, base.nlist)
+    else:
+        params = faiss.SearchParameters()
+
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def bitmap_selector(mask: np.ndarray):
+    """
+    FAISS selector over a boolean row mask.
+
+    Returns:
+        (selector, bitmap); keep the bitmap alive for as long as the selector
+    """
+    bitmap = np.packbits(mask, bitorder="little")
+    return faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap)), bitmap
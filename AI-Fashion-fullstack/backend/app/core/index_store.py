@@ -0,0 +1,377 @@
+"""
+Persisted, memory-mapped vector indexes.
+
+`build_index_store` turns the raw catalog embeddings in ``data/embeddings`` into
+normalized float32 matrices plus a ``manifest.json``. `load_index_store` opens
+them with ``np.load(mmap_mode="r")`` so startup does no copying or
+normalization, and every uvicorn worker shares one page-cached copy.
+
+With a non-Flat `IndexSpec` (HNSW, IVF, IVF-PQ) or quantized storage (fp16,
+int8) a FAISS index file is written next to each matrix and loaded with
+``IO_FLAG_MMAP``; the float32 matrix is kept for exact scoring of candidates,
+and lossy indexes re-rank their top candidates against it.
+"""
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import logging
+
+import faiss
+import numpy as np
+
+from app.core.embedding_builder import ensure_native_image_embeddings
+from app.core.index_factory import IndexSpec, bitmap_selector, build_faiss_index, search_parameters
+from app.core.vector_ops import MISSING_SCORE, top_k
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+STORE_VERSION = 1
+
+# index name -> raw embedding file in data/embeddings (native encoder dims)
+INDEX_SOURCES = {
+    "text": "mpnet_768d.npy",
+    "image": "clip_image_512d_normalized.npy",
+}
+
+# Rows normalized per chunk while building (keeps peak memory flat)
+_BUILD_CHUNK_ROWS = 8192
+
+# Filtered flat search: when at least this share of rows passes the filter,
+# score every row and mask; below it, gather and score only the selected rows
+_DENSE_FILTER_RATIO = 0.25
+
+# Filtered ANN search: graph / IVF traversal under a selective IDSelector can
+# come back with far fewer than k hits, so when at most this many rows pass the
+# filter they are scanned exactly instead (20k x 768 float32 is a ~1 ms matmul)
+_ANN_EXACT_FILTER_ROWS = 20000
+
+
+class MmapFlatIndex:
+    """
+    Exact inner-product index over a (possibly memory-mapped) float32 matrix.
+
+    Exposes the subset of the ``faiss.IndexFlatIP`` interface the search code
+    relies on (``d``, ``ntotal``, ``search``, ``reconstruct_batch``) without
+    ever copying the vectors into private memory.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+
+    def search(self, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None,
+               **search_params) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (scores, indices) of the k best rows for each query.
+
+        Args:
+            queries: (n, d) query matrix
+            k: Results per query
+            mask: Optional boolean row mask; only rows where it is True are
+                candidates (fewer than k matches are padded with -1)
+            search_params: ANN knobs (ef_search, nprobe); ignored, the scan is exact
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.d)
+        if mask is None:
+            return top_k(queries @ self.vectors.T, k)
+
+        rows = np.flatnonzero(mask)
+        if len(rows) >= _DENSE_FILTER_RATIO * self.ntotal:
+            scores = queries @ self.vectors.T
+            scores[:, ~mask] = MISSING_SCORE
+            top_scores, top_idx = top_k(scores, k)
+            top_idx[top_scores == MISSING_SCORE] = -1
+            return top_scores, top_idx
+
+        top_scores, local_idx = top_k(queries @ self.vectors[rows].T, k)
+        if not len(rows):
+            return top_scores, local_idx
+        return top_scores, np.where(local_idx >= 0, rows[np.maximum(local_idx, 0)], -1)
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        """Return the stored vectors for the given row ids."""
+        return np.asarray(self.vectors[np.asarray(ids, dtype=np.int64)], dtype=np.float32)
+
+
+class MmapAnnIndex:
+    """
+    FAISS index (HNSW / IVF / IVF-PQ / scalar-quantized) loaded from the store.
+
+    Searches go through FAISS with per-request parameters; stored vectors are
+    served from the memory-mapped float32 matrix written alongside it. With
+    ``rerank_k`` set, the top ``max(k, rerank_k)`` FAISS candidates are
+    re-scored exactly against that matrix, so quantization only affects which
+    rows become candidates, not the returned scores.
+    """
+
+    def __init__(self, index: faiss.Index, vectors: np.ndarray, rerank_k: int = 0):
+        self.index = index
+        self.vectors = vectors
+        self.rerank_k = rerank_k
+        self.ntotal, self.d = vectors.shape
+
+    def search(self, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None,
+               ef_search: Optional[int] = None, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (scores, indices) of the approximate k best rows for each query.
+
+        Filtered searches return ``min(k, mask.sum())`` hits per query: small
+        selections are scanned exactly, and queries the traversal left short
+        are re-run exactly over the selected rows.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.d)
+        if mask is not None:
+            n_selected = int(np.count_nonzero(mask))
+            if n_selected <= _ANN_EXACT_FILTER_ROWS:
+                return MmapFlatIndex(self.vectors).search(queries, k, mask)
+
+        if not self.rerank_k:
+            scores, indices = _faiss_search(self.index, queries, k, mask, ef_search, nprobe)
+        else:
+            _, candidates = _faiss_search(self.index, queries, max(k, self.rerank_k), mask, ef_search, nprobe)
+            scores, indices = exact_rerank(self.vectors, queries, candidates, k)
+
+        if mask is not None:
+            short = (indices >= 0).sum(axis=1) < min(k, n_selected)
+            if short.any():
+                scores[short], indices[short] = MmapFlatIndex(self.vectors).search(queries[short], k, mask)
+        return scores, indices
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        """Return the stored vectors for the given row ids."""
+        return np.asarray(self.vectors[np.asarray(ids, dtype=np.int64)], dtype=np.float32)
+
+
+def _faiss_search(index: faiss.Index, queries: np.ndarray, k: int, mask: Optional[np.ndarray],
+                  ef_search: Optional[int], nprobe: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+    queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, index.d)
+    selector, bitmap = bitmap_selector(mask) if mask is not None else (None, None)
+    params = search_parameters(index, ef_search=ef_search, nprobe=nprobe, selector=selector)
+    return index.search(queries, k, params=params)
+
+
+def exact_rerank(vectors: np.ndarray, queries: np.ndarray, candidates: np.ndarray,
+                 k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Re-score candidate rows with the float32 vectors and keep the k best.
+
+    Args:
+        vectors: (n, d) float32 matrix (may be memory-mapped; only candidate
+            rows are read)
+        queries: (n_queries, d) float32 queries
+        candidates: (n_queries, c) row ids, -1 for missing
+        k: Results per query
+
+    Returns:
+        (scores, indices), (n_queries, k), padded with MISSING_SCORE / -1
+    """
+    valid = candidates >= 0
+    rows = np.where(valid, candidates, 0)
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    gathered = np.asarray(vectors[unique_rows], dtype=np.float32)
+    scores = (queries @ gathered.T)[np.arange(len(queries))[:, None], inverse.reshape(rows.shape)]
+    scores[~valid] = MISSING_SCORE
+
+    top_scores, local_idx = top_k(scores, k)
+    top_idx = np.take_along_axis(rows, np.maximum(local_idx, 0), axis=1)
+    top_idx[top_scores == MISSING_SCORE] = -1
+    return top_scores, top_idx
+
+
+def search_index(index, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None,
+                 ef_search: Optional[int] = None, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Search a store index or an in-memory FAISS index.
+
+    Args:
+        index: MmapFlatIndex, MmapAnnIndex or a raw FAISS index
+        queries: (n, d) query matrix
+        k: Results per query
+        mask: Optional boolean row mask, pushed into the index (FAISS gets an
+            IDSelectorBitmap) so k hits come back whenever k rows match
+        ef_search: HNSW beam width for this request (index default if None)
+        nprobe: IVF cells to visit for this request (index default if None)
+    """
+    if isinstance(index, (MmapFlatIndex, MmapAnnIndex)):
+        return index.search(queries, k, mask=mask, ef_search=ef_search, nprobe=nprobe)
+    return _faiss_search(index, queries, k, mask, ef_search, nprobe)
+
+
+def _source_fingerprint(path: Path) -> Dict:
+    stat = path.stat()
+    return {"source": path.name, "source_size": stat.st_size, "source_mtime": stat.st_mtime}
+
+
+def _write_normalized(source: Path, target: Path) -> Tuple[int, int]:
+    """Normalize `source` row-wise into `target` (.npy) chunk by chunk."""
+    raw = np.load(source, mmap_mode="r")
+    if raw.ndim != 2:
+        raise ValueError(f"Expected a 2D embedding matrix in {source}, got shape {raw.shape}")
+
+    n_rows, dim = raw.shape
+    tmp_path = target.with_name(target.name + ".tmp")
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(n_rows, dim))
+
+    for start in range(0, n_rows, _BUILD_CHUNK_ROWS):
+        chunk = np.asarray(raw[start:start + _BUILD_CHUNK_ROWS], dtype=np.float32)
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        out[start:start + len(chunk)] = chunk / norms
+
+    out.flush()
+    del out
+    os.replace(tmp_path, target)
+    return n_rows, dim
+
+
+def build_index_store(embeddings_dir: Path, store_dir: Path,
+                      sources: Optional[Dict[str, str]] = None,
+                      spec: Optional[IndexSpec] = None) -> Dict:
+    """
+    Build ready-to-serve index files and their manifest.
+
+    Args:
+        embeddings_dir: Directory with the raw ``.npy`` embeddings
+        store_dir: Output directory for index files and ``manifest.json``
+        sources: Optional override of the index name -> source file mapping
+        spec: Index type and parameters (defaults to the ``index_*`` settings)
+
+    Returns:
+        The written manifest
+    """
+    embeddings_dir = Path(embeddings_dir)
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    sources = sources or INDEX_SOURCES
+    spec = spec or IndexSpec.from_settings()
+    if sources.get("image") == INDEX_SOURCES["image"]:
+        ensure_native_image_embeddings(embeddings_dir)
+
+    manifest = {
+        "version": STORE_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        "indexes": {}
+    }
+
+    for name, source_name in sources.items():
+        source = embeddings_dir / source_name
+        if not source.exists():
+            logger.warning(f"⚠️ Skipping '{name}' index, source not found: {source}")
+            continue
+
+        start = time.time()
+        file_name = f"{name}.f32.npy"
+        n_rows, dim = _write_normalized(source, store_dir / file_name)
+
+        entry = {
+            "file": file_name,
+            "dim": dim,
+            "ntotal": n_rows,
+            "dtype": "float32",
+            "metric": "inner_product",
+            "normalized": True,
+            "index_type": spec.index_type,
+            "storage": spec.storage,
+            **_source_fingerprint(source)
+        }
+
+        if spec.uses_faiss:
+            vectors = np.load(store_dir / file_name, mmap_mode="r")
+            index = build_faiss_index(vectors, spec)
+            faiss_name = f"{name}.{spec.label}.faiss"
+            tmp_path = store_dir / (faiss_name + ".tmp")
+            faiss.write_index(index, str(tmp_path))
+            os.replace(tmp_path, store_dir / faiss_name)
+            entry["faiss_file"] = faiss_name
+            entry["index_params"] = spec.to_dict()
+            entry["factory"] = spec.factory_string(dim, n_rows)
+            entry["rerank_k"] = spec.rerank_k if spec.is_lossy else 0
+
+        manifest["indexes"][name] = entry
+        logger.info(
+            f"✅ {name} index ({spec.label}): {n_rows} x {dim} written in {time.time() - start:.1f}s"
+        )
+
+    if not manifest["indexes"]:
+        raise FileNotFoundError(f"No embeddings found in {embeddings_dir}")
+
+    # Manifest goes last so a crashed build is never picked up by the loader
+    tmp_manifest = store_dir / (MANIFEST_NAME + ".tmp")
+    tmp_manifest.write_text(json.dumps(manifest, indent=2), encoding="utf8")
+    os.replace(tmp_manifest, store_dir / MANIFEST_NAME)
+    return manifest
+
+
+def read_manifest(store_dir: Path) -> Optional[Dict]:
+    """Read the store manifest, or None if the store has not been built."""
+    manifest_path = Path(store_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    manifest = json.loads(manifest_path.read_text(encoding="utf8"))
+    if manifest.get("version") != STORE_VERSION:
+        logger.warning(f"⚠️ Index store version {manifest.get('version')} != {STORE_VERSION}, ignoring it")
+        return None
+    return manifest
+
+
+def is_stale(entry: Dict, embeddings_dir: Path) -> bool:
+    """Check whether the raw embeddings changed since the index was built."""
+    source = Path(embeddings_dir) / entry["source"]
+    if not source.exists():
+        return False  # Store can be shipped without the raw files
+    stat = source.stat()
+    return stat.st_size != entry["source_size"] or stat.st_mtime != entry["source_mtime"]
+
+
+def load_index_store(store_dir: Path, embeddings_dir: Optional[Path] = None,
+                     rerank_k: Optional[int] = None) -> Optional[Tuple[Dict[str, object], Dict]]:
+    """
+    Open all indexes listed in the manifest (memory-mapped, no copies).
+
+    Float32 Flat entries become `MmapFlatIndex`; entries with a FAISS file
+    (HNSW, IVF, quantized storage) become `MmapAnnIndex`.
+
+    Args:
+        store_dir: Directory with ``manifest.json``
+        embeddings_dir: Raw embeddings, used to detect a stale store
+        rerank_k: Override of the re-rank depth recorded for lossy indexes
+
+    Returns:
+        (indexes, manifest), or None when the store is missing or stale
+    """
+    store_dir = Path(store_dir)
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        return None
+
+    indexes = {}
+    for name, entry in manifest["indexes"].items():
+        if embeddings_dir is not None and is_stale(entry, embeddings_dir):
+            logger.warning(f"⚠️ Index '{name}' is stale ({entry['source']} changed), rebuild the store")
+            return None
+
+        vectors = np.load(store_dir / entry["file"], mmap_mode="r")
+        if vectors.shape != (entry["ntotal"], entry["dim"]):
+            raise ValueError(
+                f"Index '{name}' shape {vectors.shape} does not match manifest "
+                f"({entry['ntotal']}, {entry['dim']})"
+            )
+
+        if "faiss_file" not in entry:
+            indexes[name] = MmapFlatIndex(vectors)
+        else:
+            index = faiss.read_index(
+                str(store_dir / entry["faiss_file"]), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+            if index.ntotal != entry["ntotal"]:
+                raise ValueError(f"Index '{name}' has {index.ntotal} vectors, manifest says {entry['ntotal']}")
+            entry_rerank = entry.get("rerank_k", 0)
+            if entry_rerank and rerank_k is not None:
+                entry_rerank = rerank_k
+            indexes[name] = MmapAnnIndex(index, vectors, rerank_k=entry_rerank)
+
+    return indexes, manifest
@@ -0,0 +1,252 @@
+"""
+Persisted sparse lexical index over product text.
+
+Product text (name + article type, sub-category, colour) is tokenized once and
+stored as a term x document CSR matrix of precomputed BM25 (Okapi) or TF-IDF
+weights. Scoring a batch of queries is one sparse product
+``query_terms @ term_docs``, which only touches the posting lists of the
+query terms, so exact SKU names and brand tokens are matched in milliseconds.
+
+`build_lexical_index` writes ``lexical.npz`` into the index store directory
+(next to the dense indexes); `load_lexical_index` opens it at startup.
+"""
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+import scipy.sparse as sp
+
+from app.core.catalog import CatalogStore
+from app.core.config import settings
+from app.core.vector_ops import MISSING_SCORE, top_k
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_FILE = "lexical.npz"
+LEXICAL_VERSION = 1
+
+# Catalog columns appended to the product name
+LEXICAL_COLUMNS = ("articleType", "subCategory", "baseColour")
+
+# Tokenizer name (persisted with the index) -> tokenizer
+TOKENIZERS: Dict[str, Callable[[str], List[str]]] = {
+    "word": lambda text: re.findall(r"\w+", text.lower()),
+    "whitespace": str.split,  # rank_bm25 usage in evaluation.py
+    "lowercase": lambda text: text.lower().split(),  # rank_bm25 usage in the v2.1 notebooks
+    "sklearn": lambda text: re.findall(r"(?u)\b\w\w+\b", text.lower()),  # TfidfVectorizer default
+}
+
+SCHEMES = ("bm25", "tfidf")
+
+
+class LexicalIndex:
+    """BM25 / TF-IDF weights as a term x document CSR matrix."""
+
+    def __init__(self, vocabulary: Sequence[str], term_docs: sp.csr_matrix, scheme: str = "bm25",
+                 tokenizer: str = "word", params: Optional[Dict] = None, fingerprint: Optional[str] = None,
+                 idf: Optional[np.ndarray] = None):
+        """
+        Args:
+            vocabulary: Terms, in row order of `term_docs`
+            term_docs: (n_terms, n_docs) weight matrix
+            scheme: "bm25" or "tfidf" (TF-IDF queries are L2-normalized)
+            tokenizer: Key of TOKENIZERS
+            params: Scheme parameters (k1, b, epsilon for BM25)
+            fingerprint: Catalog fingerprint the index was built from
+            idf: Per-term IDF (TF-IDF only, applied to queries)
+        """
+        self.vocabulary = np.asarray(vocabulary, dtype=str)
+        self.term_ids = {term: i for i, term in enumerate(self.vocabulary.tolist())}
+        self.term_docs = sp.csr_matrix(term_docs, dtype=np.float32)
+        self.scheme = scheme
+        self.tokenizer = tokenizer
+        self.tokenize = TOKENIZERS[tokenizer]
+        self.params = params or {}
+        self.fingerprint = fingerprint
+        self.idf = None if idf is None else np.asarray(idf, dtype=np.float32)
+
+    @property
+    def ntotal(self) -> int:
+        return self.term_docs.shape[1]
+
+    @classmethod
+    def build(cls, texts: Sequence[str], scheme: str = "bm25", tokenizer: str = "word",
+              k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25,
+              fingerprint: Optional[str] = None) -> "LexicalIndex":
+        """
+        Index a corpus.
+
+        BM25 follows ``rank_bm25.BM25Okapi`` (negative IDFs floored at
+        ``epsilon`` x mean IDF); TF-IDF follows ``TfidfVectorizer`` defaults
+        (smooth IDF, L2-normalized documents).
+        """
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown lexical scheme '{scheme}', expected one of {SCHEMES}")
+        tokenize = TOKENIZERS[tokenizer]
+        counts = [Counter(tokenize(text)) for text in texts]
+        vocabulary = sorted(set().union(*counts)) if counts else []
+        term_ids = {term: i for i, term in enumerate(vocabulary)}
+
+        # Document-major COO of raw term frequencies
+        doc_lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        rows = np.fromiter((term_ids[t] for c in counts for t in c), dtype=np.int64)
+        cols = np.repeat(np.arange(len(counts), dtype=np.int64), [len(c) for c in counts])
+        tf = np.fromiter((n for c in counts for n in c.values()), dtype=np.float32)
+
+        n_docs, n_terms = len(counts), len(vocabulary)
+        df = np.bincount(rows, minlength=n_terms).astype(np.float32)
+        params: Dict = {}
+        if scheme == "bm25":
+            idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+            idf[idf < 0] = epsilon * idf.mean() if n_terms else 0.0
+            avgdl = (float(doc_lengths.mean()) if n_docs else 0.0) or 1.0
+            norm = k1 * (1 - b + b * doc_lengths[cols] / avgdl)
+            weights = idf[rows] * tf * (k1 + 1) / (tf + norm)
+            params.update(k1=k1, b=b, epsilon=epsilon)
+        else:
+            idf = np.log((1 + n_docs) / (1 + df)) + 1
+            weights = tf * idf[rows]
+            doc_norms = np.sqrt(np.bincount(cols, weights=weights ** 2, minlength=n_docs))
+            doc_norms[doc_norms == 0] = 1.0
+            weights = weights / doc_norms[cols]
+
+        term_docs = sp.csr_matrix((weights.astype(np.float32), (rows, cols)), shape=(n_terms, n_docs))
+        return cls(vocabulary, term_docs, scheme, tokenizer, params, fingerprint,
+                   idf=idf if scheme == "tfidf" else None)
+
+    @classmethod
+    def from_catalog(cls, catalog: CatalogStore, **kwargs) -> "LexicalIndex":
+        """Index the catalog's product text (one document per catalog row)."""
+        return cls.build(product_texts(catalog), fingerprint=catalog.fingerprint, **kwargs)
+
+    def save(self, path: Path):
+        """Write the index as one uncompressed ``.npz`` (no pickles)."""
+        path = Path(path)
+        meta = {
+            "version": LEXICAL_VERSION,
+            "scheme": self.scheme,
+            "tokenizer": self.tokenizer,
+            "params": self.params,
+            "fingerprint": self.fingerprint,
+        }
+        arrays = {} if self.idf is None else {"idf": self.idf}
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            **arrays,
+            vocabulary=self.vocabulary,
+            data=self.term_docs.data,
+            indices=self.term_docs.indices,
+            indptr=self.term_docs.indptr,
+            shape=np.asarray(self.term_docs.shape, dtype=np.int64),
+            meta=np.asarray(json.dumps(meta)),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "LexicalIndex":
+        with np.load(Path(path), allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != LEXICAL_VERSION:
+                raise ValueError(f"Lexical index version {meta.get('version')} != {LEXICAL_VERSION}")
+            term_docs = sp.csr_matrix(
+                (data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"])
+            )
+            vocabulary = data["vocabulary"]
+            idf = data["idf"] if "idf" in data else None
+        return cls(vocabulary, term_docs, meta["scheme"], meta["tokenizer"], meta["params"],
+                   meta["fingerprint"], idf=idf)
+
+    def query_matrix(self, queries: Sequence[str]) -> sp.csr_matrix:
+        """(n_queries, n_terms) query term weights (counts; TF-IDF weighted and normalized)."""
+        rows, cols = [], []
+        for i, query in enumerate(queries):
+            ids = [self.term_ids[t] for t in self.tokenize(query) if t in self.term_ids]
+            rows.extend([i] * len(ids))
+            cols.extend(ids)
+        matrix = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(queries), len(self.vocabulary))
+        )
+        matrix.sum_duplicates()
+        if self.scheme == "tfidf":
+            matrix = matrix.multiply(self.idf[None, :]).tocsr()
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+            norms[norms == 0] = 1.0
+            matrix = sp.diags(1.0 / norms).dot(matrix).tocsr()
+        return matrix.astype(np.float32)
+
+    def scores(self, queries: Sequence[str]) -> np.ndarray:
+        """(n_queries, n_docs) dense scores from one sparse product."""
+        return (self.query_matrix(queries) @ self.term_docs).toarray()
+
+    def search(self, queries: Sequence[str], k: int,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k documents per query.
+
+        Documents sharing no term with the query (or excluded by `mask`) are
+        never returned; fewer than k hits are padded with MISSING_SCORE / -1.
+        """
+        scores = self.scores(queries)
+        scores[scores <= 0] = MISSING_SCORE
+        if mask is not None:
+            scores[:, ~mask] = MISSING_SCORE
+        top_scores, top_idx = top_k(scores, k)
+        top_idx[top_scores == MISSING_SCORE] = -1
+        return top_scores, top_idx
+
+
+def lexical_params() -> Dict:
+    """Build parameters from the ``lexical_*`` settings."""
+    return {
+        "scheme": settings.lexical_scheme,
+        "k1": settings.lexical_bm25_k1,
+        "b": settings.lexical_bm25_b,
+    }
+
+
+def product_texts(catalog: CatalogStore) -> List[str]:
+    """Searchable text per catalog row: display name + article type, sub-category, colour."""
+    texts = catalog.names.astype(str)
+    for column in LEXICAL_COLUMNS:
+        if column in catalog.codes:
+            texts = np.char.add(np.char.add(texts, " "), catalog.column(column).astype(str))
+    return texts.tolist()
+
+
+def build_lexical_index(catalog: CatalogStore, store_dir: Path, **kwargs) -> LexicalIndex:
+    """Index the catalog and write ``lexical.npz`` into the index store directory."""
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    index = LexicalIndex.from_catalog(catalog, **kwargs)
+    index.save(store_dir / LEXICAL_FILE)
+    logger.info(
+        f"✅ lexical index ({index.scheme}): {len(index.vocabulary)} terms x {index.ntotal} docs, "
+        f"{index.term_docs.nnz} postings"
+    )
+    return index
+
+
+def load_lexical_index(store_dir: Path, catalog: CatalogStore, **kwargs) -> LexicalIndex:
+    """
+    Open the persisted lexical index, or build it in memory when it is
+    missing or was built from a different catalog or with another scheme.
+    """
+    path = Path(store_dir) / LEXICAL_FILE
+    if path.exists():
+        index = LexicalIndex.load(path)
+        if index.fingerprint == catalog.fingerprint and index.scheme == kwargs.get("scheme", index.scheme):
+            return index
+        logger.warning(f"⚠️ Lexical index {path} is stale, rebuilding it in memory")
+    else:
+        logger.warning(
+            "⚠️ No lexical index found, building it in memory. "
+            "Run `python -m scripts.build_indexes` to persist it."
+        )
+    return LexicalIndex.from_catalog(catalog, **kwargs)
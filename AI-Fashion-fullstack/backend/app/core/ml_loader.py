@@ -1,13 +1,27 @@
-"""ML Loader - Production Ready with 768d Embedding Support"""
+"""ML Loader - Production Ready with native-dimension text and image indexes"""
 import numpy as np
-import pandas as pd
-import faiss
 import torch
 from sentence_transformers import SentenceTransformer
 from transformers import CLIPModel, CLIPProcessor
 from pathlib import Path
+from typing import List, Union
+from PIL import Image
 import logging
 
+from app.core.batching import MicroBatcher
+from app.core.cache import EmbeddingCache, ImageEmbeddingCache
+from app.core.catalog import get_catalog
+from app.core.config import settings
+from app.core.embedding_builder import ensure_native_image_embeddings
+from app.core.index_factory import IndexSpec, build_faiss_index
+from app.core.index_store import INDEX_SOURCES, MmapAnnIndex, load_index_store
+from app.core.lexical_index import lexical_params, load_lexical_index
+from app.core.neighbors import load_neighbor_table
+from app.core.query_expansion import load_query_expander
+from app.core.reranker import load_reranker
+from app.core.vector_ops import normalize_rows
+from app.services.image_preprocessing import resize_center_crop, to_pixel_values
+
 logger = logging.getLogger(__name__)
 
 class MLLoader:
@@ -18,7 +32,18 @@ class MLLoader:
         self.clip_processor = None
         self.text_index = None
         self.image_index = None
+        self.catalog = None
         self.products_df = None
+        self.index_manifest = None
+        self.text_batcher = None
+        self.image_batcher = None
+        self.clip_text_batcher = None
+        self.query_cache = None
+        self.image_cache = None
+        self.lexical_index = None
+        self.query_expander = None
+        self.reranker = None
+        self.neighbors = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self._ready = False
         
@@ -35,65 +60,267 @@ class MLLoader:
         
         # 1. Load sentence transformer for text (produces 768d)
         try:
-            self.text_model = SentenceTransformer('sentence-transformers/all-mpnet-base-v2')
-            logger.info("✅ Text model loaded (MPNet - 768d)")
+            self.text_model = SentenceTransformer(settings.text_model_name)
+            logger.info(f"✅ Text model loaded (MPNet - {self.get_text_dim()}d)")
         except Exception as e:
             logger.error(f"Failed to load text model: {e}")
             raise
         
-        # 2. Load CLIP for images (produces 512d, will pad to 768d)
+        # 2. Load CLIP for images (produces 512d for ViT-B/32)
         try:
-            self.clip_model = CLIPModel.from_pretrained('openai/clip-vit-base-patch32')
-            self.clip_processor = CLIPProcessor.from_pretrained('openai/clip-vit-base-patch32')
+            self.clip_model = CLIPModel.from_pretrained(settings.clip_model_name)
+            self.clip_processor = CLIPProcessor.from_pretrained(settings.clip_model_name)
             self.clip_model.to(self.device)
-            logger.info("✅ CLIP model loaded (ViT-B/32 - 512d → padded to 768d)")
+            logger.info(f"✅ CLIP model loaded ({settings.clip_model_name} - {self.get_clip_dim()}d)")
         except Exception as e:
             logger.error(f"Failed to load CLIP model: {e}")
             raise
         
-        # 3. Load product metadata
-        data_path = Path("data/meta_ssot.csv")
-        if not data_path.exists():
-            raise FileNotFoundError(f"Product data not found: {data_path}")
-        
-        self.products_df = pd.read_csv(data_path)
+        # 3. Load product metadata (shared process-wide catalog)
+        self.catalog = get_catalog()
+        self.products_df = self.catalog.df
         logger.info(f"✅ Products loaded: {len(self.products_df)}")
         
-        # 4. Load text embeddings (768d from MPNet)
-        embeddings_dir = Path("data/embeddings")
-        mpnet_path = embeddings_dir / "mpnet_768d.npy"
+        # 4-5. Load search indexes (memory-mapped store, or legacy in-memory build)
+        embeddings_dir = Path(settings.embeddings_dir)
+        store = load_index_store(
+            Path(settings.index_store_dir), embeddings_dir, rerank_k=settings.index_rerank_k
+        )
+        
+        if store is not None:
+            indexes, self.index_manifest = store
+            self.text_index = indexes.get("text")
+            self.image_index = indexes.get("image")
+            if self.text_index is None:
+                raise FileNotFoundError("Index store has no text index, rebuild it")
+            logger.info(
+                f"✅ Indexes memory-mapped from {settings.index_store_dir} "
+                f"(built {self.index_manifest['created_at']})"
+            )
+        else:
+            logger.warning(
+                "⚠️ No index store found, building indexes in memory. "
+                "Run `python -m scripts.build_indexes` for fast, shared startup."
+            )
+            self._build_indexes_in_memory(embeddings_dir)
+        
+        logger.info(f"✅ Text index: {self.text_index.ntotal} vectors ({self.text_index.d}d)")
+        if self.image_index is not None:
+            logger.info(f"✅ Image index: {self.image_index.ntotal} vectors ({self.image_index.d}d)")
+        else:
+            logger.warning("Image search will be disabled")
+        
+        self._validate_index_dims()
+        
+        if self.text_index.ntotal != len(self.products_df):
+            logger.warning(
+                f"⚠️ Text index has {self.text_index.ntotal} vectors but catalog has "
+                f"{len(self.products_df)} products"
+            )
+        
+        # 6. Query encoder micro-batchers (coalesce concurrent requests)
+        self.text_batcher = MicroBatcher(
+            "text", self.encode_text_batch,
+            max_batch_size=settings.encode_max_batch_text,
+            max_wait_ms=settings.encode_max_wait_ms
+        )
+        self.image_batcher = MicroBatcher(
+            "image", self.encode_image_batch,
+            max_batch_size=settings.encode_max_batch_image,
+            max_wait_ms=settings.encode_max_wait_ms
+        )
+        if settings.cross_modal_search and self.image_index is not None:
+            # CLIP text tower for the cross-modal leg, on its own thread so it overlaps MPNet
+            self.clip_text_batcher = MicroBatcher(
+                "clip_text", self.encode_clip_text_batch,
+                max_batch_size=settings.encode_max_batch_text,
+                max_wait_ms=settings.encode_max_wait_ms
+            )
+        
+        # 7. Query embedding cache (optionally warm-started from disk)
+        self.query_cache = EmbeddingCache(
+            max_entries=settings.query_cache_size,
+            ttl_seconds=settings.query_cache_ttl_seconds,
+            name="query_embeddings"
+        )
+        if settings.query_cache_path:
+            self.query_cache.load(Path(settings.query_cache_path))
+        
+        # 8. Uploaded query image embedding cache (content hash + perceptual hash)
+        self.image_cache = ImageEmbeddingCache(
+            max_entries=settings.image_cache_size,
+            ttl_seconds=settings.image_cache_ttl_seconds,
+            max_distance=settings.image_cache_phash_distance,
+            name="image_embeddings"
+        )
+        
+        # 9. Lexical (BM25 / TF-IDF) index over product text (optional leg of text search)
+        if settings.lexical_search:
+            try:
+                self.lexical_index = load_lexical_index(
+                    Path(settings.index_store_dir), self.catalog, **lexical_params()
+                )
+                logger.info(
+                    f"✅ Lexical index: {len(self.lexical_index.vocabulary)} terms "
+                    f"({self.lexical_index.scheme})"
+                )
+            except Exception as e:
+                self.lexical_index = None
+                logger.warning(f"⚠️ Lexical index not loaded, text search is dense-only: {e}")
+        
+        # 10. Query rewriter for multi-query retrieval (warm-started from the phase 5 pickle)
+        if settings.query_rewrite:
+            try:
+                self.query_expander = load_query_expander(
+                    Path(settings.query_expander_path),
+                    settings.query_rewrite_variants,
+                    settings.query_rewrite_cache_size
+                )
+                if self.query_expander is not None:
+                    logger.info(
+                        f"✅ Query rewriter ready ({settings.query_rewrite_variants} variants, "
+                        f"{settings.query_rewrite_merge} RRF, {len(self.query_expander.cache)} cached)"
+                    )
+            except Exception as e:
+                self.query_expander = None
+                logger.warning(f"⚠️ Query rewriter not loaded, searching the original query only: {e}")
+        
+        # 11. Learned second-stage reranker (optional; search falls back to retrieval order)
+        try:
+            self.reranker = load_reranker(settings.reranker, Path(settings.reranker_models_dir))
+            if self.reranker is not None:
+                self.reranker.prepare(self.catalog)
+                logger.info(
+                    f"✅ Reranker loaded ({self.reranker.name}: {len(self.reranker.feature_names)} features, "
+                    f"top {settings.reranker_candidates} candidates)"
+                )
+        except Exception as e:
+            self.reranker = None
+            logger.warning(f"⚠️ Reranker '{settings.reranker}' not loaded, using retrieval order: {e}")
+        
+        # 12. Precomputed item-to-item neighbors (similar products; live search when absent)
+        try:
+            self.neighbors = load_neighbor_table(
+                Path(settings.index_store_dir), self.catalog, self.index_manifest
+            )
+            if self.neighbors is not None:
+                logger.info(
+                    f"✅ Neighbor table memory-mapped ({', '.join(self.neighbors.kinds)}, "
+                    f"top {self.neighbors.k} per product)"
+                )
+        except Exception as e:
+            self.neighbors = None
+            logger.warning(f"⚠️ Neighbor table not loaded, similar products use live search: {e}")
+        
+        logger.info("🎉 ML Loader ready!")
+    
+    def _build_indexes_in_memory(self, embeddings_dir: Path):
+        """Legacy path: normalize raw embeddings and build private FAISS indexes."""
+        # Text embeddings (768d from MPNet)
+        mpnet_path = embeddings_dir / INDEX_SOURCES["text"]
         
         if not mpnet_path.exists():
             raise FileNotFoundError(f"Text embeddings not found: {mpnet_path}")
         
-        text_emb = np.load(mpnet_path).astype('float32')
-        
-        # Normalize text embeddings
-        norms = np.linalg.norm(text_emb, axis=1, keepdims=True)
-        norms[norms == 0] = 1.0
-        text_emb = text_emb / norms
+        text_emb = normalize_rows(np.load(mpnet_path))
+        spec = IndexSpec.from_settings()
         
         # Create FAISS index for text
-        self.text_index = faiss.IndexFlatIP(text_emb.shape[1])
-        self.text_index.add(text_emb)
-        logger.info(f"✅ Text index: {self.text_index.ntotal} vectors (768d)")
+        self.text_index = self._build_index(text_emb, spec)
         
-        # 5. Load image embeddings (768d - padded from 512d CLIP)
-        img_emb_path = embeddings_dir / "clip_image_768d_normalized.npy"
+        # Image embeddings (native 512d CLIP)
+        img_emb_path = embeddings_dir / INDEX_SOURCES["image"]
+        ensure_native_image_embeddings(embeddings_dir)
         
         if not img_emb_path.exists():
             logger.warning(f"⚠️ Image embeddings not found: {img_emb_path}")
-            logger.warning("Image search will be disabled")
             self.image_index = None
         else:
             img_emb = np.load(img_emb_path).astype('float32')
             
             # Create FAISS index for images
-            self.image_index = faiss.IndexFlatIP(img_emb.shape[1])
-            self.image_index.add(img_emb)
-            logger.info(f"✅ Image index: {self.image_index.ntotal} vectors (768d)")
+            self.image_index = self._build_index(img_emb, spec)
+    
+    @staticmethod
+    def _build_index(vectors: np.ndarray, spec: IndexSpec):
+        """
+        Build a private index.
         
-        logger.info("🎉 ML Loader ready!")
+        ANN and quantized indexes keep the float32 vectors alongside (exact
+        re-rank for lossy ones, exact stored vectors for fusion).
+        """
+        index = build_faiss_index(vectors, spec)
+        if spec.uses_faiss:
+            return MmapAnnIndex(index, vectors, rerank_k=spec.rerank_k if spec.is_lossy else 0)
+        return index
+    
+    def _validate_index_dims(self):
+        """Fail fast when an index does not match its query encoder's dimension."""
+        expected = {"text": self.get_text_dim(), "image": self.get_clip_dim()}
+        for name, index in (("text", self.text_index), ("image", self.image_index)):
+            if index is None or index.d == expected[name]:
+                continue
+            hint = (
+                "run `python -m scripts.migrate_image_embeddings` to strip the old zero padding, "
+                "then `python -m scripts.build_indexes`"
+                if name == "image" else "rebuild it with `python -m scripts.build_embeddings`"
+            )
+            raise ValueError(
+                f"{name} index is {index.d}d but the query encoder produces {expected[name]}d; {hint}"
+            )
+    
+    def encode_text_batch(self, texts: List[str]) -> np.ndarray:
+        """Encode text queries with MPNet in one forward pass (L2-normalized, 768d)."""
+        emb = self.text_model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+        return normalize_rows(emb)
+    
+    def encode_clip_text_batch(self, texts: List[str]) -> np.ndarray:
+        """Encode text queries with the CLIP text tower in one forward pass (L2-normalized, image index space)."""
+        tokens = self.clip_processor.tokenizer(
+            texts, padding=True, truncation=True, max_length=77, return_tensors="pt"
+        ).to(self.device)
+        with torch.no_grad():
+            return normalize_rows(self.clip_model.get_text_features(**tokens).cpu().numpy())
+    
+    def encode_image_batch(self, images: List[Union[Image.Image, np.ndarray]]) -> np.ndarray:
+        """
+        Encode images with CLIP in one forward pass.
+        
+        Accepts PIL images or pre-resized (224, 224, 3) uint8 arrays (as
+        produced by `decode_for_clip`); both are normalized into one pixel
+        tensor without going through CLIPProcessor. Rows are L2-normalized at
+        the model's native dimension (512d for ViT-B/32), matching the image index.
+        """
+        arrays = [image if isinstance(image, np.ndarray) else resize_center_crop(image) for image in images]
+        pixel_values = torch.from_numpy(to_pixel_values(arrays)).to(self.device)
+        
+        with torch.no_grad():
+            return normalize_rows(self.clip_model.get_image_features(pixel_values=pixel_values).cpu().numpy())
+    
+    def get_stats(self):
+        """Runtime metrics for the health endpoint."""
+        return {
+            "text_batcher": self.text_batcher.get_stats() if self.text_batcher else None,
+            "image_batcher": self.image_batcher.get_stats() if self.image_batcher else None,
+            "clip_text_batcher": self.clip_text_batcher.get_stats() if self.clip_text_batcher else None,
+            "query_cache": self.query_cache.get_stats() if self.query_cache else None,
+            "image_cache": self.image_cache.get_stats() if self.image_cache else None,
+            "query_rewrites": self.query_expander.get_stats() if self.query_expander else None,
+            "reranker": self.reranker.name if self.reranker else None,
+            "neighbors": self.neighbors.get_stats() if self.neighbors else None,
+        }
+    
+    def close(self):
+        """Stop background workers and persist the query cache."""
+        for batcher in (self.text_batcher, self.image_batcher, self.clip_text_batcher):
+            if batcher is not None:
+                batcher.close()
+        
+        if self.query_cache is not None and settings.query_cache_path:
+            try:
+                self.query_cache.save(Path(settings.query_cache_path))
+            except Exception as e:
+                logger.warning(f"⚠️ Could not save query cache: {e}")
     
     def is_ready(self):
         """Check if ML models are ready."""
@@ -101,8 +328,8 @@ class MLLoader:
     
     def get_clip_dim(self):
         """Get CLIP model output dimension."""
-        return 512  # ViT-B/32 outputs 512d
+        return self.clip_model.config.projection_dim  # ViT-B/32 outputs 512d
     
     def get_text_dim(self):
         """Get text model output dimension."""
-        return 768  # MPNet outputs 768d
+        return self.text_model.get_sentence_embedding_dimension()  # MPNet outputs 768d
@@ -0,0 +1,42 @@
+"""
+Loading of the pickled research models shipped in `data/models`.
+
+The pickles were written by the notebooks (NumPy 2, recent scikit-learn, and
+classes defined in `__main__`). `load_pickle` resolves NumPy 2 module paths on
+NumPy 1.x and lets callers map notebook classes onto backend ones.
+"""
+import pickle
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+class ModelUnpickler(pickle.Unpickler):
+    """Unpickler with class remapping for notebook-trained models."""
+
+    def __init__(self, file, class_map: Optional[Dict[Tuple[str, str], type]] = None):
+        super().__init__(file)
+        self.class_map = class_map or {}
+
+    def find_class(self, module: str, name: str):
+        if (module, name) in self.class_map:
+            return self.class_map[(module, name)]
+        try:
+            return super().find_class(module, name)
+        except ModuleNotFoundError:
+            # Pickled with NumPy 2 (numpy._core), loaded with NumPy 1.x (numpy.core)
+            if module.startswith("numpy._core"):
+                return super().find_class(module.replace("numpy._core", "numpy.core", 1), name)
+            raise
+
+
+def load_pickle(path: Union[str, Path], class_map: Optional[Dict[Tuple[str, str], type]] = None) -> Any:
+    """
+    Load a model pickle.
+
+    Args:
+        path: Pickle file
+        class_map: (module, class name) -> replacement class, e.g.
+            ``{("__main__", "QueryExpander"): QueryExpander}``
+    """
+    with open(path, "rb") as f:
+        return ModelUnpickler(f, class_map).load()
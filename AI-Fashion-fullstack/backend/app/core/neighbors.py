@@ -0,0 +1,211 @@
+"""
+Precomputed item-to-item neighbor table ("similar products").
+
+`build_neighbor_table` scores every catalog row against the whole catalog in
+blocks of rows (one matrix multiply per block and leg) and keeps the top K
+neighbors of each item for the text, image and fused (alpha * text +
+(1 - alpha) * image) similarities. Rows are stored as int32 and scores as
+float16 ``.npy`` files in the index store directory, next to a
+``neighbors.json`` manifest; `load_neighbor_table` memory-maps them, so a
+"more like this" request is one row lookup instead of an ANN search.
+
+Scores use the search result scale (cosine mapped onto [0, 1]).
+"""
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from app.core.catalog import CatalogStore
+from app.core.fusion import cosine_to_unit
+from app.core.vector_ops import MISSING_SCORE, top_k
+
+logger = logging.getLogger(__name__)
+
+NEIGHBORS_MANIFEST = "neighbors.json"
+NEIGHBORS_VERSION = 1
+
+# Table kind -> index store legs it is computed from
+NEIGHBOR_KINDS = {
+    "text": ("text",),
+    "image": ("image",),
+    "fused": ("text", "image"),
+}
+
+
+def compute_neighbors(legs: Sequence[np.ndarray], weights: Sequence[float], k: int,
+                      block_rows: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k neighbors of every row by weighted inner product, block by block.
+
+    Args:
+        legs: Row-aligned (n, d_leg) L2-normalized matrices (may be memory-mapped)
+        weights: Weight per leg
+        k: Neighbors kept per row (the row itself is excluded)
+        block_rows: Rows scored per matrix multiply; peak memory is about
+            block_rows x n float32
+
+    Returns:
+        (scores, rows): (n, k) float16 unit-scale scores and int32 rows, padded
+        with 0 / -1; rows with an all-zero vector (e.g. no image) get no neighbors
+    """
+    legs = [np.asarray(leg, dtype=np.float32) for leg in legs]
+    n_rows = len(legs[0])
+    valid = np.ones(n_rows, dtype=bool)
+    for leg in legs:
+        valid &= np.einsum("ij,ij->i", leg, leg) > 0
+
+    scores_out = np.zeros((n_rows, k), dtype=np.float16)
+    rows_out = np.full((n_rows, k), -1, dtype=np.int32)
+    for start in range(0, n_rows, block_rows):
+        stop = min(start + block_rows, n_rows)
+        scores = weights[0] * (legs[0][start:stop] @ legs[0].T)
+        for leg, weight in zip(legs[1:], weights[1:]):
+            scores += weight * (leg[start:stop] @ leg.T)
+        scores[:, ~valid] = MISSING_SCORE
+        scores[np.arange(stop - start), np.arange(start, stop)] = MISSING_SCORE
+
+        top_scores, top_rows = top_k(scores, k)
+        found = (top_scores != MISSING_SCORE) & valid[start:stop, None]
+        scores_out[start:stop] = np.where(found, cosine_to_unit(top_scores), 0)
+        rows_out[start:stop] = np.where(found, top_rows, -1)
+    return scores_out, rows_out
+
+
+class NeighborTable:
+    """Per-kind (n_items, k) neighbor rows and scores, best first."""
+
+    def __init__(self, rows: Dict[str, np.ndarray], scores: Dict[str, np.ndarray], meta: Dict):
+        """
+        Args:
+            rows: Kind -> (n_items, k) int32 neighbor rows (-1 = none)
+            scores: Kind -> (n_items, k) float16 scores
+            meta: Manifest (k, alpha, fingerprint, index_created_at, ...)
+        """
+        self.rows = rows
+        self.scores = scores
+        self.meta = meta
+
+    @property
+    def kinds(self) -> Tuple[str, ...]:
+        return tuple(self.rows)
+
+    @property
+    def k(self) -> int:
+        return int(self.meta["k"])
+
+    def lookup(self, row: int, kind: str = "fused") -> Tuple[np.ndarray, np.ndarray]:
+        """Neighbors of one catalog row as (float32 scores, int64 rows), missing entries dropped."""
+        rows = self.rows[kind][row]
+        found = rows >= 0
+        return self.scores[kind][row][found].astype(np.float32), rows[found].astype(np.int64)
+
+    def get_stats(self) -> Dict:
+        return {"kinds": list(self.kinds), "k": self.k, "alpha": self.meta.get("alpha")}
+
+
+def _kind_files(kind: str) -> Tuple[str, str]:
+    return f"neighbors.{kind}.rows.npy", f"neighbors.{kind}.scores.npy"
+
+
+def build_neighbor_table(indexes: Dict[str, object], catalog: CatalogStore, store_dir: Path,
+                         k: int = 50, alpha: float = 0.7, block_rows: int = 1024,
+                         kinds: Optional[Sequence[str]] = None,
+                         index_manifest: Optional[Dict] = None) -> Dict:
+    """
+    Compute the neighbor table from the stored index vectors and write it.
+
+    Args:
+        indexes: Index store indexes (exposing ``vectors``), by leg name
+        catalog: Catalog the indexes are row-aligned with
+        store_dir: Index store directory receiving the arrays and manifest
+        k: Neighbors per item
+        alpha: Text weight of the fused kind
+        block_rows: Rows per blocked matrix multiply
+        kinds: Kinds to build (default: every kind whose legs are available)
+        index_manifest: Index store manifest, recorded to detect a stale table
+
+    Returns:
+        The written manifest
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    weights = {"text": (1.0,), "image": (1.0,), "fused": (alpha, 1.0 - alpha)}
+
+    built = []
+    for kind in kinds or NEIGHBOR_KINDS:
+        legs = [indexes.get(name) for name in NEIGHBOR_KINDS[kind]]
+        if any(leg is None for leg in legs):
+            logger.warning(f"⚠️ Skipping '{kind}' neighbors, index missing")
+            continue
+
+        start = time.time()
+        scores, rows = compute_neighbors([leg.vectors for leg in legs], weights[kind], k, block_rows)
+        for name, array in zip(_kind_files(kind), (rows, scores)):
+            tmp_path = store_dir / (name + ".tmp.npy")
+            np.save(tmp_path, array)
+            os.replace(tmp_path, store_dir / name)
+        built.append(kind)
+        logger.info(f"✅ {kind} neighbors: {len(rows)} x {k} written in {time.time() - start:.1f}s")
+
+    if not built:
+        raise FileNotFoundError("No index available to compute neighbors from")
+
+    manifest = {
+        "version": NEIGHBORS_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        "kinds": built,
+        "k": k,
+        "alpha": alpha,
+        "fingerprint": catalog.fingerprint,
+        "index_created_at": (index_manifest or {}).get("created_at"),
+    }
+    # Manifest goes last so a crashed build is never picked up by the loader
+    tmp_manifest = store_dir / (NEIGHBORS_MANIFEST + ".tmp")
+    tmp_manifest.write_text(json.dumps(manifest, indent=2), encoding="utf8")
+    os.replace(tmp_manifest, store_dir / NEIGHBORS_MANIFEST)
+    return manifest
+
+
+def load_neighbor_table(store_dir: Path, catalog: CatalogStore,
+                        index_manifest: Optional[Dict] = None) -> Optional[NeighborTable]:
+    """
+    Memory-map the neighbor table, or None when it is missing or was built
+    from another catalog or index store build.
+    """
+    store_dir = Path(store_dir)
+    manifest_path = store_dir / NEIGHBORS_MANIFEST
+    if not manifest_path.exists():
+        logger.warning(
+            "⚠️ No neighbor table found, similar products use live search. "
+            "Run `python -m scripts.build_neighbors` to precompute it."
+        )
+        return None
+
+    meta = json.loads(manifest_path.read_text(encoding="utf8"))
+    if meta.get("version") != NEIGHBORS_VERSION:
+        logger.warning(f"⚠️ Neighbor table version {meta.get('version')} != {NEIGHBORS_VERSION}, ignoring it")
+        return None
+    index_created_at = (index_manifest or {}).get("created_at")
+    if meta["fingerprint"] != catalog.fingerprint or (
+        index_created_at is not None and meta["index_created_at"] != index_created_at
+    ):
+        logger.warning("⚠️ Neighbor table is stale, rebuild it with `python -m scripts.build_neighbors`")
+        return None
+
+    rows, scores = {}, {}
+    for kind in meta["kinds"]:
+        rows_file, scores_file = _kind_files(kind)
+        rows[kind] = np.load(store_dir / rows_file, mmap_mode="r")
+        scores[kind] = np.load(store_dir / scores_file, mmap_mode="r")
+        if rows[kind].shape != (len(catalog), meta["k"]) or scores[kind].shape != rows[kind].shape:
+            raise ValueError(
+                f"Neighbor table '{kind}' shape {rows[kind].shape} does not match "
+                f"the catalog ({len(catalog)}, {meta['k']})"
+            )
+    return NeighborTable(rows, scores, meta)
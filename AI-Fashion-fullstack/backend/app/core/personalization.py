@@ -1,12 +1,19 @@
 """Content-based personalization engine with multi-strategy recommendations."""
 
+import json
+import os
+import time
 import numpy as np
+from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Any
 from dataclasses import dataclass
-from sklearn.metrics.pairwise import cosine_similarity
 from sentence_transformers import SentenceTransformer
 import logging
 
+from app.core.catalog import CatalogStore
+from app.core.config import settings
+from app.core.vector_ops import normalize_rows, top_k
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,6 +31,7 @@ class PreferenceEncoder:
     """Encode user preferences into vectors."""
     
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
     
     def encode_preferences(self, preferences: Dict[str, List[str]]) -> np.ndarray:
@@ -39,50 +47,140 @@ class PreferenceEncoder:
         embedding = self.model.encode(preference_str, convert_to_numpy=True)
         return embedding
     
-    def encode_product_metadata(self, product: Dict[str, Any]) -> np.ndarray:
-        """Encode product metadata to vector."""
+    @staticmethod
+    def product_text(product: Dict[str, Any]) -> str:
+        """Text used to embed a product."""
         name = product.get("product_name", "")
         category = product.get("category", "")
         color = product.get("color", "")
-        
-        product_str = f"{name} is a {category} in {color}"
-        
-        embedding = self.model.encode(product_str, convert_to_numpy=True)
+        return f"{name} is a {category} in {color}"
+    
+    def encode_product_metadata(self, product: Dict[str, Any]) -> np.ndarray:
+        """Encode product metadata to vector."""
+        embedding = self.model.encode(self.product_text(product), convert_to_numpy=True)
         return embedding
+    
+    def encode_texts(self, texts: List[str], batch_size: int = 256) -> np.ndarray:
+        """Encode many texts in batches into L2-normalized float32 rows."""
+        embeddings = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return normalize_rows(embeddings)
+
+
+def build_product_matrix(catalog: CatalogStore, encoder: PreferenceEncoder,
+                         output_path: Path, batch_size: int = 256) -> np.ndarray:
+    """
+    Encode every catalog product once and persist the normalized matrix.
+    
+    A JSON sidecar records the model and catalog fingerprint so a stale
+    matrix is rebuilt instead of silently misaligned.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    products = catalog.products(np.arange(len(catalog)))
+    texts = [encoder.product_text(p) for p in products]
+    
+    start = time.time()
+    matrix = encoder.encode_texts(texts, batch_size=batch_size)
+    logger.info(f"✅ Encoded {len(texts)} products in {time.time() - start:.1f}s")
+    
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp_path, output_path)
+    
+    _matrix_meta_path(output_path).write_text(json.dumps({
+        "model": encoder.model_name,
+        "ntotal": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "catalog_fingerprint": catalog.fingerprint
+    }, indent=2), encoding="utf8")
+    
+    return matrix
+
+
+def _matrix_meta_path(matrix_path: Path) -> Path:
+    return Path(matrix_path).with_suffix(".json")
 
 
 class ContentBasedRecommender:
-    """Content-based recommendation system."""
+    """Content-based recommendation system over a precomputed product matrix."""
     
-    def __init__(self, products_df: Any, preference_encoder: PreferenceEncoder):
+    def __init__(self, catalog: CatalogStore, preference_encoder: PreferenceEncoder,
+                 embeddings_path: Optional[Path] = None, build_if_missing: bool = False):
         """
         Initialize recommender.
         
         Args:
-            products_df: DataFrame with product information
+            catalog: Shared product catalog
             preference_encoder: PreferenceEncoder instance
+            embeddings_path: Persisted product matrix
+                (built by `python -m scripts.build_recommender_embeddings`)
+            build_if_missing: Encode the catalog when the matrix is missing or
+                stale (minutes of work; only for startup/background callers)
         """
-        self.products_df = products_df
+        self.catalog = catalog
         self.encoder = preference_encoder
-        self.embeddings_cache = {}
+        self.embeddings_path = Path(embeddings_path or settings.recommender_embeddings_path)
+        self.product_matrix = self._load_product_matrix(build_if_missing)
+    
+    def _load_product_matrix(self, build_if_missing: bool = False) -> np.ndarray:
+        """Memory-map the persisted product matrix, building it only if allowed."""
+        meta_path = _matrix_meta_path(self.embeddings_path)
+        if not (self.embeddings_path.exists() and meta_path.exists()):
+            problem = f"Product matrix not found: {self.embeddings_path}"
+        else:
+            meta = json.loads(meta_path.read_text(encoding="utf8"))
+            if (meta.get("model") == self.encoder.model_name
+                    and meta.get("catalog_fingerprint") == self.catalog.fingerprint):
+                logger.info(f"✅ Product matrix loaded: {self.embeddings_path}")
+                return np.load(self.embeddings_path, mmap_mode="r")
+            problem = f"Product matrix {self.embeddings_path} is stale (other model or catalog)"
+        
+        if not build_if_missing:
+            raise FileNotFoundError(f"{problem}. Run `python -m scripts.build_recommender_embeddings`.")
+        logger.warning(f"⚠️ {problem}, building it")
+        build_product_matrix(self.catalog, self.encoder, self.embeddings_path)
+        return np.load(self.embeddings_path, mmap_mode="r")
     
     def _get_product_embedding(self, product_id: str) -> Optional[np.ndarray]:
-        """Get or compute product embedding."""
-        if product_id in self.embeddings_cache:
-            return self.embeddings_cache[product_id]
-        
-        # Find product in dataframe
-        product_mask = self.products_df['product_id'] == product_id
-        if not product_mask.any():
+        """Get the precomputed embedding of a product."""
+        row = self.catalog.row_for_id(product_id)
+        if row is None:
             return None
-        
-        product = self.products_df[product_mask].iloc[0]
-        product_dict = product.to_dict() if hasattr(product, 'to_dict') else dict(product)
-        
-        embedding = self.encoder.encode_product_metadata(product_dict)
-        self.embeddings_cache[product_id] = embedding
-        
-        return embedding
+        return np.asarray(self.product_matrix[row])
+    
+    def _score(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of one query vector against every product."""
+        query = normalize_rows(query_embedding.reshape(1, -1))[0]
+        return self.product_matrix @ query
+    
+    def _top_results(self, scores: np.ndarray, n: int, exclude_ids: List[str],
+                     strategy: str, reasoning) -> List[RecommendationResult]:
+        """Mask excluded products, select the top n and build results."""
+        exclude_rows = self.catalog.rows_for_ids(exclude_ids)
+        scores = np.array(scores, dtype=np.float32)
+        scores[exclude_rows[exclude_rows >= 0]] = -np.inf
+        
+        top_scores, top_rows = top_k(scores, n)
+        keep = np.isfinite(top_scores[0]) & (top_rows[0] >= 0)
+        top_scores, top_rows = top_scores[0][keep], top_rows[0][keep]
+        
+        return [
+            RecommendationResult(
+                product_id=str(product['product_id']),
+                product_name=product.get('product_name', 'Unknown'),
+                score=float(score),
+                strategy=strategy,
+                reasoning=reasoning(product)
+            )
+            for product, score in zip(self.catalog.products(top_rows), top_scores)
+        ]
     
     def recommend_from_favorites(self, favorites: List[Dict], n: int = 10, 
                                  exclude_ids: List[str] = None) -> List[RecommendationResult]:
@@ -93,45 +191,19 @@ class ContentBasedRecommender:
         exclude_ids = exclude_ids or []
         favorite_ids = [f.get('product_id') for f in favorites]
         
-        # Get embeddings for favorites
-        favorite_embeddings = []
-        for fav_id in favorite_ids:
-            emb = self._get_product_embedding(fav_id)
-            if emb is not None:
-                favorite_embeddings.append(emb)
-        
-        if not favorite_embeddings:
+        # Average embedding of favorites
+        favorite_rows = self.catalog.rows_for_ids(favorite_ids)
+        favorite_rows = favorite_rows[favorite_rows >= 0]
+        if len(favorite_rows) == 0:
             return []
         
-        # Average embedding of favorites
-        favorite_avg = np.mean(favorite_embeddings, axis=0)
-        
-        # Score all products
-        results = []
-        for product_id in self.products_df['product_id']:
-            if product_id in exclude_ids or product_id in favorite_ids:
-                continue
-            
-            product_emb = self._get_product_embedding(product_id)
-            if product_emb is None:
-                continue
-            
-            similarity = cosine_similarity([favorite_avg], [product_emb])[0][0]
-            
-            product = self.products_df[self.products_df['product_id'] == product_id].iloc[0]
-            product_dict = product.to_dict() if hasattr(product, 'to_dict') else dict(product)
-            
-            results.append(RecommendationResult(
-                product_id=str(product_id),
-                product_name=product_dict.get('product_name', 'Unknown'),
-                score=float(similarity),
-                strategy="favorites",
-                reasoning=f"Similar to your favorite {product_dict.get('category', 'items')}"
-            ))
+        favorite_avg = np.asarray(self.product_matrix[np.sort(favorite_rows)]).mean(axis=0)
         
-        # Sort and return top N
-        results.sort(key=lambda x: x.score, reverse=True)
-        return results[:n]
+        return self._top_results(
+            self._score(favorite_avg), n, list(exclude_ids) + favorite_ids,
+            strategy="favorites",
+            reasoning=lambda p: f"Similar to your favorite {p.get('category', 'items')}"
+        )
     
     def recommend_from_history(self, search_queries: List[str], n: int = 10,
                               exclude_ids: List[str] = None) -> List[RecommendationResult]:
@@ -141,37 +213,14 @@ class ContentBasedRecommender:
         
         exclude_ids = exclude_ids or []
         
-        # Encode search queries
-        query_embeddings = [self.encoder.model.encode(q, convert_to_numpy=True) 
-                           for q in search_queries]
-        query_avg = np.mean(query_embeddings, axis=0)
-        
-        # Score all products
-        results = []
-        for product_id in self.products_df['product_id']:
-            if product_id in exclude_ids:
-                continue
-            
-            product_emb = self._get_product_embedding(product_id)
-            if product_emb is None:
-                continue
-            
-            similarity = cosine_similarity([query_avg], [product_emb])[0][0]
-            
-            product = self.products_df[self.products_df['product_id'] == product_id].iloc[0]
-            product_dict = product.to_dict() if hasattr(product, 'to_dict') else dict(product)
-            
-            results.append(RecommendationResult(
-                product_id=str(product_id),
-                product_name=product_dict.get('product_name', 'Unknown'),
-                score=float(similarity),
-                strategy="history",
-                reasoning=f"Based on your search for {search_queries[0]}"
-            ))
+        # Encode search queries in one batch
+        query_avg = self.encoder.encode_texts(search_queries).mean(axis=0)
         
-        # Sort and return top N
-        results.sort(key=lambda x: x.score, reverse=True)
-        return results[:n]
+        return self._top_results(
+            self._score(query_avg), n, exclude_ids,
+            strategy="history",
+            reasoning=lambda p: f"Based on your search for {search_queries[0]}"
+        )
     
     def recommend_from_preferences(self, preferences: Dict, n: int = 10,
                                   exclude_ids: List[str] = None) -> List[RecommendationResult]:
@@ -180,63 +229,46 @@ class ContentBasedRecommender:
         
         # Encode preferences
         pref_embedding = self.encoder.encode_preferences(preferences)
+        similarity = self._score(pref_embedding)
         
-        # Filter by hard constraints (size, colors, categories)
-        size = preferences.get("size", "")
+        # Boost score if color / category matches (vectorized over codes)
         colors = preferences.get("colors", [])
         categories = preferences.get("categories", [])
         
-        # Score all products
-        results = []
-        for product_id in self.products_df['product_id']:
-            if product_id in exclude_ids:
-                continue
-            
-            product = self.products_df[self.products_df['product_id'] == product_id].iloc[0]
-            product_dict = product.to_dict() if hasattr(product, 'to_dict') else dict(product)
-            
-            # Get embedding
-            product_emb = self._get_product_embedding(product_id)
-            if product_emb is None:
-                continue
-            
-            # Soft matching on preferences
-            similarity = cosine_similarity([pref_embedding], [product_emb])[0][0]
-            
-            # Boost score if color matches
-            if colors and product_dict.get('color', '').lower() in [c.lower() for c in colors]:
-                similarity *= 1.2
-            
-            # Boost score if category matches
-            if categories and product_dict.get('category', '').lower() in [c.lower() for c in categories]:
-                similarity *= 1.15
-            
-            results.append(RecommendationResult(
-                product_id=str(product_id),
-                product_name=product_dict.get('product_name', 'Unknown'),
-                score=float(similarity),
-                strategy="preferences",
-                reasoning=f"Matches your preference for {preferences.get('style', ['general'])[0]} style"
-            ))
+        if colors:
+            similarity = similarity * np.where(self._matches('baseColour', colors), 1.2, 1.0)
+        if categories:
+            similarity = similarity * np.where(self._matches('masterCategory', categories), 1.15, 1.0)
         
-        # Sort and return top N
-        results.sort(key=lambda x: x.score, reverse=True)
-        return results[:n]
+        style = (preferences.get('style') or ['general'])[0]
+        return self._top_results(
+            similarity, n, exclude_ids,
+            strategy="preferences",
+            reasoning=lambda p: f"Matches your preference for {style} style"
+        )
+    
+    def _matches(self, column: str, values: List[str]) -> np.ndarray:
+        """Boolean mask of products whose `column` is one of `values`."""
+        codes = [self.catalog.code_for(column, v) for v in values]
+        return np.isin(self.catalog.codes[column], [c for c in codes if c >= 0])
 
 
 class PersonalizationEngine:
     """Multi-strategy personalization engine."""
     
-    def __init__(self, products_df: Any):
+    def __init__(self, catalog: CatalogStore, build_if_missing: bool = False):
         """
         Initialize personalization engine.
         
         Args:
-            products_df: DataFrame with product information
+            catalog: Shared product catalog
+            build_if_missing: Build a missing or stale product matrix (see ContentBasedRecommender)
         """
-        self.products_df = products_df
+        self.catalog = catalog
         self.preference_encoder = PreferenceEncoder()
-        self.recommender = ContentBasedRecommender(products_df, self.preference_encoder)
+        self.recommender = ContentBasedRecommender(
+            catalog, self.preference_encoder, build_if_missing=build_if_missing
+        )
         
         # Strategy weights
         self.weights = {
@@ -329,8 +361,7 @@ class PersonalizationEngine:
         
         return combined
     
-    def get_metrics(self, recommendations: Dict[str, List[RecommendationResult]],
-                   products_df: Any = None) -> Dict:
+    def get_metrics(self, recommendations: Dict[str, List[RecommendationResult]]) -> Dict:
         """Calculate personalization metrics."""
         combined = recommendations.get("combined", [])
         
@@ -343,22 +374,13 @@ class PersonalizationEngine:
         
         # Coverage: unique products / total available
         unique_products = len(set(r.product_id for r in combined))
-        total_products = len(products_df) if products_df is not None else 1
-        coverage = unique_products / max(total_products, 1)
+        coverage = unique_products / max(len(self.catalog), 1)
         
         # Diversity: category distribution
-        if products_df is not None:
-            categories = []
-            for rec in combined:
-                mask = products_df['product_id'] == rec.product_id
-                if mask.any():
-                    cat = products_df[mask].iloc[0].get('category', 'Unknown')
-                    categories.append(cat)
-            
-            unique_categories = len(set(categories))
-            diversity = unique_categories / len(combined) if combined else 0
-        else:
-            diversity = 0.0
+        rows = self.catalog.rows_for_ids([rec.product_id for rec in combined])
+        categories = self.catalog.column('masterCategory', rows[rows >= 0])
+        unique_categories = len(set(categories.tolist()))
+        diversity = unique_categories / len(combined) if combined else 0
         
         # Avg score
         avg_score = np.mean([r.score for r in combined]) if combined else 0.0
@@ -0,0 +1,128 @@
+"""
+Query rewriting for multi-query retrieval.
+
+`QueryExpander` reproduces the phase 5 expander (fashion synonyms and colour
+variations, one word replaced per variant) and loads the notebook pickle
+`data/models/query_expander.pkl`, whose expansion cache warm-starts the
+serving cache. Variants are cached per normalized query in a bounded LRU, so
+repeated queries never re-expand and their variant embeddings are hits in the
+query embedding cache.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import logging
+
+from app.core.cache import TTLCache
+from app.core.model_io import load_pickle
+from app.core.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class _PickledExpander:
+    """Attribute holder for notebook expander pickles ({"cache": {query: [query, *variants]}})."""
+
+
+class QueryExpander:
+    """Dictionary-based query rewrites (original query first)."""
+
+    # Fashion domain synonyms
+    FASHION_SYNONYMS = {
+        # Apparel
+        'dress': ['gown', 'frock', 'robe'],
+        'shirt': ['top', 'blouse', 'tunic'],
+        'jeans': ['denim', 'pants', 'trousers'],
+        'tshirt': ['tee', 't-shirt', 'shirt'],
+        'jacket': ['coat', 'blazer', 'outerwear'],
+        'skirt': ['midi', 'mini', 'maxi'],
+        'shorts': ['bermuda', 'cutoffs'],
+
+        # Footwear
+        'shoes': ['footwear', 'kicks'],
+        'sneakers': ['trainers', 'athletic shoes', 'sports shoes'],
+        'boots': ['booties', 'ankle boots'],
+        'heels': ['pumps', 'stilettos', 'high heels'],
+        'sandals': ['flats', 'slides'],
+
+        # Accessories
+        'bag': ['purse', 'handbag', 'tote'],
+        'wallet': ['billfold', 'cardholder'],
+        'watch': ['timepiece', 'wristwatch'],
+        'sunglasses': ['shades', 'eyewear'],
+
+        # Styles
+        'casual': ['everyday', 'relaxed', 'informal'],
+        'formal': ['dressy', 'elegant', 'sophisticated'],
+        'sporty': ['athletic', 'active', 'sports'],
+    }
+
+    # Color variations
+    COLOR_VARIATIONS = {
+        'red': ['crimson', 'scarlet', 'burgundy', 'maroon'],
+        'blue': ['navy', 'azure', 'cobalt', 'royal'],
+        'green': ['emerald', 'olive', 'lime', 'forest'],
+        'yellow': ['gold', 'golden', 'mustard'],
+        'pink': ['rose', 'blush', 'coral'],
+        'purple': ['violet', 'lavender', 'plum'],
+        'brown': ['tan', 'beige', 'chocolate', 'coffee'],
+        'black': ['ebony', 'jet', 'noir'],
+        'white': ['ivory', 'cream', 'off-white'],
+        'grey': ['gray', 'silver', 'charcoal'],
+    }
+
+    # Replacements tried per matched word
+    PER_WORD = 2
+
+    def __init__(self, max_variants: int = 3, cache_size: int = 10000):
+        """
+        Args:
+            max_variants: Rewrites per query, besides the original
+            cache_size: Normalized queries whose variants are kept
+        """
+        self.max_variants = max_variants
+        self.cache = TTLCache(max_entries=cache_size, ttl_seconds=None, name="query_rewrites")
+
+    @classmethod
+    def load(cls, path: Path, max_variants: int = 3, cache_size: int = 10000) -> "QueryExpander":
+        """Expander warm-started from a phase 5 `query_expander.pkl` (fresh if the file is missing)."""
+        expander = cls(max_variants, cache_size)
+        if Path(path).exists():
+            pickled = load_pickle(path, {("__main__", "QueryExpander"): _PickledExpander})
+            for query, variants in getattr(pickled, "cache", {}).items():
+                expander.cache.put(normalize_text(query), [normalize_text(v) for v in variants])
+        return expander
+
+    def expand(self, query: str) -> List[str]:
+        """
+        Normalized query followed by up to `max_variants` rewrites, each with
+        one word replaced by a synonym or colour variation.
+        """
+        normalized = normalize_text(query)
+        variants = self.cache.get(normalized)
+        if variants is None:
+            variants = self._expand(normalized)
+            self.cache.put(normalized, variants)
+        return variants[:self.max_variants + 1]
+
+    def _expand(self, query: str) -> List[str]:
+        words = query.split()
+        expansions = [query]
+        for i, word in enumerate(words):
+            for table in (self.FASHION_SYNONYMS, self.COLOR_VARIATIONS):
+                for replacement in table.get(word, [])[:self.PER_WORD]:
+                    expanded = " ".join(words[:i] + [replacement] + words[i + 1:])
+                    if expanded not in expansions:
+                        expansions.append(expanded)
+                    if len(expansions) > self.max_variants:
+                        return expansions
+        return expansions
+
+    def get_stats(self) -> Dict:
+        return self.cache.get_stats()
+
+
+def load_query_expander(path: Path, max_variants: int, cache_size: int) -> Optional[QueryExpander]:
+    """Load the configured expander (None when rewriting is disabled by max_variants <= 0)."""
+    if max_variants <= 0:
+        return None
+    return QueryExpander.load(path, max_variants, cache_size)
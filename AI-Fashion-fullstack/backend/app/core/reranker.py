@@ -0,0 +1,273 @@
+"""
+Second-stage learned reranker over retrieval candidates.
+
+Serves the rankers trained in the research notebooks and shipped in
+`data/models`:
+
+- ``fusion``: `fusion_ranker.pkl`, StandardScaler + LogisticRegression over
+  5 features (phase 3 learned fusion)
+- ``advanced``: `advanced_ranker_optimized.pkl`, StandardScaler + LightGBM
+  over 10 features (phase 5)
+
+Features follow the notebook definitions but are computed for all
+candidates of a query at once: attribute matches are evaluated once per
+category value and gathered by code, and text tests run as vectorized
+substring searches over precomputed catalog arrays. All queries of a call
+are scored with one model call; the logistic model and its scaler are
+folded into a single weight vector.
+"""
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from app.core.catalog import CatalogStore
+from app.core.model_io import load_pickle
+
+logger = logging.getLogger(__name__)
+
+# Query vocabulary of the notebook feature extractors
+CATEGORY_KEYWORDS = {
+    "apparel": ["dress", "shirt", "tshirt", "t-shirt", "top", "jeans", "pants", "shorts", "skirt", "jacket"],
+    "footwear": ["shoes", "sandals", "heels", "boots", "sneakers", "flats", "slippers"],
+    "accessories": ["watch", "bag", "wallet", "belt", "sunglasses", "hat", "cap", "scarf"],
+}
+COLOR_TERMS = [
+    "red", "blue", "green", "yellow", "black", "white", "grey", "gray",
+    "pink", "purple", "brown", "orange", "navy", "beige", "maroon", "olive",
+    "turquoise", "gold", "silver", "bronze",
+]
+GENDER_TERMS = ["men", "women", "boys", "girls", "unisex"]
+
+# Stored feature name -> canonical name
+FEATURE_ALIASES = {"baseline_rank": "baseline_rank_normalized"}
+
+# Candidates per query the notebook rankers were trained on (baseline rank = rank / k)
+TRAINING_DEPTH = 20
+
+
+def _first_term(query: str, terms: Sequence[str]) -> Optional[str]:
+    return next((term for term in terms if term in query), None)
+
+
+def _query_category(query: str) -> Optional[str]:
+    return next(
+        (category for category, keywords in CATEGORY_KEYWORDS.items() if any(kw in query for kw in keywords)),
+        None
+    )
+
+
+class CandidateBatch:
+    """Feature inputs of one query's candidates (rows in retrieval order)."""
+
+    def __init__(self, query: str, catalog: CatalogStore, arrays: Dict[str, np.ndarray],
+                 rows: np.ndarray, similarities: np.ndarray,
+                 multi_query_scores: Optional[np.ndarray] = None):
+        self.query = query.lower()
+        self.words = set(self.query.split())
+        self.catalog = catalog
+        self.arrays = arrays
+        self.rows = rows
+        self.similarities = similarities
+        self.multi_query_scores = multi_query_scores
+        self.ranks = np.arange(1, len(rows) + 1, dtype=np.float32)
+
+    def category_values(self, column: str, predicate: Callable[[str], bool]) -> np.ndarray:
+        """Evaluate `predicate` once per lowercased category value, gathered per candidate."""
+        if column not in self.catalog.codes:
+            return np.zeros(len(self.rows), dtype=np.float32)
+        lowered = self.arrays[f"{column}_lower"]
+        per_value = np.fromiter((predicate(value) for value in lowered), dtype=bool, count=len(lowered))
+        return per_value[self.catalog.codes[column][self.rows]].astype(np.float32)
+
+    def contains_term(self, column: str, term: Optional[str]) -> np.ndarray:
+        if term is None:
+            return np.zeros(len(self.rows), dtype=np.float32)
+        return self.category_values(column, lambda value: term in value)
+
+    def contains_any_word(self, column: str) -> np.ndarray:
+        return self.category_values(column, lambda value: any(word in value for word in self.words))
+
+
+def _baseline_rank(batch: CandidateBatch) -> np.ndarray:
+    # Normalized by the training depth, not the candidate count; deeper candidates cap at 1
+    return np.minimum(batch.ranks / TRAINING_DEPTH, 1.0)
+
+
+def _attribute_coverage(batch: CandidateBatch) -> np.ndarray:
+    if not batch.words:
+        return np.zeros(len(batch.rows), dtype=np.float32)
+    texts = batch.arrays["product_text"][batch.rows].astype(str)
+    matches = sum((np.char.find(texts, word) >= 0).astype(np.float32) for word in batch.words)
+    return matches / len(batch.words)
+
+
+def _multi_query_score(batch: CandidateBatch) -> np.ndarray:
+    if batch.multi_query_scores is None:
+        return np.zeros(len(batch.rows), dtype=np.float32)
+    return np.asarray(batch.multi_query_scores, dtype=np.float32)
+
+
+# Canonical feature name -> vectorized extractor (phase 3 names, then phase 5 additions)
+FEATURES: Dict[str, Callable[[CandidateBatch], np.ndarray]] = {
+    "text_similarity": lambda b: np.asarray(b.similarities, dtype=np.float32),
+    "category_match": lambda b: b.contains_term("masterCategory", _query_category(b.query)),
+    "color_match": lambda b: b.contains_term("baseColour", _first_term(b.query, COLOR_TERMS)),
+    "gender_match": lambda b: b.contains_term("gender", _first_term(b.query, GENDER_TERMS)),
+    "baseline_rank_normalized": _baseline_rank,
+    "multi_query_score": _multi_query_score,
+    "attribute_coverage": _attribute_coverage,
+    "name_length": lambda b: b.arrays["name_length"][b.rows],
+    "has_image": lambda b: b.arrays["has_image"][b.rows],
+    "position_bias": lambda b: 1.0 / np.log2(b.ranks + 2),
+}
+
+# The phase 5 extractor redefined the attribute matches (query-independent
+# category, any query word for color / gender)
+ADVANCED_FEATURES = {
+    **FEATURES,
+    "category_match": lambda b: b.category_values(
+        "masterCategory", lambda value: any(c in value for c in CATEGORY_KEYWORDS)
+    ),
+    "color_match": lambda b: b.contains_any_word("baseColour"),
+    "gender_match": lambda b: b.contains_any_word("gender"),
+}
+
+# Reranker name -> (pickle in the models directory, feature extractors)
+RERANKERS = {
+    "fusion": ("fusion_ranker.pkl", FEATURES),
+    "advanced": ("advanced_ranker_optimized.pkl", ADVANCED_FEATURES),
+}
+
+
+class LearnedReranker:
+    """Scaler + classifier reranker scoring all candidates in one call."""
+
+    def __init__(self, name: str, model, scaler, feature_names: Sequence[str],
+                 extractors: Dict[str, Callable[[CandidateBatch], np.ndarray]] = FEATURES):
+        """
+        Args:
+            name: Reranker name (see RERANKERS)
+            model: Fitted LogisticRegression or LightGBM classifier / Booster
+            scaler: Fitted StandardScaler
+            feature_names: Model input columns, in order
+            extractors: Feature name -> vectorized extractor
+        """
+        self.name = name
+        self.feature_names = [FEATURE_ALIASES.get(f, f) for f in feature_names]
+        self.extractors = extractors
+        unknown = [f for f in self.feature_names if f not in self.extractors]
+        if unknown:
+            raise ValueError(f"Reranker '{name}' uses unsupported features {unknown}")
+
+        self.mean = np.asarray(scaler.mean_, dtype=np.float32)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float32)
+        if hasattr(model, "coef_"):
+            # sigmoid(((x - mean) / scale) @ coef + b) == sigmoid(x @ w + b')
+            coef = np.asarray(model.coef_, dtype=np.float64).ravel() / self.scale
+            self._weights = coef.astype(np.float32)
+            self._bias = float(np.asarray(model.intercept_).ravel()[0] - coef @ self.mean)
+            self._booster = None
+        else:
+            self._booster = getattr(model, "booster_", model)
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._catalog_key = None
+
+    @classmethod
+    def load(cls, name: str, models_dir: Path) -> "LearnedReranker":
+        """Load a shipped reranker pickle ({model, scaler, feature_names})."""
+        if name not in RERANKERS:
+            raise ValueError(f"Unknown reranker '{name}', expected one of {sorted(RERANKERS)}")
+        filename, extractors = RERANKERS[name]
+        bundle = load_pickle(Path(models_dir) / filename)
+        return cls(name, bundle["model"], bundle["scaler"], bundle["feature_names"], extractors)
+
+    def prepare(self, catalog: CatalogStore) -> Dict[str, np.ndarray]:
+        """Catalog-wide feature arrays, built once per catalog."""
+        if self._catalog_key == catalog.fingerprint:
+            return self._arrays
+
+        arrays = {
+            f"{column}_lower": np.array([str(v).lower() for v in values], dtype=object)
+            for column, values in catalog.categories.items()
+        }
+        names = catalog.names.astype(str)
+        lengths = np.char.str_len(names).astype(np.float32)
+        arrays["name_length"] = lengths / max(1.0, float(lengths.max(initial=0)))
+        arrays["has_image"] = np.array([url is not None for url in catalog.image_urls], dtype=np.float32)
+        if "attribute_coverage" in self.feature_names:
+            text = names
+            for column in ("masterCategory", "baseColour"):
+                if column in catalog.codes:
+                    text = np.char.add(np.char.add(text, " "), catalog.column(column).astype(str))
+            arrays["product_text"] = np.char.lower(text)
+
+        self._arrays, self._catalog_key = arrays, catalog.fingerprint
+        return arrays
+
+    def features(self, batch: CandidateBatch) -> np.ndarray:
+        """(n_candidates, n_features) float32 feature matrix."""
+        return np.column_stack([self.extractors[name](batch) for name in self.feature_names]).astype(np.float32)
+
+    def score(self, X: np.ndarray) -> np.ndarray:
+        """Relevance probabilities for a feature matrix (one model call)."""
+        if self._booster is None:
+            return 1.0 / (1.0 + np.exp(-(X @ self._weights + self._bias)))
+        return np.asarray(self._booster.predict((X - self.mean) / self.scale), dtype=np.float32)
+
+    def rerank(self, queries: Sequence[str], catalog: CatalogStore,
+               candidates: Sequence[Tuple[np.ndarray, np.ndarray]], k: int,
+               multi_query_scores: Optional[Sequence[Optional[np.ndarray]]] = None,
+               timings: Optional[Dict[str, float]] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Rerank the candidates of many queries.
+
+        Args:
+            queries: Query text per query
+            catalog: Catalog the candidate rows index into
+            candidates: (cosine similarities, catalog rows) per query, in retrieval
+                order; -1 rows are dropped
+            k: Results kept per query
+            multi_query_scores: Optional per-candidate expansion scores per query
+            timings: Optional dict receiving rerank_features_ms / rerank_score_ms
+
+        Returns:
+            (probabilities, rows) per query, best first
+        """
+        start = time.perf_counter()
+        arrays = self.prepare(catalog)
+        batches = []
+        for i, (query, (similarities, rows)) in enumerate(zip(queries, candidates)):
+            rows = np.asarray(rows, dtype=np.int64)
+            valid = rows >= 0
+            extra = multi_query_scores[i] if multi_query_scores is not None else None
+            batches.append(CandidateBatch(
+                query, catalog, arrays, rows[valid], np.asarray(similarities)[valid],
+                None if extra is None else np.asarray(extra)[valid]
+            ))
+        X = np.vstack([self.features(b) for b in batches]) if batches else np.empty((0, len(self.feature_names)))
+        features_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        probabilities = self.score(X) if len(X) else np.empty(0, dtype=np.float32)
+        score_ms = (time.perf_counter() - start) * 1000
+        if timings is not None:
+            timings["rerank_features_ms"] = round(timings.get("rerank_features_ms", 0.0) + features_ms, 3)
+            timings["rerank_score_ms"] = round(timings.get("rerank_score_ms", 0.0) + score_ms, 3)
+
+        results, offset = [], 0
+        for batch in batches:
+            scores = probabilities[offset:offset + len(batch.rows)]
+            offset += len(batch.rows)
+            order = np.argsort(-scores, kind="stable")[:k]
+            results.append((scores[order], batch.rows[order]))
+        return results
+
+
+def load_reranker(name: str, models_dir: Path) -> Optional[LearnedReranker]:
+    """Load the configured reranker ("none" or "" disables reranking)."""
+    if not name or name == "none":
+        return None
+    return LearnedReranker.load(name, models_dir)
@@ -0,0 +1,33 @@
+"""Text normalization shared by caches and query processing."""
+import re
+
+# Turkish characters folded in 'turkish_aware' mode
+_TR_MAP = {
+    'ı': 'i', 'ğ': 'g', 'ü': 'u', 'ş': 's', 'ö': 'o', 'ç': 'c',
+    'İ': 'i', 'Ğ': 'g', 'Ü': 'u', 'Ş': 's', 'Ö': 'o', 'Ç': 'c'
+}
+
+
+def normalize_text(text: str, mode: str = 'standard') -> str:
+    """
+    Normalize query text (mirrors `normalize_text` in v2.0-baseline/src/schema.py).
+
+    Args:
+        text: Input text
+        mode: 'standard' (lowercase + strip), 'aggressive' (+ remove punctuation)
+            or 'turkish_aware' (+ Turkish character folding)
+
+    Returns:
+        Normalized text
+    """
+    text = text.lower().strip()
+
+    if mode in ['aggressive', 'turkish_aware']:
+        text = re.sub(r'[^\w\s]', ' ', text)
+        text = re.sub(r'\s+', ' ', text)
+
+    if mode == 'turkish_aware':
+        for tr_char, en_char in _TR_MAP.items():
+            text = text.replace(tr_char, en_char)
+
+    return text.strip()
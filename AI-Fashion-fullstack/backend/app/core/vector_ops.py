@@ -0,0 +1,50 @@
+"""Small NumPy helpers shared by the retrieval and recommendation code."""
+import numpy as np
+
+# FAISS pads missing inner-product results with -FLT_MAX and id -1
+MISSING_SCORE = np.float32(-3.4028235e+38)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row (zero rows are left as zeros)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int):
+    """
+    Select the k highest scores per row without a full sort.
+
+    Args:
+        scores: (n_queries, n_items) score matrix
+        k: Number of results per row
+
+    Returns:
+        (top_scores, top_indices), both (n_queries, k) and sorted descending.
+        Rows with fewer than k items are padded FAISS-style with
+        MISSING_SCORE / -1.
+    """
+    scores = np.atleast_2d(scores)
+    n_rows, n_items = scores.shape
+    k_eff = min(k, n_items)
+
+    if k_eff <= 0:
+        top_idx = np.empty((n_rows, 0), dtype=np.int64)
+    elif k_eff < n_items:
+        top_idx = np.argpartition(-scores, k_eff - 1, axis=1)[:, :k_eff]
+    else:
+        top_idx = np.broadcast_to(np.arange(n_items), (n_rows, n_items))
+
+    top_scores = np.take_along_axis(scores, top_idx, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top_idx = np.take_along_axis(top_idx, order, axis=1).astype(np.int64)
+    top_scores = np.take_along_axis(top_scores, order, axis=1).astype(np.float32)
+
+    if k_eff < k:
+        pad = k - k_eff
+        top_idx = np.hstack([top_idx, np.full((n_rows, pad), -1, dtype=np.int64)])
+        top_scores = np.hstack([top_scores, np.full((n_rows, pad), MISSING_SCORE, dtype=np.float32)])
+
+    return top_scores, top_idx
@@ -9,7 +9,14 @@ class SearchRequest(BaseModel):
     text: Optional[str] = Field(None, description="Text query")
     k: int = Field(10, ge=1, le=100, description="Number of results")
     text_weight: float = Field(0.7, ge=0.0, le=1.0, description="Text weight for hybrid search")
-    filters: Optional[Dict[str, Any]] = Field(None, description="Metadata filters")
+    filters: Optional[Dict[str, Any]] = Field(
+        None,
+        description=(
+            "Metadata filters applied inside the index search, e.g. "
+            '{"gender": "Women", "color": ["Red", "Pink"]}. Keys: gender, color/baseColour, '
+            "category/masterCategory, sub_category/subCategory, article_type/articleType, season, usage"
+        )
+    )
 
 
 class Product(BaseModel):
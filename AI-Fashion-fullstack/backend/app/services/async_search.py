@@ -0,0 +1,139 @@
+"""
+Async facade over FashionSearchEngine.
+
+Encoding (torch), index search (BLAS/FAISS) and image decoding (PIL) are
+CPU-bound and would stall the event loop if called from `async def`
+endpoints. `AsyncFashionSearchEngine` runs them in a bounded thread pool; all
+of these release the GIL for their heavy work, and threads keep sharing the
+process-wide models, indexes and encoder batchers. An asyncio semaphore caps
+in-flight searches so a burst queues here instead of piling up in the pool.
+
+Uploaded images are hashed and decoded (JPEG draft mode) in a separate small
+pool first, so slow decodes of large photos never occupy search threads.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, List, Optional
+import logging
+
+from app.core.config import settings
+from app.services.search_engine import FashionSearchEngine, QueryImage, SearchResult
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncFashionSearchEngine:
+    """Awaitable search API that keeps CPU work off the event loop."""
+
+    def __init__(
+        self,
+        engine: FashionSearchEngine,
+        max_workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        decode_workers: Optional[int] = None,
+    ):
+        """
+        Args:
+            engine: Synchronous search engine doing the actual work
+            max_workers: Executor threads (defaults to settings.search_executor_workers)
+            max_concurrency: Max in-flight calls (defaults to settings.search_max_concurrency)
+            decode_workers: Image decode threads (defaults to settings.image_decode_workers)
+        """
+        self.engine = engine
+        self.max_workers = max_workers or settings.search_executor_workers
+        self.max_concurrency = max_concurrency or settings.search_max_concurrency
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="search")
+        self._decode_executor = ThreadPoolExecutor(
+            decode_workers or settings.image_decode_workers, thread_name_prefix="decode"
+        )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def ml(self):
+        return self.engine.ml
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable in the search executor."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def search(self, text=None, image=None, k=10, alpha=0.7, filters=None,
+                     ef_search=None, nprobe=None, timings=None, deadline=None, sources=None) -> List[SearchResult]:
+        """Awaitable `FashionSearchEngine.search` (uploaded bytes are decoded in the decode pool)."""
+        if isinstance(image, (bytes, bytearray)):
+            image = await self.prepare_image(bytes(image), timings, text=text, deadline=deadline)
+        return await self.run(
+            self.engine.search, text=text, image=image, k=k, alpha=alpha, filters=filters,
+            ef_search=ef_search, nprobe=nprobe, timings=timings, deadline=deadline, sources=sources
+        )
+
+    async def search_batch(self, texts=None, images=None, k=10, alpha=0.7, filters=None,
+                           ef_search=None, nprobe=None, timings=None) -> List[List[SearchResult]]:
+        """Awaitable `FashionSearchEngine.search_batch` (uploads are decoded concurrently)."""
+        if images:
+            start = time.perf_counter()
+            images = await asyncio.gather(*(
+                self.prepare_image(bytes(image)) if isinstance(image, (bytes, bytearray))
+                else asyncio.sleep(0, result=image)
+                for image in images
+            ))
+            if timings is not None:
+                timings["decode_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return await self.run(
+            self.engine.search_batch, texts=texts, images=images, k=k, alpha=alpha,
+            filters=filters, ef_search=ef_search, nprobe=nprobe, timings=timings
+        )
+
+    async def similar(self, product_id, k=10, kind=None, filters=None, timings=None,
+                      sources=None) -> List[SearchResult]:
+        """
+        Awaitable `FashionSearchEngine.similar`: neighbor table lookups are answered
+        inline, only the live-search fallback goes to the executor.
+        """
+        results = self.engine.similar_from_table(product_id, k, kind, filters, timings, sources)
+        if results is not None:
+            return results
+        return await self.run(
+            self.engine.similar, product_id, k=k, kind=kind, filters=filters, timings=timings, sources=sources
+        )
+
+    async def prepare_image(self, contents: bytes, timings=None, text=None, deadline=None) -> QueryImage:
+        """
+        Hash, cache lookup and draft-mode decode of an upload in the decode pool.
+
+        With a text query and a `deadline`, decoding is skipped when the budget
+        can no longer afford the image leg.
+        """
+        def prepare():
+            query = self.engine.prepare_image(contents, timings, decode=False)
+            if self.engine.image_leg_allowed(query, text, deadline):
+                self.engine.decode_image(query, timings)
+            return query
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._decode_executor, prepare)
+
+    def shutdown(self):
+        """Stop accepting work and release executor threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._decode_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_async_search_engine(request) -> AsyncFashionSearchEngine:
+    """
+    Get the app-wide async search engine (stored on app.state).
+
+    Created at startup by main.py; lazily created here if startup skipped it.
+    """
+    state = request.app.state
+    engine = getattr(state, "search_engine", None)
+    if engine is None:
+        engine = AsyncFashionSearchEngine(FashionSearchEngine(getattr(state, "ml_loader", None)))
+        state.search_engine = engine
+        logger.info("✅ Async search engine initialized")
+    return engine
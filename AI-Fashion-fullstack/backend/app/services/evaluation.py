@@ -1,43 +1,105 @@
+"""
+Offline retrieval evaluation (v2.1 baseline comparisons).
+
+Rankings are (n_queries, k) arrays of catalog rows (-1 = missing), one per
+method. Consensus ground truth, fusion and all metrics work on whole query
+sets at once, so a full method grid is scored with a few array operations
+instead of per-query dict loops.
+"""
 import numpy as np
 import pandas as pd
-from rank_bm25 import BM25Okapi
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import linear_kernel
-from typing import List, Dict
-
-
-def bm25_retrieve(corpus: List[str], queries: List[str], k: int = 10) -> List[List[int]]:
-    tokenized = [doc.split() for doc in corpus]
-    bm25 = BM25Okapi(tokenized)
-    results = []
-    for q in queries:
-        q_tok = q.split()
-        scores = bm25.get_scores(q_tok)
-        topk = np.argsort(scores)[::-1][:k]
-        results.append(topk.tolist())
-    return results
-
-
-def tfidf_retrieve(corpus: List[str], queries: List[str], k: int = 10) -> List[List[int]]:
-    vect = TfidfVectorizer().fit(corpus)
-    doc_mat = vect.transform(corpus)
-    q_mat = vect.transform(queries)
-    results = []
-    for i in range(q_mat.shape[0]):
-        sims = linear_kernel(q_mat[i:i+1], doc_mat).flatten()
-        topk = np.argsort(sims)[::-1][:k]
-        results.append(topk.tolist())
-    return results
+from scipy.stats import rankdata
+from typing import List, Dict, Optional, Sequence, Union
+
+from app.core.config import settings
+from app.core.fusion import rrf_aggregate as rrf_fuse
+from app.core.lexical_index import LexicalIndex
+from app.core.vector_ops import normalize_rows
+
+
+def _lexical(corpus: Union[List[str], LexicalIndex], scheme: str, tokenizer: str) -> LexicalIndex:
+    # Pass a prebuilt LexicalIndex to avoid re-indexing the corpus on every call
+    if isinstance(corpus, LexicalIndex):
+        return corpus
+    return LexicalIndex.build(corpus, scheme=scheme, tokenizer=tokenizer)
+
+
+def _fill_rankings(rows: np.ndarray, n_docs: int) -> List[List[int]]:
+    """
+    Per-query lists of exactly min(k, n_docs) ids: the hits, then non-matching
+    documents from the highest index down (the order the original argsort gave
+    zero-score ties).
+    """
+    k = min(rows.shape[1], n_docs)
+    filled = []
+    for hits in rows:
+        hits = hits[hits >= 0][:k]
+        filler = np.arange(n_docs - 1, max(-1, n_docs - 1 - k - len(hits)), -1)
+        filler = filler[~np.isin(filler, hits)][:k - len(hits)]
+        filled.append(np.concatenate([hits, filler]).tolist())
+    return filled
+
+
+def bm25_rankings(corpus: Union[List[str], LexicalIndex], queries: List[str], k: int = 10) -> np.ndarray:
+    """(n_queries, k) BM25 hits, padded with -1 where fewer than k documents match."""
+    return _lexical(corpus, "bm25", "whitespace").search(queries, k)[1]
+
+
+def tfidf_rankings(corpus: Union[List[str], LexicalIndex], queries: List[str], k: int = 10) -> np.ndarray:
+    """(n_queries, k) TF-IDF hits, padded with -1 where fewer than k documents match."""
+    return _lexical(corpus, "tfidf", "sklearn").search(queries, k)[1]
+
+
+def bm25_retrieve(corpus: Union[List[str], LexicalIndex], queries: List[str], k: int = 10) -> List[List[int]]:
+    index = _lexical(corpus, "bm25", "whitespace")
+    return _fill_rankings(bm25_rankings(index, queries, k), index.ntotal)
+
+
+def tfidf_retrieve(corpus: Union[List[str], LexicalIndex], queries: List[str], k: int = 10) -> List[List[int]]:
+    index = _lexical(corpus, "tfidf", "sklearn")
+    return _fill_rankings(tfidf_rankings(index, queries, k), index.ntotal)
+
+
+def encode_queries(leg: str, queries: List[str]) -> np.ndarray:
+    """Encode queries with the serving encoder of a leg (L2-normalized); the image leg uses CLIP text features."""
+    if leg == "text":
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(settings.text_model_name)
+        return normalize_rows(model.encode(queries, batch_size=64, convert_to_numpy=True))
+
+    import torch
+    from transformers import CLIPModel, CLIPProcessor
+    model = CLIPModel.from_pretrained(settings.clip_model_name)
+    processor = CLIPProcessor.from_pretrained(settings.clip_model_name)
+    inputs = processor(text=queries, padding=True, truncation=True, return_tensors="pt")
+    with torch.no_grad():
+        return normalize_rows(model.get_text_features(**inputs).numpy())
+
+
+def pad_rankings(rankings: Sequence[Sequence[int]], k: Optional[int] = None) -> np.ndarray:
+    """Ragged per-query row lists -> (n_queries, k) int64 array padded with -1."""
+    if isinstance(rankings, np.ndarray) and rankings.ndim == 2:
+        rows = rankings.astype(np.int64)
+        if k is None or k == rows.shape[1]:
+            return rows
+        if k < rows.shape[1]:
+            return rows[:, :k]
+        return np.hstack([rows, np.full((len(rows), k - rows.shape[1]), -1, dtype=np.int64)])
+
+    k = max((len(r) for r in rankings), default=0) if k is None else k
+    out = np.full((len(rankings), k), -1, dtype=np.int64)
+    for i, rows in enumerate(rankings):
+        rows = np.asarray(rows, dtype=np.int64)[:k]
+        out[i, :len(rows)] = rows
+    return out
 
 
 def rrf_aggregate(ranked_lists: List[List[int]], k: int = 10, c: int = 60) -> List[int]:
-    # Reciprocal Rank Fusion: sum 1 / (c + rank)
-    scores = {}
-    for rlist in ranked_lists:
-        for rank, doc in enumerate(rlist):
-            scores[doc] = scores.get(doc, 0) + 1.0 / (c + rank + 1)
-    sorted_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-    return [doc for doc, _ in sorted_docs][:k]
+    # Reciprocal Rank Fusion of one query's rankings: sum 1 / (c + rank)
+    if not ranked_lists:
+        return []
+    _, rows = rrf_fuse([pad_rankings([r]) for r in ranked_lists], k, c=c)
+    return rows[0][rows[0] >= 0].tolist()
 
 
 def topk_to_ranked_lists(topk_all_methods: Dict[str, List[List[int]]], k: int = 10):
@@ -50,3 +112,124 @@ def topk_to_ranked_lists(topk_all_methods: Dict[str, List[List[int]]], k: int =
             lists.append(lists_all[qi])
         per_query_lists.append(lists)
     return per_query_lists
+
+
+def stack_rankings(topk_all_methods: Dict[str, Sequence[Sequence[int]]], k: int = 10) -> np.ndarray:
+    """Method -> per-query rankings stacked into (n_queries, n_methods, k), padded with -1."""
+    return np.stack([pad_rankings(lists, k) for lists in topk_all_methods.values()], axis=1)
+
+
+def rrf_consensus(rankings: Dict[str, np.ndarray], c: int = 60) -> np.ndarray:
+    """
+    RRF consensus ranking of all methods (the v2.1 ground truth).
+
+    Returns:
+        (n_queries, depth) rows, depth = total candidates over all methods, padded with -1
+    """
+    lists = [pad_rankings(r) for r in rankings.values()]
+    depth = sum(r.shape[1] for r in lists)
+    _, rows = rrf_fuse(lists, depth, c=c)
+    return rows
+
+
+def hit_matrix(retrieved: np.ndarray, relevant: np.ndarray, k: int) -> np.ndarray:
+    """(n_queries, k) True where the retrieved row at that rank is in the query's relevant set."""
+    retrieved = pad_rankings(retrieved, k)
+    relevant = pad_rankings(relevant)
+    hits = (retrieved[:, :, None] == relevant[:, None, :]) & (relevant[:, None, :] >= 0)
+    return hits.any(axis=2) & (retrieved >= 0)
+
+
+def _relevant_counts(relevant: np.ndarray) -> np.ndarray:
+    return (pad_rankings(relevant) >= 0).sum(axis=1)
+
+
+def overlap_at_k(retrieved: np.ndarray, relevant: np.ndarray, k: int = 10) -> np.ndarray:
+    """Share of the top k that is relevant (Overlap@k against the consensus top k)."""
+    return hit_matrix(retrieved, relevant, k).sum(axis=1) / k
+
+
+def recall_at_k(retrieved: np.ndarray, relevant: np.ndarray, k: int = 10) -> np.ndarray:
+    """Share of each query's relevant rows found in the top k."""
+    return hit_matrix(retrieved, relevant, k).sum(axis=1) / np.maximum(1, _relevant_counts(relevant))
+
+
+def ndcg_at_k(retrieved: np.ndarray, relevant: np.ndarray, k: int = 10) -> np.ndarray:
+    """Binary-relevance NDCG@k per query."""
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = hit_matrix(retrieved, relevant, k) @ discounts
+    ideal = np.concatenate([[0.0], np.cumsum(discounts)])[np.minimum(_relevant_counts(relevant), k)]
+    return np.divide(dcg, ideal, out=np.zeros_like(dcg), where=ideal > 0)
+
+
+def average_precision_at_k(retrieved: np.ndarray, relevant: np.ndarray, k: int = 10) -> np.ndarray:
+    """AP@k per query (mean over queries = MAP@k)."""
+    hits = hit_matrix(retrieved, relevant, k)
+    precision = np.cumsum(hits, axis=1) / np.arange(1, k + 1)
+    denom = np.minimum(_relevant_counts(relevant), k)
+    return np.divide((precision * hits).sum(axis=1), denom, out=np.zeros(len(hits)), where=denom > 0)
+
+
+def rank_correlation(retrieved: np.ndarray, consensus: np.ndarray, k: int = 10) -> np.ndarray:
+    """
+    Spearman correlation between the top-k order and the rows' consensus
+    positions (rows missing from the consensus rank last), as in the v2.1
+    notebook; 0 where the positions have no variance.
+    """
+    retrieved = pad_rankings(retrieved, k)
+    consensus = pad_rankings(consensus)
+    valid = consensus >= 0
+    match = (retrieved[:, :, None] == consensus[:, None, :]) & valid[:, None, :] & (retrieved[:, :, None] >= 0)
+    positions = np.where(match.any(axis=2), match.argmax(axis=2), valid.sum(axis=1)[:, None]).astype(np.float64)
+
+    ranks = rankdata(positions, axis=1)
+    order = np.arange(1, k + 1, dtype=np.float64)
+    ranks -= ranks.mean(axis=1, keepdims=True)
+    order -= order.mean()
+    denom = np.sqrt((ranks ** 2).sum(axis=1) * (order ** 2).sum())
+    return np.divide(ranks @ order, denom, out=np.zeros(len(ranks)), where=denom > 0)
+
+
+def evaluate_rankings(rankings: Dict[str, np.ndarray], k: int = 10, c: int = 60,
+                      relevant: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Score every method on every query.
+
+    Args:
+        rankings: Method name -> (n_queries, depth) rows, best first
+        k: Metric cutoff
+        c: RRF constant of the consensus
+        relevant: Optional (n_queries, n) relevant rows; defaults to the RRF
+            consensus top k of all methods
+
+    Returns:
+        One row per (method, query) with overlap, recall, ndcg, map and rank_corr at k
+    """
+    consensus = rrf_consensus(rankings, c=c)
+    if relevant is None:
+        relevant = consensus[:, :k]
+
+    frames = []
+    for method, rows in rankings.items():
+        rows = pad_rankings(rows)
+        frames.append(pd.DataFrame({
+            "method": method,
+            "query": np.arange(len(rows)),
+            f"overlap@{k}": overlap_at_k(rows, relevant, k),
+            f"recall@{k}": recall_at_k(rows, relevant, k),
+            f"ndcg@{k}": ndcg_at_k(rows, relevant, k),
+            f"map@{k}": average_precision_at_k(rows, relevant, k),
+            "rank_corr": rank_correlation(rows, consensus, k),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def summarize(per_query: pd.DataFrame, categories: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Mean metrics per method (and per query category when given), best overlap first."""
+    metrics = [c for c in per_query.columns if c not in ("method", "query")]
+    keys = ["method"]
+    if categories is not None:
+        per_query = per_query.assign(category=np.asarray(categories)[per_query["query"].to_numpy()])
+        keys = ["category", "method"]
+    summary = per_query.groupby(keys, sort=False)[metrics].mean().reset_index()
+    return summary.sort_values(keys[:-1] + [metrics[0]], ascending=[True] * (len(keys) - 1) + [False])
@@ -0,0 +1,95 @@
+"""
+CLIP image preprocessing without CLIPProcessor (resize, center crop, normalize).
+
+Shared by the offline embedding build and the query path. Uploaded JPEGs are
+decoded with draft mode, so the decoder itself downscales multi-megapixel
+photos (1/2, 1/4 or 1/8) before the final bicubic resize.
+"""
+import io
+import numpy as np
+from pathlib import Path
+from typing import List, Optional, Union
+from PIL import Image
+import logging
+
+logger = logging.getLogger(__name__)
+
+# CLIP ViT input resolution and normalization constants
+CLIP_IMAGE_SIZE = 224
+CLIP_MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)
+CLIP_STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+
+
+def decode_for_clip(contents: bytes, size: int = CLIP_IMAGE_SIZE) -> np.ndarray:
+    """
+    Decode uploaded image bytes straight to a CLIP-sized array.
+
+    JPEG draft mode keeps the shortest side at or above `size`, so only the
+    needed DCT scale is decoded.
+
+    Returns:
+        (size, size, 3) uint8 RGB array
+    """
+    with Image.open(io.BytesIO(contents)) as image:
+        if image.format == "JPEG":
+            width, height = image.size
+            scale = size / min(width, height)
+            if scale < 1:
+                image.draft("RGB", (int(width * scale) + 1, int(height * scale) + 1))
+        return resize_center_crop(image, size)
+
+
+def dhash(image: Union[Image.Image, np.ndarray], hash_size: int = 8) -> int:
+    """
+    Difference hash: 64-bit perceptual fingerprint of the image structure.
+
+    Re-encoded, resized or slightly recompressed copies of an image differ in
+    only a few bits (compare with Hamming distance).
+    """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    gray = np.asarray(
+        image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16
+    )
+    bits = (gray[:, 1:] > gray[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def resize_center_crop(image: Image.Image, size: int = CLIP_IMAGE_SIZE) -> np.ndarray:
+    """
+    Resize the shortest side to `size` (bicubic) and center-crop a square.
+
+    Returns:
+        (size, size, 3) uint8 RGB array
+    """
+    image = image.convert("RGB")
+    width, height = image.size
+    scale = size / min(width, height)
+    new_w, new_h = max(size, round(width * scale)), max(size, round(height * scale))
+    image = image.resize((new_w, new_h), Image.BICUBIC)
+
+    left, top = (new_w - size) // 2, (new_h - size) // 2
+    image = image.crop((left, top, left + size, top + size))
+    return np.asarray(image, dtype=np.uint8)
+
+
+def load_image_for_clip(path: Union[str, Path]) -> Optional[np.ndarray]:
+    """
+    Decode and resize one image file (worker-pool friendly).
+
+    Returns:
+        (224, 224, 3) uint8 array, or None if the file is missing or unreadable
+    """
+    try:
+        with Image.open(path) as image:
+            return resize_center_crop(image)
+    except Exception as e:
+        logger.debug(f"Failed to load image {path}: {e}")
+        return None
+
+
+def to_pixel_values(images: List[np.ndarray]) -> np.ndarray:
+    """Stack resized uint8 images into a normalized float32 NCHW batch."""
+    batch = np.stack(images).astype(np.float32) / 255.0
+    batch = (batch - CLIP_MEAN) / CLIP_STD
+    return np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
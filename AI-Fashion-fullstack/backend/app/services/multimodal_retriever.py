@@ -8,6 +8,10 @@ import logging
 from PIL import Image
 import time
 
+from app.core.catalog import CatalogStore
+from app.core.fusion import fuse_legs
+from app.core.index_store import search_index
+
 logger = logging.getLogger(__name__)
 
 
@@ -51,7 +55,7 @@ class ImageQueryProcessor:
             image_path: Path to image file
         
         Returns:
-            CLIP image embedding (768d)
+            CLIP image embedding (512d)
         """
         try:
             # Load image
@@ -84,7 +88,7 @@ class ImageQueryProcessor:
             text: Text query
         
         Returns:
-            CLIP text embedding (768d)
+            CLIP text embedding (512d)
         """
         try:
             inputs = self.processor(text=text, return_tensors="pt")
@@ -107,41 +111,24 @@ class ImageQueryProcessor:
 class MultimodalRetriever:
     """Multimodal retrieval with text and image fusion."""
     
-    def __init__(self, ml_loader: Any, products_df: Any, fusion_alpha: float = 0.7):
+    def __init__(self, ml_loader: Any, catalog: CatalogStore, fusion_alpha: float = 0.7):
         """
         Initialize multimodal retriever.
         
         Args:
             ml_loader: MLLoader with indices
-            products_df: Products DataFrame
+            catalog: Shared product catalog
             fusion_alpha: Fusion weight for text vs image (α=0.7 means 70% text, 30% image)
         """
         self.ml_loader = ml_loader
-        self.products_df = products_df
+        self.catalog = catalog
         self.fusion_alpha = fusion_alpha
         self.image_processor = ImageQueryProcessor(ml_loader)
     
     def retrieve_by_text(self, query: str, k: int = 10) -> List[MultimodalResult]:
         """Retrieve products by text query."""
         try:
-            results = self.ml_loader.search_text(query, k=k)
-            
-            multimodal_results = []
-            for result in results:
-                product = self.products_df[self.products_df['product_id'] == result.product_id]
-                if not product.empty:
-                    product_data = product.iloc[0]
-                    multimodal_results.append(MultimodalResult(
-                        product_id=result.product_id,
-                        product_name=product_data.get('product_name', 'Unknown'),
-                        category=product_data.get('category', 'Unknown'),
-                        color=product_data.get('color', 'Unknown'),
-                        text_score=float(result.score),
-                        fused_score=float(result.score),
-                        source="text"
-                    ))
-            
-            return multimodal_results
+            return self._fuse_results([("text",) + self._text_leg(query, k)], k=k)
         except Exception as e:
             logger.error(f"Error retrieving by text: {e}")
             return []
@@ -149,35 +136,10 @@ class MultimodalRetriever:
     def retrieve_by_image(self, image_path: str, k: int = 10) -> List[MultimodalResult]:
         """Retrieve products by image query."""
         try:
-            # Encode image
-            image_embedding = self.image_processor.encode_image(image_path)
-            if image_embedding is None:
+            leg = self._image_leg(image_path, k)
+            if leg is None:
                 return []
-            
-            # Search in image index
-            distances, indices = self.ml_loader.image_index.search(
-                np.array([image_embedding], dtype=np.float32), k=k
-            )
-            
-            multimodal_results = []
-            for idx, distance in zip(indices[0], distances[0]):
-                if idx >= 0 and idx < len(self.products_df):
-                    product = self.products_df.iloc[idx]
-                    
-                    # Convert distance to similarity (FAISS returns negated similarity)
-                    similarity = float(distance)
-                    
-                    multimodal_results.append(MultimodalResult(
-                        product_id=product['product_id'],
-                        product_name=product.get('product_name', 'Unknown'),
-                        category=product.get('category', 'Unknown'),
-                        color=product.get('color', 'Unknown'),
-                        image_score=similarity,
-                        fused_score=similarity,
-                        source="image"
-                    ))
-            
-            return multimodal_results
+            return self._fuse_results([("image",) + leg], k=k)
         except Exception as e:
             logger.error(f"Error retrieving by image: {e}")
             return []
@@ -197,86 +159,73 @@ class MultimodalRetriever:
         """
         start_time = time.time()
         
-        results_text = []
-        results_image = []
-        
-        # Get text results
-        if text_query:
-            results_text = self.retrieve_by_text(text_query, k=k)
-        
-        # Get image results
-        if image_path:
-            results_image = self.retrieve_by_image(image_path, k=k)
-        
-        # Fuse results
-        fused = self._fuse_results(results_text, results_image, k=k)
-        
-        # Sort by fused score
-        fused.sort(key=lambda x: x.fused_score, reverse=True)
+        legs = []
+        try:
+            if text_query:
+                legs.append(("text",) + self._text_leg(text_query, k))
+            if image_path:
+                image_leg = self._image_leg(image_path, k)
+                if image_leg is not None:
+                    legs.append(("image",) + image_leg)
+            fused = self._fuse_results(legs, k=k) if legs else []
+        except Exception as e:
+            logger.error(f"Error in multimodal retrieval: {e}")
+            fused = []
         
         logger.info(f"Multimodal retrieval took {time.time() - start_time:.3f}s")
         
-        return fused[:k]
+        return fused
+    
+    def _text_leg(self, query: str, k: int) -> Tuple[Any, np.ndarray, np.ndarray]:
+        """Encode a text query and search the text index: (index, embedding, rows)."""
+        index = self.ml_loader.text_index
+        embedding = self.ml_loader.encode_text_batch([query])[0]
+        _, indices = search_index(index, embedding.reshape(1, -1), k)
+        return index, embedding, indices[0]
+    
+    def _image_leg(self, image_path: str, k: int) -> Optional[Tuple[Any, np.ndarray, np.ndarray]]:
+        """Encode an image query and search the image index: (index, embedding, rows)."""
+        embedding = self.image_processor.encode_image(image_path)
+        if embedding is None:
+            return None
+        index = self.ml_loader.image_index
+        _, indices = search_index(index, np.asarray(embedding, dtype=np.float32).reshape(1, -1), k)
+        return index, embedding, indices[0]
     
-    def _fuse_results(self, text_results: List[MultimodalResult],
-                     image_results: List[MultimodalResult],
+    def _fuse_results(self, legs: List[Tuple[str, Any, np.ndarray, np.ndarray]],
                      k: int = 10) -> List[MultimodalResult]:
-        """Fuse text and image results using learned weights."""
-        
-        # Create score dictionary
-        scores = {}
+        """
+        Fuse text and image legs: fused = α * text_score + (1-α) * image_score.
         
-        # Add text scores
-        for result in text_results:
-            if result.product_id not in scores:
-                scores[result.product_id] = {
-                    "text": 0.0,
-                    "image": 0.0,
-                    "result": result
-                }
-            scores[result.product_id]["text"] = result.text_score
-            scores[result.product_id]["result"] = result
+        Every candidate gets its exact score on each leg (not 0 when only one
+        leg retrieved it); α=0.7 means 70% weight to text, 30% to image.
+        """
+        names = [leg[0] for leg in legs]
+        weights = {"text": self.fusion_alpha, "image": 1 - self.fusion_alpha} if len(legs) > 1 else {names[0]: 1.0}
+        fused, rows, leg_scores, found = fuse_legs(
+            [leg[1:] for leg in legs], [weights[name] for name in names], k=k
+        )
         
-        # Add image scores
-        for result in image_results:
-            if result.product_id not in scores:
-                scores[result.product_id] = {
-                    "text": 0.0,
-                    "image": 0.0,
-                    "result": result
-                }
-            scores[result.product_id]["image"] = result.image_score
-            if result.product_id not in scores or result.text_score == 0:
-                scores[result.product_id]["result"] = result
+        valid = rows < len(self.catalog)
+        scores = dict(zip(names, leg_scores[:, valid]))
+        found = found[:, valid]
+        zeros = np.zeros(int(valid.sum()), dtype=np.float32)
+        text_scores = scores.get("text", zeros)
+        image_scores = scores.get("image", zeros)
         
-        # Compute fused scores
         fused_results = []
-        for product_id, score_data in scores.items():
-            text_score = score_data["text"]
-            image_score = score_data["image"]
-            
-            # Fused score: α * text_score + (1-α) * image_score
-            # α=0.7 means 70% weight to text, 30% to image
-            fused_score = self.fusion_alpha * text_score + (1 - self.fusion_alpha) * image_score
-            
-            # Determine source
-            has_text = text_score > 0
-            has_image = image_score > 0
-            if has_text and has_image:
-                source = "both"
-            elif has_text:
-                source = "text"
-            else:
-                source = "image"
-            
-            # Update result
-            result = score_data["result"]
-            result.text_score = text_score
-            result.image_score = image_score
-            result.fused_score = fused_score
-            result.source = source
-            
-            fused_results.append(result)
+        for i, product in enumerate(self.catalog.products(rows[valid])):
+            hits = [name for name, hit in zip(names, found[:, i]) if hit]
+            fused_results.append(MultimodalResult(
+                product_id=product['product_id'],
+                product_name=product.get('product_name', 'Unknown'),
+                category=product.get('category', 'Unknown'),
+                color=product.get('color', 'Unknown'),
+                text_score=float(text_scores[i]),
+                image_score=float(image_scores[i]),
+                fused_score=float(fused[valid][i]),
+                source="both" if len(hits) > 1 else hits[0]
+            ))
         
         return fused_results
     
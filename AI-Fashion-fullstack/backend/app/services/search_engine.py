@@ -1,12 +1,19 @@
-"""Fashion Search Engine - Production Ready with 768d Support"""
+"""Fashion Search Engine - Production Ready with native-dimension indexes"""
+import sys
+import time
 import numpy as np
-import torch
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 from PIL import Image
 from dataclasses import dataclass
-from pathlib import Path
 import logging
 
+from app.core.cache import EmbeddingCache, ImageEmbeddingCache, ResponseCache
+from app.core.config import settings
+from app.core.fusion import cosine_to_unit, exact_leg_scores, fuse_legs, rrf_aggregate
+from app.core.index_store import search_index
+from app.core.neighbors import NEIGHBOR_KINDS
+from app.services.image_preprocessing import decode_for_clip, dhash
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -19,6 +26,51 @@ class SearchResult:
     color: str
     score: float
     image_url: Optional[str] = None
+    rerank_score: Optional[float] = None  # reranker relevance probability (score stays the retrieval similarity)
+    fusion_score: Optional[float] = None  # scaled RRF of lexical / rewrite fusion (1 = rank 1 on every list)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Fresh dict copy (safe to mutate, e.g. for personalization)."""
+        return dict(self.__dict__)
+
+
+@dataclass
+class QueryImage:
+    """
+    Uploaded query image after hashing and the cache lookup.
+    
+    `embedding` is set on a cache hit; otherwise `pixels` holds the decoded
+    CLIP-sized array (or `contents` the still-encoded bytes).
+    """
+    cache_key: Tuple[str, str]
+    contents: Optional[bytes] = None
+    pixels: Optional[np.ndarray] = None
+    embedding: Optional[np.ndarray] = None
+    phash: Optional[int] = None
+
+
+def _add_timing(timings: Optional[Dict[str, float]], stage: str, start: float):
+    """Accumulate milliseconds since `start` under `stage` (no-op without a dict)."""
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000, 3)
+
+
+def _lookup_scores(rows: np.ndarray, keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Value of each row in (keys, values), 0 for rows not among the keys."""
+    if not len(keys):
+        return np.zeros(len(rows), dtype=np.float32)
+    order = np.argsort(keys)
+    keys, values = keys[order], values[order]
+    pos = np.minimum(np.searchsorted(keys, rows), len(keys) - 1)
+    return np.where(keys[pos] == rows, values[pos], 0.0).astype(np.float32)
+
+
+def _results_size(results: List[SearchResult]) -> int:
+    """Rough memory footprint of a cached result list in bytes."""
+    return sys.getsizeof(results) + sum(
+        sys.getsizeof(r) + sys.getsizeof(r.__dict__) + sum(sys.getsizeof(v) for v in r.__dict__.values())
+        for r in results
+    )
 
 class FashionSearchEngine:
     def __init__(self, ml_loader=None):
@@ -32,6 +84,16 @@ class FashionSearchEngine:
             except Exception as e:
                 logger.error(f"❌ ML Loader failed: {e}")
                 self.ml = None
+        
+        self.response_cache = None
+        if settings.response_cache_size > 0:
+            self.response_cache = ResponseCache(
+                max_entries=settings.response_cache_size,
+                ttl_seconds=settings.response_cache_ttl_seconds,
+                max_bytes=int(settings.response_cache_max_mb * 2**20),
+                sizeof=_results_size,
+                name="search_responses"
+            )
     
     def _check_ml_loaded(self):
         """Check if ML models are loaded."""
@@ -39,55 +101,232 @@ class FashionSearchEngine:
             raise RuntimeError(
                 "ML models not loaded. Please ensure:\n"
                 "1. data/embeddings/mpnet_768d.npy exists (~200 MB)\n"
-                "2. data/embeddings/clip_image_768d_normalized.npy exists (~500 MB)\n"
+                "2. data/embeddings/clip_image_512d_normalized.npy exists (~90 MB)\n"
                 "3. data/meta_ssot.csv exists"
             )
     
     def encode_text(self, text: str) -> np.ndarray:
-        """Encode text query using MPNet (768d)."""
+        """
+        Encode text query using MPNet (768d).
+        
+        Repeated queries are served from the query cache (keyed on the
+        normalized text); misses are batched with concurrent requests.
+        """
         self._check_ml_loaded()
-        emb = self.ml.text_model.encode([text], convert_to_numpy=True)[0]
-        return (emb / np.linalg.norm(emb)).astype('float32')
+        cache = self.ml.query_cache
+        key = EmbeddingCache.key(settings.text_model_name, text)
+        if cache is not None:
+            emb = cache.get(key)
+            if emb is not None:
+                return emb
+        
+        normalized = key[1]
+        if self.ml.text_batcher is not None:
+            emb = self.ml.text_batcher(normalized)
+        else:
+            emb = self.ml.encode_text_batch([normalized])[0]
+        
+        if cache is not None:
+            emb.setflags(write=False)  # shared between requests
+            cache.put(key, emb)
+        return emb
     
-    def encode_image(self, image: Image.Image) -> np.ndarray:
+    def prepare_image(self, contents: bytes, timings: Optional[Dict[str, float]] = None,
+                      decode: bool = True) -> "QueryImage":
         """
-        Encode image using CLIP and pad to 768d.
+        Hash an upload and look it up in the image embedding cache; on a miss,
+        decode it (JPEG draft mode) to a CLIP-sized array and try a perceptual
+        near-duplicate lookup.
         
-        CLIP ViT-B/32 produces 512d embeddings.
-        Our index expects 768d, so we pad with zeros.
+        Args:
+            contents: Encoded image bytes
+            timings: Optional dict receiving per-stage milliseconds
+            decode: Decode now (False defers it to `encode_image`)
+        """
+        self._check_ml_loaded()
+        start = time.perf_counter()
+        cache = getattr(self.ml, "image_cache", None)
+        query = QueryImage(ImageEmbeddingCache.key(settings.clip_model_name, contents), contents=contents)
+        if cache is not None:
+            query.embedding = cache.get(query.cache_key)
+        _add_timing(timings, "hash_ms", start)
+        
+        if decode:
+            self.decode_image(query, timings)
+        return query
+    
+    def decode_image(self, query: "QueryImage", timings: Optional[Dict[str, float]] = None):
+        """Decode a prepared upload (no-op once decoded or when its embedding is cached)."""
+        if query.embedding is not None or query.pixels is not None:
+            return
+        start = time.perf_counter()
+        query.pixels = decode_for_clip(query.contents)
+        query.contents = None
+        
+        cache = getattr(self.ml, "image_cache", None)
+        if cache is not None and cache.max_distance:
+            query.phash = dhash(query.pixels)
+            query.embedding = cache.get_similar(query.cache_key[0], query.phash)
+            if query.embedding is not None:
+                cache.put(query.cache_key, query.embedding, query.phash)
+        _add_timing(timings, "decode_ms", start)
+    
+    def encode_image(self, image: Union[Image.Image, bytes, "QueryImage"],
+                     timings: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """
+        Encode image using CLIP (512d for ViT-B/32, same as the image index).
+        
+        Uploads (bytes or a prepared `QueryImage`) go through the image
+        embedding cache first, so a re-submitted image skips decoding and
+        inference. Concurrent requests share one batched CLIP forward pass.
         """
         self._check_ml_loaded()
+        if isinstance(image, (bytes, bytearray)):
+            image = self.prepare_image(bytes(image), timings)
+        if not isinstance(image, QueryImage):
+            return self._encode_pixels(image)
         
-        # CLIP preprocessing and encoding
-        inputs = self.ml.clip_processor(images=image, return_tensors="pt")
-        inputs = {k: v.to(self.ml.device) for k, v in inputs.items()}
+        self.decode_image(image, timings)
+        if image.embedding is None:
+            start = time.perf_counter()
+            image.embedding = self._encode_pixels(image.pixels)
+            self._store_image(image)
+            _add_timing(timings, "image_encode_ms", start)
+        return image.embedding
+    
+    def _encode_pixels(self, image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+        if self.ml.image_batcher is not None:
+            return self.ml.image_batcher(image)
+        return self.ml.encode_image_batch([image])[0]
+    
+    def _store_image(self, query: "QueryImage"):
+        cache = getattr(self.ml, "image_cache", None)
+        if cache is not None:
+            query.embedding.setflags(write=False)  # shared between requests
+            cache.put(query.cache_key, query.embedding, query.phash)
+    
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode many text queries: cache hits are reused, all misses share one
+        MPNet forward pass (no micro-batcher round trip).
         
-        with torch.no_grad():
-            emb = self.ml.clip_model.get_image_features(**inputs).cpu().numpy()[0]
+        Returns:
+            (n, 768) matrix, one row per query
+        """
+        self._check_ml_loaded()
+        cache = self.ml.query_cache
+        keys = [EmbeddingCache.key(settings.text_model_name, text) for text in texts]
+        found = {key: cache.get(key) for key in set(keys)} if cache is not None else {}
         
-        # Normalize
-        emb = emb / np.linalg.norm(emb)
+        missing = [key for key in dict.fromkeys(keys) if found.get(key) is None]
+        if missing:
+            embs = self.ml.encode_text_batch([key[1] for key in missing])
+            for key, emb in zip(missing, embs):
+                if cache is not None:
+                    emb.setflags(write=False)  # shared between requests
+                    cache.put(key, emb)
+                found[key] = emb
+        
+        return np.vstack([found[key] for key in keys])
+    
+    def encode_images(self, images: List[Union[Image.Image, bytes, "QueryImage"]]) -> np.ndarray:
+        """
+        Encode many images: cached uploads are reused, all others share one
+        CLIP forward pass.
         
-        # ✅ CRITICAL: Pad 512d → 768d to match index dimension
-        if emb.shape[0] == 512:
-            padding = np.zeros(256, dtype=np.float32)
-            emb = np.concatenate([emb, padding])
-            logger.debug("Padded CLIP embedding from 512d to 768d")
+        Returns:
+            (n, 512) matrix, one row per image
+        """
+        self._check_ml_loaded()
+        queries = [self.prepare_image(bytes(image)) if isinstance(image, (bytes, bytearray)) else image
+                   for image in images]
+        for query in queries:
+            if isinstance(query, QueryImage):
+                self.decode_image(query)
         
-        return emb.astype('float32')
+        pending = [i for i, query in enumerate(queries)
+                   if not isinstance(query, QueryImage) or query.embedding is None]
+        embs = [query.embedding if isinstance(query, QueryImage) else None for query in queries]
+        if pending:
+            inputs = [queries[i].pixels if isinstance(queries[i], QueryImage) else queries[i] for i in pending]
+            for i, emb in zip(pending, self.ml.encode_image_batch(inputs)):
+                embs[i] = emb
+                if isinstance(queries[i], QueryImage):
+                    queries[i].embedding = emb
+                    self._store_image(queries[i])
+        return np.vstack(embs)
+    
+    def _cross_modal_for(self, texts, images, deadline) -> bool:
+        """Whether text-only queries get the CLIP text leg on the image index (and the budget allows it)."""
+        if not texts or images or getattr(self.ml, "clip_text_batcher", None) is None:
+            return False
+        if self.ml.image_index is None or settings.cross_modal_weight <= 0:
+            return False
+        return deadline is None or deadline.allows("cross_modal", settings.deadline_cross_modal_reserve_ms)
     
-    def search(self, text=None, image=None, k=10, alpha=0.7) -> List[SearchResult]:
+    def _submit_clip_texts(self, texts: List[str]):
+        """
+        Start encoding text queries with the CLIP text tower. Cache misses are
+        queued on the CLIP text batcher, whose thread runs the forward pass
+        while the caller encodes MPNet; `_collect_clip_texts` waits for them.
+        """
+        cache = self.ml.query_cache
+        keys = [EmbeddingCache.key(settings.clip_model_name, text) for text in texts]
+        found = {key: cache.get(key) for key in set(keys)} if cache is not None else {}
+        pending = {
+            key: self.ml.clip_text_batcher.submit(key[1])
+            for key in dict.fromkeys(keys) if found.get(key) is None
+        }
+        return keys, found, pending
+    
+    def _collect_clip_texts(self, submitted, timings=None) -> np.ndarray:
+        """(n, 512) CLIP text embeddings of submitted queries (cached for later requests)."""
+        keys, found, pending = submitted
+        start = time.perf_counter()
+        cache = self.ml.query_cache
+        for key, future in pending.items():
+            emb = future.result()
+            if cache is not None:
+                emb.setflags(write=False)  # shared between requests
+                cache.put(key, emb)
+            found[key] = emb
+        _add_timing(timings, "cross_modal_wait_ms", start)
+        return np.vstack([found[key] for key in keys])
+    
+    def search(self, text=None, image=None, k=10, alpha=0.7, filters=None,
+               ef_search=None, nprobe=None, timings=None, deadline=None, sources=None) -> List[SearchResult]:
         """
         Search for products using text and/or image queries.
         
+        Text-only queries are expanded into rewrites (synonyms, colour
+        variations) that are encoded and searched together with the original
+        and merged through RRF; they also search the lexical (BM25) index,
+        whose hits are fused the same way, so exact names and brand tokens
+        surface even when the embedding misses them. Their CLIP text features
+        (encoded on the CLIP text batcher's thread while MPNet runs) search the
+        image index as a cross-modal leg, fused with the text leg, so visually
+        described queries ("floral print", "striped") also rank by appearance.
+        
         Args:
             text: Text query
-            image: PIL Image
+            image: PIL Image, uploaded image bytes or a prepared `QueryImage`
+                (uploads hit the embedding and response caches)
             k: Number of results
             alpha: Weight for text vs image (0-1, only for multimodal)
+            filters: Optional attribute filters, e.g. {"gender": "Women", "color": ["Red", "Pink"]};
+                applied inside the index search, so k matches are returned whenever they exist
+            ef_search: HNSW search beam width for this request (index default if None)
+            nprobe: IVF cells to probe for this request (index default if None)
+            timings: Optional dict receiving per-stage milliseconds
+            deadline: Optional `Deadline`; when it runs short the image leg of a
+                multimodal query, the cross-modal leg, the rewrites and the lexical leg
+                are skipped and the ANN effort is lowered
+            sources: Optional dict receiving where the answer came from
+                ("response_cache": "hit" or "miss")
             
         Returns:
-            List of SearchResult objects
+            List of SearchResult objects (shared with the response cache;
+            use `SearchResult.to_dict` before modifying them)
         """
         # Validate inputs
         if self.ml is None:
@@ -96,87 +335,483 @@ class FashionSearchEngine:
         if not text and not image:
             raise ValueError("Either text or image query must be provided")
         
+        if isinstance(image, (bytes, bytearray)):
+            image = self.prepare_image(bytes(image), timings, decode=False)
+        if not self.image_leg_allowed(image, text, deadline):
+            image = None  # text-only fallback
+        image_key = image.cache_key if isinstance(image, QueryImage) else None
+        
+        # Text and uploaded-image responses are user-independent: serve them from the cache
+        cache_key = None
+        if self.response_cache is not None and (not image or image_key is not None):
+            self.response_cache.check_version(self.cache_version())
+            mode = "multimodal" if text and image else ("image" if image else "text")
+            cache_key = ResponseCache.key(
+                mode, text or "", k, alpha, filters,
+                image=image_key[1] if image_key else None, ef_search=ef_search, nprobe=nprobe
+            )
+            cached = self.response_cache.get(cache_key)
+            if sources is not None:
+                sources["response_cache"] = "miss" if cached is None else "hit"
+            if cached is not None:
+                return list(cached)
+        
+        mask = self.ml.catalog.filter_mask(filters)
+        clip_texts = self._submit_clip_texts([text]) if self._cross_modal_for(text, image, deadline) else None
+        start = time.perf_counter()
+        text_embs = self.encode_text(text).reshape(1, -1) if text else None
+        _add_timing(timings, "text_encode_ms", start)
+        image_embs = self.encode_image(image, timings).reshape(1, -1) if image else None
+        clip_embs = self._collect_clip_texts(clip_texts, timings) if clip_texts is not None else None
+        
+        ef_search, nprobe = self._ann_effort(ef_search, nprobe, deadline)
+        reranker = self._reranker_for(text, deadline)
+        depth = max(k, settings.reranker_candidates) if reranker is not None else k
+        rewrites = self._encode_rewrites([text] if text and not image else None, deadline, timings)
+        start = time.perf_counter()
+        if rewrites is not None:
+            ranked, fusion, multi_query = self._rank_rewrites(
+                text_embs, *rewrites, depth, mask, ef_search, nprobe, clip_embs
+            )
+        else:
+            ranked, fusion, multi_query = self._rank(
+                text_embs, image_embs, depth, alpha, mask, ef_search, nprobe, clip_embs, reranker is not None
+            ), [None], None
+        _add_timing(timings, "search_ms", start)
+        lexical = self._lexical_for(text, image, deadline)
+        if lexical is not None:
+            ranked, fusion = self._fuse_lexical(lexical, [text], text_embs, ranked, depth, mask, timings)
+        rerank_scores = [None]
+        if reranker is not None:
+            ranked, rerank_scores, fusion = self._rerank(reranker, [text], ranked, k, timings, multi_query, fusion)
+        (scores, indices), = ranked
+        start = time.perf_counter()
+        results = self._format_results(indices, scores, rerank_scores[0], fusion[0])
+        _add_timing(timings, "format_ms", start)
+        
+        # Reduced-effort results are not cached as if they were the full answer
+        if cache_key is not None and not (deadline is not None and (deadline.degraded or deadline.skipped)):
+            self.response_cache.put(cache_key, tuple(results))
+        return results
+    
+    def image_leg_allowed(self, image, text, deadline) -> bool:
+        """
+        Whether a query can afford its image leg: always for image-only queries
+        and cached embeddings, otherwise only with `deadline_image_reserve_ms`
+        of the budget left (the caller then searches text-only).
+        """
+        if deadline is None or not text or image is None:
+            return True
+        if isinstance(image, QueryImage) and image.embedding is not None:
+            return True
+        return deadline.allows("image_leg", settings.deadline_image_reserve_ms)
+    
+    def _lexical_for(self, text, image, deadline):
+        """The lexical index, if loaded and the query is text-only (and the budget allows it)."""
+        lexical = getattr(self.ml, "lexical_index", None)
+        if lexical is None or not text or image or settings.lexical_weight <= 0:
+            return None
+        if deadline is not None and not deadline.allows("lexical", settings.deadline_lexical_reserve_ms):
+            return None
+        return lexical
+    
+    def _fuse_lexical(self, lexical, texts, text_embs, ranked, depth, mask, timings):
+        """
+        Fuse the dense ranking with BM25 / TF-IDF hits through RRF.
+        
+        Returns:
+            (ranked, fusion): (scores, rows) per query in fused order, the scores
+            being the rows' exact text similarities (mapped to [0, 1]), and the
+            RRF scores of those rows scaled so that rank 1 on both legs is 1
+        """
+        start = time.perf_counter()
+        _, lexical_rows = lexical.search(texts, settings.lexical_candidates, mask)
+        dense_rows = np.full((len(ranked), depth), -1, dtype=np.int64)
+        for i, (_, rows) in enumerate(ranked):
+            dense_rows[i, :len(rows)] = rows[:depth]
+        weights = (1.0, settings.lexical_weight)
+        rrf_scores, fused_rows = rrf_aggregate(
+            [dense_rows, lexical_rows], depth, c=settings.lexical_rrf_k, weights=weights
+        )
+        scaled = rrf_scores * (settings.lexical_rrf_k + 1) / sum(weights)
+        fused = self._fused_ranked(text_embs, scaled, fused_rows)
+        _add_timing(timings, "lexical_ms", start)
+        return fused
+    
+    def _fused_ranked(self, text_embs, scores, rows):
+        """
+        Split an RRF result into (ranked, fusion): (scores, rows) per query in
+        RRF order with the rows' exact text similarities (mapped to [0, 1]) as
+        scores, and the RRF scores of those rows.
+        """
+        ranked, fusion = [], []
+        for text_emb, query_scores, query_rows in zip(text_embs, scores, rows):
+            valid = query_rows >= 0
+            query_rows = query_rows[valid]
+            ranked.append((cosine_to_unit(exact_leg_scores(self.ml.text_index, text_emb, query_rows)), query_rows))
+            fusion.append(query_scores[valid])
+        return ranked, fusion
+    
+    def _encode_rewrites(self, texts, deadline, timings):
+        """
+        Rewrites of text-only queries and their embeddings (one batched
+        encoder pass over all uncached variants), or None when rewriting is
+        off, nothing was rewritten or the budget cannot afford it.
+        """
+        expander = getattr(self.ml, "query_expander", None)
+        if expander is None or not texts:
+            return None
+        if deadline is not None and not deadline.allows("rewrite", settings.deadline_rewrite_reserve_ms):
+            return None
+        start = time.perf_counter()
+        variants = [expander.expand(text)[1:] for text in texts]
+        flat = [variant for query_variants in variants for variant in query_variants]
+        if not flat:
+            return None
+        embs = self.encode_texts(flat)
+        _add_timing(timings, "rewrite_encode_ms", start)
+        return variants, embs
+    
+    def _rank_rewrites(self, text_embs, variants, variant_embs, depth, mask, ef_search, nprobe, clip_embs=None):
+        """
+        Multi-query retrieval: originals and rewrites go through one multi-row
+        index search, then each query's rankings are merged with RRF
+        (rewrites weighted by `query_rewrite_weight` with the "weighted" strategy).
+        With `clip_embs` the originals are ranked with their cross-modal leg
+        and only the rewrites share the multi-row search.
+        
+        Returns:
+            (ranked, fusion, multi_query): (scores, rows) and scaled RRF scores per
+            query as in `_fused_ranked`, and (rows, scaled RRF scores) per query
+            for the reranker
+        """
+        n = len(text_embs)
+        if clip_embs is None:
+            ranked = self._rank(np.vstack([text_embs, variant_embs]), None, depth, 1.0, mask, ef_search, nprobe)
+        else:
+            ranked = (self._rank(text_embs, None, depth, 1.0, mask, ef_search, nprobe, clip_embs)
+                      + self._rank(variant_embs, None, depth, 1.0, mask, ef_search, nprobe))
+        all_rows = np.full((len(ranked), depth), -1, dtype=np.int64)
+        for i, (_, rows) in enumerate(ranked):
+            all_rows[i, :len(rows)] = rows[:depth]
+        
+        # Slot j holds every query's j-th rewrite (-1 rows where a query has fewer)
+        counts = np.array([len(v) for v in variants])
+        offsets = n + np.concatenate([[0], np.cumsum(counts)[:-1]])
+        lists = [all_rows[:n]]
+        for j in range(counts.max()):
+            slot = np.full((n, depth), -1, dtype=np.int64)
+            has = counts > j
+            slot[has] = all_rows[offsets[has] + j]
+            lists.append(slot)
+        
+        weight = settings.query_rewrite_weight if settings.query_rewrite_merge == "weighted" else 1.0
+        c = settings.query_rewrite_rrf_k
+        rrf_scores, fused_rows = rrf_aggregate(lists, depth, c=c, weights=[1.0] + [weight] * counts.max())
+        scaled = rrf_scores * (c + 1) / (1.0 + weight * counts)[:, None]
+        multi_query = [(rows[rows >= 0], scores[rows >= 0]) for scores, rows in zip(scaled, fused_rows)]
+        return (*self._fused_ranked(text_embs, scaled, fused_rows), multi_query)
+    
+    def _reranker_for(self, text, deadline):
+        """The learned reranker, if loaded, the query has text and the budget allows it."""
+        reranker = getattr(self.ml, "reranker", None)
+        if reranker is None or not text:
+            return None
+        if deadline is not None and not deadline.allows("rerank", settings.deadline_rerank_reserve_ms):
+            return None
+        return reranker
+    
+    def _rerank(self, reranker, texts, ranked, k, timings, multi_query=None, fusion=None):
+        """
+        Second-stage rerank of (unit scores, rows) per query.
+        
+        `multi_query` ((rows, scores) per query from `_rank_rewrites`) feeds the
+        rankers' multi_query_score feature.
+        
+        Returns:
+            (ranked, probabilities, fusion): (unit scores, rows) per query in
+            reranked order, the scores still being the retrieval similarities,
+            the reranker probabilities of those rows and their `fusion` scores
+            (None per query without fusion)
+        """
+        # The rankers were trained on raw cosine similarities
+        candidates = [(scores * 2 - 1, indices) for scores, indices in ranked]
+        multi_query_scores = None
+        if multi_query is not None:
+            multi_query_scores = [
+                _lookup_scores(indices, rows, scores) for (_, indices), (rows, scores) in zip(ranked, multi_query)
+            ]
+        reranked = reranker.rerank(texts, self.ml.catalog, candidates, k,
+                                   multi_query_scores=multi_query_scores, timings=timings)
+        fusion = [
+            None if fused is None else _lookup_scores(rows, indices, fused)
+            for (_, indices), (_, rows), fused in zip(ranked, reranked, fusion or [None] * len(ranked))
+        ]
+        ranked = [
+            (_lookup_scores(rows, indices, scores), rows)
+            for (scores, indices), (_, rows) in zip(ranked, reranked)
+        ]
+        return ranked, [probabilities for probabilities, _ in reranked], fusion
+    
+    @staticmethod
+    def _ann_effort(ef_search, nprobe, deadline):
+        """Cap ef_search / nprobe when less than `deadline_ann_reserve_ms` is left."""
+        if deadline is None or deadline.remaining_ms() >= settings.deadline_ann_reserve_ms:
+            return ef_search, nprobe
+        ef_search = min(ef_search or settings.index_hnsw_ef_search, settings.deadline_ef_search)
+        nprobe = min(nprobe or settings.index_ivf_nprobe, settings.deadline_nprobe)
+        deadline.degrade("ann", {"ef_search": ef_search, "nprobe": nprobe})
+        return ef_search, nprobe
+    
+    def cache_version(self):
+        """Catalog + index build identity; cached responses are dropped when it changes."""
+        manifest = getattr(self.ml, "index_manifest", None) or {}
+        return (
+            self.ml.catalog.fingerprint,
+            manifest.get("created_at"),
+            id(self.ml.text_index),
+            id(self.ml.image_index),
+        )
+    
+    def get_stats(self):
+        """Runtime metrics for the health endpoint."""
+        return {
+            "response_cache": self.response_cache.get_stats() if self.response_cache else None,
+        }
+    
+    def search_batch(self, texts=None, images=None, k=10, alpha=0.7, filters=None,
+                     ef_search=None, nprobe=None, timings=None) -> List[List[SearchResult]]:
+        """
+        Search many queries at once: one encoder pass per modality and one
+        multi-row index search per leg.
+        
+        Args:
+            texts: Text queries
+            images: PIL Images, uploaded bytes or prepared `QueryImage`s; when given together
+                with texts, texts[i] and images[i] form one multimodal query
+            k, alpha, filters, ef_search, nprobe, timings: As in `search`, shared by all queries
+            
+        Returns:
+            One list of SearchResult objects per query
+        """
+        if self.ml is None:
+            raise RuntimeError("ML models not loaded")
+        
+        if not texts and not images:
+            raise ValueError("Either text or image queries must be provided")
+        if texts and images and len(texts) != len(images):
+            raise ValueError(f"Got {len(texts)} text and {len(images)} image queries, expected one of each per query")
+        
+        mask = self.ml.catalog.filter_mask(filters)
+        clip_texts = self._submit_clip_texts(list(texts)) if self._cross_modal_for(texts, images, None) else None
+        start = time.perf_counter()
+        text_embs = self.encode_texts(list(texts)) if texts else None
+        _add_timing(timings, "text_encode_ms", start)
+        start = time.perf_counter()
+        image_embs = self.encode_images(list(images)) if images else None
+        _add_timing(timings, "image_encode_ms", start)
+        clip_embs = self._collect_clip_texts(clip_texts, timings) if clip_texts is not None else None
+        
+        reranker = self._reranker_for(texts, None)
+        depth = max(k, settings.reranker_candidates) if reranker is not None else k
+        rewrites = self._encode_rewrites(list(texts) if texts and not images else None, None, timings)
+        start = time.perf_counter()
+        if rewrites is not None:
+            ranked, fusion, multi_query = self._rank_rewrites(
+                text_embs, *rewrites, depth, mask, ef_search, nprobe, clip_embs
+            )
+        else:
+            ranked = self._rank(
+                text_embs, image_embs, depth, alpha, mask, ef_search, nprobe, clip_embs, reranker is not None
+            )
+            fusion, multi_query = [None] * len(ranked), None
+        _add_timing(timings, "search_ms", start)
+        lexical = self._lexical_for(texts, images, None)
+        if lexical is not None:
+            ranked, fusion = self._fuse_lexical(lexical, list(texts), text_embs, ranked, depth, mask, timings)
+        rerank_scores = [None] * len(ranked)
+        if reranker is not None:
+            ranked, rerank_scores, fusion = self._rerank(
+                reranker, list(texts), ranked, k, timings, multi_query, fusion
+            )
+        start = time.perf_counter()
+        results = [
+            self._format_results(indices, scores, probabilities, fusion_scores)
+            for (scores, indices), probabilities, fusion_scores in zip(ranked, rerank_scores, fusion)
+        ]
+        _add_timing(timings, "format_ms", start)
+        return results
+    
+    def similar(self, product_id, k=10, kind=None, filters=None, timings=None, sources=None) -> List[SearchResult]:
+        """
+        Products similar to a catalog product (the product itself excluded).
+        
+        Answered from the precomputed neighbor table when it holds enough
+        neighbors, otherwise by searching the indexes with the product's
+        stored vectors.
+        
+        Args:
+            product_id: Catalog product id
+            k: Number of results
+            kind: "text", "image" or "fused" similarity (settings.neighbors_default_kind if None)
+            filters: Optional attribute filters, as in `search`
+            timings: Optional dict receiving per-stage milliseconds
+            sources: Optional dict receiving the answer's source ("neighbors": "table" or "search")
+            
+        Returns:
+            List of SearchResult objects
+        """
+        results = self.similar_from_table(product_id, k, kind, filters, timings, sources)
+        if results is not None:
+            return results
+        
+        kind, row = self._similar_target(product_id, kind)
+        mask = self.ml.catalog.filter_mask(filters)
+        start = time.perf_counter()
+        query = {}
+        for leg in ("text", "image"):
+            index = getattr(self.ml, f"{leg}_index")
+            if kind in (leg, "fused") and index is not None:
+                vector = index.reconstruct_batch(np.array([row], dtype=np.int64))
+                if np.any(vector):  # all-zero vectors (e.g. no image) have no neighbors
+                    query[leg] = vector
+        if not query:
+            return []
+        ranked = self._rank(
+            query.get("text"), query.get("image"), k + 1, settings.neighbors_alpha, mask, None, None
+        )
+        (scores, indices), = ranked
+        keep = indices != row
+        _add_timing(timings, "search_ms", start)
+        if sources is not None:
+            sources["neighbors"] = "search"
+        return self._format_results(indices[keep][:k], scores[keep][:k])
+    
+    def similar_from_table(self, product_id, k=10, kind=None, filters=None, timings=None, sources=None):
+        """
+        `similar` by neighbor table lookup only (no encoder or index work, safe on the
+        event loop); None when the table is missing or cannot provide k matching neighbors.
+        """
+        table = getattr(self.ml, "neighbors", None) if self.ml is not None else None
+        kind, row = self._similar_target(product_id, kind)
+        if table is None or kind not in table.kinds or k > table.k:
+            return None
+        
+        start = time.perf_counter()
+        scores, indices = table.lookup(row, kind)
+        mask = self.ml.catalog.filter_mask(filters)
+        if mask is not None:
+            keep = mask[indices]
+            scores, indices = scores[keep], indices[keep]
+        if len(indices) < k:
+            return None  # too few stored neighbors (none for all-zero vectors) or filtered out
+        results = self._format_results(indices[:k], scores[:k])
+        _add_timing(timings, "neighbors_ms", start)
+        if sources is not None:
+            sources["neighbors"] = "table"
+        return results
+    
+    def _similar_target(self, product_id, kind):
+        """Validated (kind, catalog row) of a similar-products request."""
+        if self.ml is None:
+            raise RuntimeError("ML models not loaded")
+        kind = kind or settings.neighbors_default_kind
+        if kind not in NEIGHBOR_KINDS:
+            raise ValueError(f"Unknown similarity '{kind}', expected one of {tuple(NEIGHBOR_KINDS)}")
+        row = self.ml.catalog.row_for_id(product_id)
+        if row is None:
+            raise KeyError(f"Product {product_id} not found")
+        return kind, row
+    
+    def _rank(self, text_embs, image_embs, k, alpha, mask, ef_search, nprobe, clip_embs=None, for_rerank=False):
+        """
+        Rank catalog rows for a batch of query embeddings.
+        
+        Text-only queries with `clip_embs` (their CLIP text features) are fused
+        with an image index leg, weighted by `cross_modal_weight`; for the
+        reranker their scores are then the exact text similarities it was trained on.
+        
+        Returns:
+            List of (scores, row indices) per query, scores mapped to [0, 1]
+        """
+        ann_params = {"ef_search": ef_search, "nprobe": nprobe}
+        
+        # Cross-modal text search (MPNet on the text index, CLIP text on the image index)
+        if text_embs is not None and image_embs is None and clip_embs is not None:
+            ranked = self._rank(text_embs, clip_embs, k, 1.0 - settings.cross_modal_weight, mask, ef_search, nprobe)
+            if not for_rerank:
+                return ranked
+            return [
+                (cosine_to_unit(exact_leg_scores(self.ml.text_index, text_emb, rows)), rows)
+                for text_emb, (_, rows) in zip(text_embs, ranked)
+            ]
+        
         # Multimodal search (text + image)
-        if text and image:
+        if text_embs is not None and image_embs is not None:
             if not self.ml.text_index or not self.ml.image_index:
                 raise RuntimeError("Both text and image indexes required for multimodal search")
             
-            # Text search
-            text_emb = self.encode_text(text)
+            # Candidates from each leg, then exact scores for their union
             t_k = min(k * 3, max(1, self.ml.text_index.ntotal))
-            text_scores, text_indices = self.ml.text_index.search(
-                text_emb.reshape(1, -1), t_k
-            )
-            text_scores = np.clip((text_scores[0] + 1.0) / 2.0, 0, 1)
-            text_indices = text_indices[0]
+            _, text_indices = search_index(self.ml.text_index, text_embs, t_k, mask, **ann_params)
             
-            # Image search
-            image_emb = self.encode_image(image)
             i_k = min(k * 3, max(1, self.ml.image_index.ntotal))
-            img_scores, img_indices = self.ml.image_index.search(
-                image_emb.reshape(1, -1), i_k
-            )
-            img_scores = np.clip((img_scores[0] + 1.0) / 2.0, 0, 1)
-            img_indices = img_indices[0]
-            
-            # Fusion
-            combined = {}
-            for idx, score in zip(text_indices, text_scores):
-                combined[int(idx)] = score * alpha
-            for idx, score in zip(img_indices, img_scores):
-                combined[int(idx)] = combined.get(int(idx), 0.0) + score * (1 - alpha)
+            _, img_indices = search_index(self.ml.image_index, image_embs, i_k, mask, **ann_params)
             
-            sorted_items = sorted(combined.items(), key=lambda x: x[1], reverse=True)[:k]
-            indices = [idx for idx, _ in sorted_items]
-            scores = [score for _, score in sorted_items]
+            # Fusion: alpha * text + (1 - alpha) * image over the union
+            ranked = []
+            for text_emb, image_emb, text_rows, img_rows in zip(text_embs, image_embs, text_indices, img_indices):
+                scores, indices, _, _ = fuse_legs(
+                    [(self.ml.text_index, text_emb, text_rows),
+                     (self.ml.image_index, image_emb, img_rows)],
+                    weights=(alpha, 1 - alpha), k=k, transform=cosine_to_unit
+                )
+                ranked.append((scores, indices))
+            return ranked
         
         # Text-only search
-        elif text:
+        if text_embs is not None:
             if not self.ml.text_index:
                 raise RuntimeError("Text index not loaded")
-            
-            emb = self.encode_text(text)
-            scores_arr, indices_arr = self.ml.text_index.search(emb.reshape(1, -1), k)
-            scores = np.clip((scores_arr[0] + 1.0) / 2.0, 0, 1)
-            indices = indices_arr[0]
+            index, embs = self.ml.text_index, text_embs
         
         # Image-only search
-        elif image:
+        else:
             if not self.ml.image_index:
                 raise RuntimeError("Image index not loaded")
-            
-            emb = self.encode_image(image)
-            scores_arr, indices_arr = self.ml.image_index.search(emb.reshape(1, -1), k)
-            scores = np.clip((scores_arr[0] + 1.0) / 2.0, 0, 1)
-            indices = indices_arr[0]
-        
-        # Format results
-        # Format results
-        results = []
-        for rank, (idx, score) in enumerate(zip(indices, scores), 1):
-            if idx < 0 or idx >= len(self.ml.products_df):
-                continue
-            
-            p = self.ml.products_df.iloc[idx]
-            
-            # Build image URL
-            image_url = None
-            local_img = Path("data/images") / f"{int(p['id'])}.jpg"
-            if local_img.exists():
-                image_url = f"http://localhost:8000/images/{int(p['id'])}.jpg"
-            elif 'image_path' in p and str(p['image_path']).startswith('http'):
-                image_url = p['image_path']
-            
-            results.append(SearchResult(
-                rank=rank,
-                product_id=int(p['id']),
-                product_name=p['productDisplayName'],
-                category=p.get('masterCategory', 'Unknown'),
-                gender=p.get('gender', 'Unknown'),
-                color=p.get('baseColour', 'Unknown'),
-                score=float(score),
-                image_url=image_url
-            ))
-
-        return results
-            
+            index, embs = self.ml.image_index, image_embs
+        
+        scores_arr, indices_arr = search_index(index, embs, k, mask, **ann_params)
+        return list(zip(cosine_to_unit(scores_arr), indices_arr))
+    
+    def _format_results(self, indices, scores, rerank_scores=None, fusion_scores=None) -> List[SearchResult]:
+        """
+        Turn ranked catalog rows into SearchResult objects.
+        
+        Display fields and image URLs are gathered from precomputed catalog
+        arrays in one step (no per-row DataFrame access or filesystem stat).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        catalog = self.ml.catalog
+        valid = (indices >= 0) & (indices < len(catalog))
+        rerank, fusion = (
+            [None] * int(valid.sum()) if values is None else np.asarray(values, dtype=np.float64)[valid].tolist()
+            for values in (rerank_scores, fusion_scores)
+        )
+        
+        columns = catalog.display_columns(indices[valid])
+        return [
+            SearchResult(*fields)
+            for fields in zip(
+                (np.flatnonzero(valid) + 1).tolist(),
+                columns["product_id"].tolist(),
+                columns["product_name"].tolist(),
+                columns["category"].tolist(),
+                columns["gender"].tolist(),
+                columns["color"].tolist(),
+                np.asarray(scores, dtype=np.float64)[valid].tolist(),
+                columns["image_url"].tolist(),
+                rerank,
+                fusion,
+            )
+        ]
@@ -10,16 +10,19 @@ from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import logging
 import os
+import threading
 from dotenv import load_dotenv
 
 # Import database
 from app.database import Database
 
 # Import API routers
-from app.api.endpoints import auth, chat_updated as chat, search_updated as search, users_updated as users
+from app.api.endpoints import auth, chat_updated as chat, products, search_updated as search, users_updated as users
 
 # Import ML loader (existing)
 from app.core.ml_loader import MLLoader
+from app.services.async_search import AsyncFashionSearchEngine
+from app.services.search_engine import FashionSearchEngine
 
 # Load environment variables
 load_dotenv()
@@ -53,12 +56,18 @@ async def lifespan(app: FastAPI):
         ml_loader = MLLoader()
         # MLLoader automatically loads on initialization
         app.state.ml_loader = ml_loader
+        app.state.search_engine = AsyncFashionSearchEngine(FashionSearchEngine(ml_loader))
         app.mount("/images", StaticFiles(directory="data/images"), name="images")
         logger.info("✅ ML models loaded successfully")
     except Exception as e:
         logger.error(f"❌ ML model loading failed: {e}")
         logger.warning("⚠️ Search functionality will be limited without embeddings")
         app.state.ml_loader = None
+        app.state.search_engine = None
+    
+    # 3. Load the personalization engine in the background (the first start
+    #    also encodes the recommender matrix, see scripts/build_recommender_embeddings.py)
+    threading.Thread(target=chat.init_personalization_engine, name="personalization-init", daemon=True).start()
     
     logger.info("✅ Application startup complete!")
     
@@ -67,6 +76,12 @@ async def lifespan(app: FastAPI):
     # ==================== SHUTDOWN ====================
     logger.info("🛑 Shutting down AI Fashion Assistant Backend...")
     
+    # Stop search executor and encoder batching threads
+    if getattr(app.state, "search_engine", None):
+        app.state.search_engine.shutdown()
+    if getattr(app.state, "ml_loader", None):
+        app.state.ml_loader.close()
+    
     # Close MongoDB connection
     await Database.close_db()
     
@@ -105,6 +120,9 @@ app.include_router(auth.router, prefix="/api", tags=["Authentication"])
 # Search routes
 app.include_router(search.router, prefix="/api/search", tags=["Search"])
 
+# Product routes
+app.include_router(products.router, prefix="/api/products", tags=["Products"])
+
 # Chat routes
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 
@@ -135,6 +153,7 @@ async def root():
         "endpoints": {
             "auth": "/api/auth",
             "search": "/api/search",
+            "products": "/api/products",
             "chat": "/api/chat",
             "users": "/api/users",
             "docs": "/docs"
@@ -156,6 +175,8 @@ async def health_check():
             "status": "healthy",
             "database": db_status,
             "ml_models": ml_status,
+            "ml_stats": app.state.ml_loader.get_stats() if app.state.ml_loader else None,
+            "search_stats": app.state.search_engine.engine.get_stats() if app.state.search_engine else None,
             "version": "2.5.0"
         }
     except Exception as e:
@@ -191,6 +212,11 @@ async def api_info():
                     "POST /api/search/rag"
                 ]
             },
+            "products": {
+                "endpoints": [
+                    "GET /api/products/{product_id}/similar"
+                ]
+            },
             "chat": {
                 "features": ["RAG", "Memory", "Tools", "Personalization"],
                 "endpoints": [
@@ -0,0 +1,141 @@
+"""
+Benchmark scalar-quantized index storage against the exact float32 index.
+
+For each leg (MPNet text, CLIP image) the evaluation queries are encoded once,
+the exact float32 scan gives the reference top-k, and every storage variant
+(fp16 / int8, with and without the float32 re-rank) reports its size,
+single-query QPS and recall@k against that reference. The image leg is
+queried cross-modally with CLIP text embeddings of the same queries.
+
+Sizes are reported two ways: ``index_mb`` / ``index_saved`` cover the FAISS
+index alone, while ``resident_mb`` adds the float32 matrix the index store
+keeps memory-mapped next to every quantized index (exact re-rank,
+reconstruction, neighbor builds). Quantization therefore shrinks the index
+file, not what a serving process maps.
+
+Run from the backend directory:
+    python -m scripts.benchmark_quantization
+    python -m scripts.benchmark_quantization --legs text --storages int8 --rerank-k 50
+    python -m scripts.benchmark_quantization --output data/benchmarks/quantization.json
+"""
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.core.index_factory import INDEX_TYPES, STORAGE_TYPES, IndexSpec, build_faiss_index
+from app.core.index_store import INDEX_SOURCES, MmapAnnIndex, MmapFlatIndex
+from app.core.vector_ops import normalize_rows
+from app.services.evaluation import encode_queries
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERIES = "../../v2.1-core-ml-plus/evaluation/results/evaluation_queries_100plus.csv"
+
+
+def measure(index, queries: np.ndarray, k: int, repeats: int) -> Dict:
+    """Single-query latency/QPS (the serving pattern) and the returned ids."""
+    ids = np.vstack([index.search(q[None], k)[1] for q in queries])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for q in queries:
+            index.search(q[None], k)
+    elapsed = time.perf_counter() - start
+    n = repeats * len(queries)
+    return {"qps": n / elapsed, "latency_ms": 1000 * elapsed / n, "ids": ids}
+
+
+def recall_at_k(ids: np.ndarray, reference: np.ndarray) -> float:
+    """Mean share of the reference top-k found in each result row."""
+    hits = [len(set(row[row >= 0]) & set(ref[ref >= 0])) / max(1, (ref >= 0).sum())
+            for row, ref in zip(ids, reference)]
+    return float(np.mean(hits))
+
+
+def benchmark_leg(leg: str, vectors: np.ndarray, queries: np.ndarray, args) -> List[Dict]:
+    n_rows, dim = vectors.shape
+    exact = measure(MmapFlatIndex(vectors), queries, args.k, args.repeats)
+    reference = exact["ids"]
+    rows = [{
+        "leg": leg, "variant": "flat-float32", "index_mb": vectors.nbytes / 2**20,
+        "index_saved": 0.0, "resident_mb": vectors.nbytes / 2**20, "qps": exact["qps"], "speedup": 1.0, "latency_ms": exact["latency_ms"],
+        f"recall@{args.k}": 1.0,
+    }]
+
+    for storage in args.storages:
+        spec = IndexSpec(index_type=args.index_type, storage=storage, nlist=args.nlist)
+        start = time.perf_counter()
+        index = build_faiss_index(vectors, spec)
+        build_s = time.perf_counter() - start
+        index_bytes = faiss.serialize_index(index).nbytes
+
+        for rerank_k in sorted({0, args.rerank_k}):
+            result = measure(MmapAnnIndex(index, vectors, rerank_k=rerank_k), queries, args.k, args.repeats)
+            rows.append({
+                "leg": leg,
+                "variant": spec.label + (f"+rerank{rerank_k}" if rerank_k else ""),
+                "index_mb": index_bytes / 2**20,
+                "index_saved": 1.0 - index_bytes / vectors.nbytes,
+                "resident_mb": (index_bytes + vectors.nbytes) / 2**20,
+                "qps": result["qps"],
+                "speedup": result["qps"] / exact["qps"],
+                "latency_ms": result["latency_ms"],
+                f"recall@{args.k}": recall_at_k(result["ids"], reference),
+                "build_s": build_s,
+            })
+    logger.info(f"✅ {leg}: {n_rows} x {dim}, {len(queries)} queries")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fp16/int8 index storage vs float32")
+    parser.add_argument("--embeddings-dir", default=settings.embeddings_dir,
+                        help="Directory with raw .npy embeddings")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES,
+                        help="CSV with a 'query' column (the 104 evaluation queries)")
+    parser.add_argument("--legs", nargs="+", choices=tuple(INDEX_SOURCES), default=list(INDEX_SOURCES),
+                        help="Indexes to benchmark")
+    parser.add_argument("--storages", nargs="+", choices=[s for s in STORAGE_TYPES if s != "float32"],
+                        default=["fp16", "int8"], help="Quantized storages to compare")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="Flat",
+                        help="Index type wrapping the quantized vectors")
+    parser.add_argument("--nlist", type=int, default=settings.index_ivf_nlist,
+                        help="IVF cells (0 = 4 * sqrt(ntotal))")
+    parser.add_argument("--rerank-k", type=int, default=settings.index_rerank_k,
+                        help="Candidates re-scored with float32 vectors")
+    parser.add_argument("--k", type=int, default=10, help="Results per query (recall@k)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timing passes over the queries")
+    parser.add_argument("--output", default=None, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    queries = pd.read_csv(args.queries)["query"].astype(str).tolist()
+    report = []
+    for leg in args.legs:
+        source = Path(args.embeddings_dir) / INDEX_SOURCES[leg]
+        if not source.exists():
+            logger.warning(f"⚠️ Skipping {leg}, embeddings not found: {source}")
+            continue
+        vectors = normalize_rows(np.load(source, mmap_mode="r"))
+        report.extend(benchmark_leg(leg, vectors, encode_queries(leg, queries), args))
+
+    table = pd.DataFrame(report)
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        logger.info(f"🎉 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Encode the product catalog into the embedding files under data/embeddings.
+
+Encoding is checkpointed in shards, so re-running after a crash resumes where
+the previous run stopped.
+
+Run from the backend directory:
+    python -m scripts.build_embeddings
+    python -m scripts.build_embeddings --batch-size-text 256 --workers 8
+    python -m scripts.build_embeddings --legs clip_image
+"""
+import argparse
+import logging
+from pathlib import Path
+
+from app.core.catalog import get_catalog
+from app.core.config import settings
+from app.core.embedding_builder import LEGS, EmbeddingBuilder
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build catalog embeddings (MPNet + CLIP)")
+    parser.add_argument("--output-dir", default=settings.embeddings_dir,
+                        help="Output directory for .npy files and the manifest")
+    parser.add_argument("--images-dir", default=settings.images_dir,
+                        help="Directory with {product_id}.jpg images")
+    parser.add_argument("--batch-size-text", type=int, default=settings.batch_size_text,
+                        help="Texts per forward pass")
+    parser.add_argument("--batch-size-image", type=int, default=settings.batch_size_image,
+                        help="Images per forward pass")
+    parser.add_argument("--shard-size", type=int, default=settings.embedding_shard_size,
+                        help="Rows per checkpoint shard")
+    parser.add_argument("--workers", type=int, default=settings.embedding_workers,
+                        help="Image decode processes (0 = one per CPU core)")
+    parser.add_argument("--legs", nargs="+", choices=list(LEGS), default=list(LEGS),
+                        help="Encoders to run")
+    parser.add_argument("--device", default=None, help="Torch device (default: auto)")
+    args = parser.parse_args()
+
+    builder = EmbeddingBuilder(
+        get_catalog(),
+        output_dir=Path(args.output_dir),
+        images_dir=Path(args.images_dir),
+        batch_size_text=args.batch_size_text,
+        batch_size_image=args.batch_size_image,
+        shard_size=args.shard_size,
+        num_workers=args.workers,
+        device=args.device,
+    )
+    manifest = builder.build(args.legs)
+    logger.info(f"🎉 Embeddings ready: {len(manifest['files'])} files -> {args.output_dir}")
+    logger.info("Rebuild the index store next: python -m scripts.build_indexes")
+
+
+if __name__ == "__main__":
+    main()
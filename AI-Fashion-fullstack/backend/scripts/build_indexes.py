@@ -0,0 +1,85 @@
+"""
+Build the memory-mapped search index store used by MLLoader.
+
+Run from the backend directory:
+    python -m scripts.build_indexes
+    python -m scripts.build_indexes --embeddings-dir data/embeddings --out-dir data/indexes
+    python -m scripts.build_indexes --index-type HNSW --m 32 --ef-construction 200
+    python -m scripts.build_indexes --index-type IVFPQ --nlist 4096 --pq-m 64
+    python -m scripts.build_indexes --storage int8 --rerank-k 100
+    python -m scripts.build_indexes --lexical-scheme tfidf
+"""
+import argparse
+import logging
+from pathlib import Path
+
+from app.core.catalog import get_catalog
+from app.core.config import settings
+from app.core.index_factory import INDEX_TYPES, STORAGE_TYPES, IndexSpec
+from app.core.index_store import build_index_store
+from app.core.lexical_index import SCHEMES, build_lexical_index, lexical_params
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build persisted search indexes")
+    parser.add_argument("--embeddings-dir", default=settings.embeddings_dir,
+                        help="Directory with raw .npy embeddings")
+    parser.add_argument("--out-dir", default=settings.index_store_dir,
+                        help="Output directory for index files and manifest.json")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=settings.index_type,
+                        help="Index type (IVF = IVF-Flat)")
+    parser.add_argument("--m", type=int, default=settings.index_hnsw_m,
+                        help="HNSW graph degree")
+    parser.add_argument("--ef-construction", type=int, default=settings.index_hnsw_ef_construction,
+                        help="HNSW build beam width")
+    parser.add_argument("--ef-search", type=int, default=settings.index_hnsw_ef_search,
+                        help="HNSW default search beam width")
+    parser.add_argument("--nlist", type=int, default=settings.index_ivf_nlist,
+                        help="IVF cells (0 = 4 * sqrt(ntotal))")
+    parser.add_argument("--nprobe", type=int, default=settings.index_ivf_nprobe,
+                        help="IVF default cells probed per query")
+    parser.add_argument("--pq-m", type=int, default=settings.index_pq_m,
+                        help="PQ sub-quantizers (must divide the dimension)")
+    parser.add_argument("--pq-nbits", type=int, default=settings.index_pq_nbits,
+                        help="Bits per PQ code")
+    parser.add_argument("--storage", choices=tuple(STORAGE_TYPES), default=settings.index_storage,
+                        help="Vector encoding inside the index (fp16/int8 = scalar quantized)")
+    parser.add_argument("--rerank-k", type=int, default=settings.index_rerank_k,
+                        help="Candidates re-scored with float32 vectors for lossy indexes (0 = off)")
+    parser.add_argument("--lexical-scheme", choices=SCHEMES, default=settings.lexical_scheme,
+                        help="Weighting of the lexical product-text index")
+    parser.add_argument("--skip-lexical", action="store_true",
+                        help="Do not (re)build the lexical index")
+    args = parser.parse_args()
+
+    spec = IndexSpec(
+        index_type=args.index_type,
+        m=args.m,
+        ef_construction=args.ef_construction,
+        ef_search=args.ef_search,
+        nlist=args.nlist,
+        nprobe=args.nprobe,
+        pq_m=args.pq_m,
+        pq_nbits=args.pq_nbits,
+        storage=args.storage,
+        rerank_k=args.rerank_k,
+    )
+    manifest = build_index_store(Path(args.embeddings_dir), Path(args.out_dir), spec=spec)
+    for name, entry in manifest["indexes"].items():
+        logger.info(
+            f"{name} ({entry['index_type']}, {entry['storage']}): {entry['ntotal']} x {entry['dim']} "
+            f"-> {entry.get('faiss_file', entry['file'])}"
+        )
+    if not args.skip_lexical:
+        build_lexical_index(get_catalog(), Path(args.out_dir), **{**lexical_params(), "scheme": args.lexical_scheme})
+    logger.info(f"🎉 Index store ready: {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Precompute the item-to-item neighbor table served by /api/products/{id}/similar.
+
+Reads the normalized vectors of the index store (build it first with
+`python -m scripts.build_indexes`) and writes int32 / float16 neighbor arrays
+plus ``neighbors.json`` into the same directory.
+
+Run from the backend directory:
+    python -m scripts.build_neighbors
+    python -m scripts.build_neighbors --k 100 --alpha 0.6
+    python -m scripts.build_neighbors --kinds fused --block-rows 512
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+from app.core.catalog import get_catalog
+from app.core.config import settings
+from app.core.index_store import load_index_store
+from app.core.neighbors import NEIGHBOR_KINDS, build_neighbor_table
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the item-to-item neighbor table")
+    parser.add_argument("--store-dir", default=settings.index_store_dir,
+                        help="Index store directory (input vectors and output table)")
+    parser.add_argument("--embeddings-dir", default=settings.embeddings_dir,
+                        help="Raw embeddings, used to detect a stale index store")
+    parser.add_argument("--k", type=int, default=settings.neighbors_k, help="Neighbors per product")
+    parser.add_argument("--alpha", type=float, default=settings.neighbors_alpha,
+                        help="Text weight of the fused neighbors")
+    parser.add_argument("--block-rows", type=int, default=settings.neighbors_block_rows,
+                        help="Products scored per matrix multiply (memory ~ block_rows x catalog x 4 bytes)")
+    parser.add_argument("--kinds", nargs="+", choices=tuple(NEIGHBOR_KINDS), default=list(NEIGHBOR_KINDS),
+                        help="Neighbor kinds to build")
+    args = parser.parse_args()
+
+    store = load_index_store(Path(args.store_dir), Path(args.embeddings_dir))
+    if store is None:
+        logger.error(f"❌ No up-to-date index store in {args.store_dir}, run `python -m scripts.build_indexes` first")
+        sys.exit(1)
+    indexes, index_manifest = store
+
+    catalog = get_catalog()
+    if indexes["text"].ntotal != len(catalog):
+        logger.error(f"❌ Index has {indexes['text'].ntotal} vectors but catalog has {len(catalog)} products")
+        sys.exit(1)
+
+    start = time.time()
+    manifest = build_neighbor_table(
+        indexes, catalog, Path(args.store_dir), k=args.k, alpha=args.alpha,
+        block_rows=args.block_rows, kinds=args.kinds, index_manifest=index_manifest
+    )
+    logger.info(
+        f"🎉 Neighbor table ready ({', '.join(manifest['kinds'])}, top {args.k}) "
+        f"in {time.time() - start:.1f}s: {args.store_dir}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Precompute the product matrix used by the content-based recommender.
+
+Run from the backend directory:
+    python -m scripts.build_recommender_embeddings
+    python -m scripts.build_recommender_embeddings --batch-size 512
+"""
+import argparse
+import logging
+from pathlib import Path
+
+from app.core.catalog import get_catalog
+from app.core.config import settings
+from app.core.personalization import PreferenceEncoder, build_product_matrix
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the recommender product matrix")
+    parser.add_argument("--output", default=settings.recommender_embeddings_path,
+                        help="Output .npy path")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="Encoding batch size")
+    args = parser.parse_args()
+
+    matrix = build_product_matrix(
+        get_catalog(), PreferenceEncoder(), Path(args.output), batch_size=args.batch_size
+    )
+    logger.info(f"🎉 Product matrix ready: {matrix.shape[0]} x {matrix.shape[1]} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
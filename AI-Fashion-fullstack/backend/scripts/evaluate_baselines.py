@@ -0,0 +1,182 @@
+"""
+Batched v2.1 baseline comparison, usable as a retrieval regression gate.
+
+All methods run over the whole query set at once: the queries are encoded once
+per encoder, each dense leg is one multi-row index search, the fusion grid
+reuses the two query x catalog score matrices, and the lexical methods are one
+sparse product each. Methods are scored against the RRF consensus of all
+methods (the v2.1 ground truth) with vectorized Overlap / Recall / NDCG / MAP
+and rank correlation at k.
+
+Methods: BM25, TF-IDF (product names), Text-only (MPNet), Image-only (CLIP
+text -> image index), Fusion α=<alpha> per --alphas, and BM25+Dense (the
+serving lexical leg fused with RRF).
+
+Run from the backend directory:
+    python -m scripts.evaluate_baselines
+    python -m scripts.evaluate_baselines --alphas 0.3 0.5 0.7 0.9 --output data/benchmarks/baselines.json
+    python -m scripts.evaluate_baselines --baseline data/benchmarks/baselines.json --tolerance 0.02
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from app.core.catalog import get_catalog
+from app.core.config import settings
+from app.core.fusion import rrf_aggregate
+from app.core.index_store import INDEX_SOURCES, MmapFlatIndex, load_index_store, search_index
+from app.core.lexical_index import LexicalIndex, lexical_params, load_lexical_index
+from app.core.vector_ops import normalize_rows, top_k
+from app.services.evaluation import encode_queries, evaluate_rankings, summarize
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERIES = "../../v2.1-core-ml-plus/evaluation/results/evaluation_queries_100plus.csv"
+
+
+def load_indexes(store_dir: Path, embeddings_dir: Path) -> Dict[str, object]:
+    """Serving indexes from the store, or exact indexes over the raw embeddings."""
+    store = load_index_store(store_dir, embeddings_dir)
+    if store is not None:
+        return store[0]
+    logger.warning("⚠️ No index store found, scanning the raw embeddings exactly")
+    indexes = {}
+    for name, source_name in INDEX_SOURCES.items():
+        source = embeddings_dir / source_name
+        if source.exists():
+            indexes[name] = MmapFlatIndex(normalize_rows(np.load(source, mmap_mode="r")))
+    return indexes
+
+
+def run_methods(queries: List[str], catalog, indexes: Dict[str, object], depth: int,
+                alphas: List[float]) -> Dict[str, Dict]:
+    """
+    Rankings of every method for all queries.
+
+    Returns:
+        Method name -> {"rows": (n_queries, depth) rows, "ms": batch wall time}
+    """
+    methods: Dict[str, Dict] = {}
+
+    def timed(name, func):
+        start = time.perf_counter()
+        rows = func()
+        methods[name] = {"rows": rows, "ms": (time.perf_counter() - start) * 1000}
+        logger.info(f"✅ {name}: {methods[name]['ms']:.1f} ms for {len(queries)} queries")
+
+    names = catalog.names.astype(str).tolist()
+    bm25 = LexicalIndex.build(names, scheme="bm25", tokenizer="lowercase")
+    tfidf = LexicalIndex.build(names, scheme="tfidf", tokenizer="sklearn")
+    timed("BM25", lambda: bm25.search(queries, depth)[1])
+    timed("TF-IDF", lambda: tfidf.search(queries, depth)[1])
+
+    start = time.perf_counter()
+    text_queries = encode_queries("text", queries)
+    logger.info(f"✅ Text queries encoded in {(time.perf_counter() - start) * 1000:.0f} ms")
+    text_index = indexes["text"]
+    timed("Text-only", lambda: search_index(text_index, text_queries, depth)[1])
+
+    image_index = indexes.get("image")
+    if image_index is not None:
+        start = time.perf_counter()
+        image_queries = encode_queries("image", queries)
+        logger.info(f"✅ CLIP text queries encoded in {(time.perf_counter() - start) * 1000:.0f} ms")
+        timed("Image-only", lambda: search_index(image_index, image_queries, depth)[1])
+
+        # One score matrix per leg, shared by every alpha of the grid
+        text_scores = text_queries @ np.asarray(text_index.vectors, dtype=np.float32).T
+        image_scores = image_queries @ np.asarray(image_index.vectors, dtype=np.float32).T
+        for alpha in alphas:
+            timed(f"Fusion α={alpha}", lambda: top_k(alpha * text_scores + (1 - alpha) * image_scores, depth)[1])
+
+    lexical = load_lexical_index(Path(settings.index_store_dir), catalog, **lexical_params())
+    timed("BM25+Dense", lambda: rrf_aggregate(
+        [methods["Text-only"]["rows"], lexical.search(queries, settings.lexical_candidates)[1]],
+        depth, c=settings.lexical_rrf_k, weights=(1.0, settings.lexical_weight)
+    )[1])
+    return methods
+
+
+def regressions(summary: pd.DataFrame, baseline: List[Dict], tolerance: float) -> List[str]:
+    """Metrics that dropped by more than `tolerance` against a previous report."""
+    current = summary.set_index("method")
+    failures = []
+    for row in baseline:
+        method = row["method"]
+        if method not in current.index:
+            continue
+        for metric, value in row.items():
+            if metric in current.columns and metric != "method":
+                drop = value - float(current.loc[method, metric])
+                if drop > tolerance:
+                    failures.append(f"{method} {metric}: {value:.4f} -> {current.loc[method, metric]:.4f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched baseline retrieval evaluation")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES,
+                        help="CSV with a 'query' column (and optionally 'category')")
+    parser.add_argument("--embeddings-dir", default=settings.embeddings_dir,
+                        help="Directory with raw .npy embeddings")
+    parser.add_argument("--store-dir", default=settings.index_store_dir,
+                        help="Index store directory")
+    parser.add_argument("--k", type=int, default=10, help="Metric cutoff")
+    parser.add_argument("--depth", type=int, default=0,
+                        help="Results per method fed to the consensus (0 = 2 * k)")
+    parser.add_argument("--rrf-k", type=int, default=60, help="RRF constant of the consensus")
+    parser.add_argument("--alphas", nargs="+", type=float, default=[0.5, 0.7],
+                        help="Text weights of the fusion grid")
+    parser.add_argument("--output", default=None, help="Optional JSON report path")
+    parser.add_argument("--baseline", default=None,
+                        help="Previous JSON report; exit 1 when a metric drops by more than --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed metric drop")
+    args = parser.parse_args()
+
+    queries_df = pd.read_csv(args.queries)
+    queries = queries_df["query"].astype(str).tolist()
+    depth = args.depth or 2 * args.k
+
+    start = time.perf_counter()
+    methods = run_methods(queries, get_catalog(), load_indexes(Path(args.store_dir), Path(args.embeddings_dir)),
+                          depth, args.alphas)
+    per_query = evaluate_rankings({name: m["rows"] for name, m in methods.items()}, k=args.k, c=args.rrf_k)
+    summary = summarize(per_query)
+    summary["batch_ms"] = summary["method"].map({name: m["ms"] for name, m in methods.items()})
+    logger.info(f"🎉 {len(methods)} methods x {len(queries)} queries in {time.perf_counter() - start:.1f}s")
+
+    print(summary.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    report = {"k": args.k, "depth": depth, "queries": len(queries), "methods": summary.to_dict(orient="records")}
+    if "category" in queries_df.columns:
+        by_category = summarize(per_query, categories=queries_df["category"].astype(str).tolist())
+        print(by_category.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        report["categories"] = by_category.to_dict(orient="records")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        logger.info(f"🎉 Report written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["methods"]
+        failures = regressions(summary.drop(columns="batch_ms"), baseline, args.tolerance)
+        for failure in failures:
+            logger.error(f"❌ Regression: {failure}")
+        if failures:
+            sys.exit(1)
+        logger.info(f"✅ No metric dropped by more than {args.tolerance}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+One-time migration of the CLIP image embeddings to their native dimension.
+
+Older builds zero-padded the 512d CLIP ViT-B/32 vectors to 768d
+(clip_image_768d_normalized.npy). This strips the padding into
+clip_image_512d_normalized.npy; afterwards rebuild the index store.
+
+Run from the backend directory:
+    python -m scripts.migrate_image_embeddings
+    python -m scripts.migrate_image_embeddings --embeddings-dir data/embeddings --remove-source
+    python -m scripts.build_indexes
+"""
+import argparse
+import logging
+from pathlib import Path
+
+from app.core.config import settings
+from app.core.embedding_builder import migrate_image_embeddings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Strip zero padding from CLIP image embeddings")
+    parser.add_argument("--embeddings-dir", default=settings.embeddings_dir,
+                        help="Directory with the padded .npy embeddings")
+    parser.add_argument("--remove-source", action="store_true",
+                        help="Delete the padded files after a successful migration")
+    args = parser.parse_args()
+
+    migrated = migrate_image_embeddings(Path(args.embeddings_dir), remove_source=args.remove_source)
+    for name, info in migrated.items():
+        logger.info(f"{info['source']} -> {name}: {info['ntotal']} x {info['dim']}")
+    logger.info("🎉 Migration done, now run `python -m scripts.build_indexes`")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Shared fixtures: a FashionSearchEngine over in-memory indexes and stub encoders."""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.cache import EmbeddingCache
+from app.core.catalog import CatalogStore
+from app.core.index_store import MmapFlatIndex
+from app.core.vector_ops import normalize_rows
+from app.services.search_engine import FashionSearchEngine
+
+N_PRODUCTS = 60
+
+
+@pytest.fixture
+def engine():
+    rng = np.random.default_rng(0)
+    catalog = CatalogStore(pd.DataFrame({
+        "id": np.arange(1000, 1000 + N_PRODUCTS),
+        "productDisplayName": [f"Product {i}" for i in range(N_PRODUCTS)],
+        "gender": ["Men", "Women"] * (N_PRODUCTS // 2),
+        "masterCategory": ["Apparel"] * N_PRODUCTS,
+        "baseColour": ["Red", "Blue", "Black"] * (N_PRODUCTS // 3),
+    }))
+    text_vectors = normalize_rows(rng.normal(size=(N_PRODUCTS, 16)).astype(np.float32))
+    image_vectors = normalize_rows(rng.normal(size=(N_PRODUCTS, 8)).astype(np.float32))
+    encoded = []
+
+    def encode_text_batch(texts):
+        # "product 12" encodes to product 12's text vector
+        encoded.append(list(texts))
+        return np.vstack([text_vectors[int(text.split()[-1])] for text in texts])
+
+    ml = SimpleNamespace(
+        catalog=catalog,
+        text_index=MmapFlatIndex(text_vectors),
+        image_index=MmapFlatIndex(image_vectors),
+        query_cache=EmbeddingCache(name="test_queries"),
+        text_batcher=None,
+        encode_text_batch=encode_text_batch,
+        image_batcher=None,
+        clip_text_batcher=None,
+        query_expander=None,
+        reranker=None,
+        lexical_index=None,
+        encoded=encoded,
+    )
+    engine = FashionSearchEngine.__new__(FashionSearchEngine)
+    engine.ml = ml
+    engine.response_cache = None
+    return engine
+
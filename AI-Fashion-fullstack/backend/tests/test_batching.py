@@ -0,0 +1,113 @@
+"""MicroBatcher coalescing and failure propagation."""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core.batching import MicroBatcher
+
+
+@pytest.fixture
+def batchers():
+    """MicroBatcher factory; worker threads are stopped after the test."""
+    created = []
+
+    def make(*args, **kwargs):
+        created.append(MicroBatcher(*args, **kwargs))
+        return created[-1]
+
+    yield make
+    for batcher in created:
+        batcher.close()
+
+
+def test_concurrent_items_are_coalesced(batchers):
+    sizes = []
+    batcher = batchers("square", lambda items: sizes.append(len(items)) or [x * x for x in items],
+                       max_batch_size=4, max_wait_ms=50)
+
+    futures = [batcher.submit(i) for i in range(10)]
+    assert [f.result(timeout=5) for f in futures] == [i * i for i in range(10)]
+    assert sum(sizes) == 10 and max(sizes) <= 4 and len(sizes) < 10
+
+    stats = batcher.get_stats()
+    assert stats["items"] == 10 and stats["max_batch_size_seen"] == max(sizes)
+
+
+def test_blocking_calls_from_threads(batchers):
+    batcher = batchers("double", lambda items: [2 * x for x in items], max_wait_ms=5)
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(batcher, range(32))) == [2 * x for x in range(32)]
+
+
+def test_wrong_result_count_fails_every_caller(batchers):
+    release = threading.Event()
+
+    def short_batch(items):
+        release.wait(5)
+        return items[:-1]
+
+    batcher = batchers("short", short_batch, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(3)]
+    release.set()
+
+    for future in futures:
+        with pytest.raises(ValueError, match="results for"):
+            future.result(timeout=5)
+    assert batcher.get_stats()["errors"] >= 1
+
+
+def test_exceptions_reach_callers_and_closed_batcher_rejects(batchers):
+    def fail(items):
+        raise RuntimeError("model crashed")
+
+    batcher = batchers("fail", fail)
+    with pytest.raises(RuntimeError, match="model crashed"):
+        batcher(1)
+
+    batcher.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.submit(2)
+
+
+
+class _SlowPutQueue(queue.Queue):
+    """Queue whose item puts (not the stop marker) wait for `release`."""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def put(self, entry, *args, **kwargs):
+        if entry is not None:
+            self.entered.set()
+            self.release.wait(5)
+        super().put(entry, *args, **kwargs)
+
+
+def test_submit_racing_close_is_not_stranded(batchers):
+    batcher = batchers("race", lambda items: items)
+    batcher._queue.put(None)  # stop the worker serving the original queue...
+    batcher._worker.join(5)
+    batcher._queue = slow = _SlowPutQueue()
+    batcher._worker = threading.Thread(target=batcher._run, daemon=True)
+    batcher._worker.start()  # ...and serve the slow one instead
+
+    submitted = []
+    submitter = threading.Thread(target=lambda: submitted.append(batcher.submit("item")))
+    submitter.start()
+    slow.entered.wait(5)  # submit passed the closed check and is queuing
+
+    closer = threading.Thread(target=batcher.close)
+    closer.start()
+    time.sleep(0.05)
+    slow.release.set()
+    submitter.join(5)
+    closer.join(5)
+
+    assert submitted[0].result(timeout=2) == "item"
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.submit("late")
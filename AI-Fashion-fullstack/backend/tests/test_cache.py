@@ -0,0 +1,99 @@
+"""LRU/TTL eviction of the backend caches."""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.core import cache as cache_module
+from app.core.cache import EmbeddingCache, ResponseCache, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Manual monotonic clock for the cache module."""
+    now = [1000.0]
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(max_entries=10, ttl_seconds=60)
+    cache.put("a", 1)
+
+    clock[0] += 59
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+
+
+def test_put_refreshes_ttl(clock):
+    cache = TTLCache(max_entries=10, ttl_seconds=60)
+    cache.put("a", 1)
+    clock[0] += 50
+    cache.put("a", 2)
+    clock[0] += 50
+    assert cache.get("a") == 2
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = TTLCache(max_entries=2, ttl_seconds=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")  # "b" becomes least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_byte_bound(clock):
+    cache = TTLCache(max_entries=10, ttl_seconds=None, max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    cache.put("c", "xxxx")
+    cache.put("huge", "x" * 11)  # larger than the bound: not cached
+
+    assert cache.get("a") is None and cache.get("huge") is None
+    assert cache.get_stats()["bytes"] == 8
+
+
+
+def test_embedding_cache_key_and_warm_start(tmp_path):
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=None)
+    assert EmbeddingCache.key("mpnet", "  Red Dress ") == EmbeddingCache.key("mpnet", "red dress")
+    cache.put(EmbeddingCache.key("mpnet", "red dress"), np.arange(3, dtype=np.float32))
+    cache.put(EmbeddingCache.key("clip", "red dress"), np.ones(2, dtype=np.float32))
+    cache.save(tmp_path / "cache.npz")
+
+    warm = EmbeddingCache(max_entries=10, ttl_seconds=None)
+    assert warm.load(tmp_path / "cache.npz") == 2
+    np.testing.assert_array_equal(warm.get(("mpnet", "red dress")), [0, 1, 2])
+    assert warm.load(tmp_path / "missing.npz") == 0
+
+
+def test_response_cache_version_invalidation(clock):
+    cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    cache.check_version(("catalog-1", "index-1"))
+    key = ResponseCache.key("text", "Blue Shirt ", 10, 0.7, {"gender": "Men"})
+    cache.put(key, {"results": []})
+
+    cache.check_version(("catalog-1", "index-1"))
+    assert cache.get(key) == {"results": []}
+
+    cache.check_version(("catalog-2", "index-1"))
+    assert cache.get(key) is None
+    assert cache.get_stats()["invalidations"] == 1
+
+
+def test_response_cache_key():
+    key = ResponseCache.key("text", "Blue Shirt ", 10, 0.7, {"color": ["Red", "Blue"], "gender": "Men"})
+
+    assert key == ResponseCache.key("text", "blue shirt", 10, 0.70001, {"gender": "Men", "color": ["Blue", "Red"]})
+    assert key != ResponseCache.key("text", "blue shirt", 20, 0.7, {"gender": "Men", "color": ["Blue", "Red"]})
+    assert key != ResponseCache.key("text", "blue shirt", 10, 0.7, {"gender": "Men", "color": ["Blue", "Red"]},
+                                    lexical=True)
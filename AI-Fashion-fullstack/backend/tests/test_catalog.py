@@ -0,0 +1,67 @@
+"""CatalogStore id lookups, filters and batch getters."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.catalog import CatalogStore
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    products = pd.DataFrame({
+        "id": [15, 3, 42, 7],
+        "productDisplayName": ["Red Shirt", "Blue Jeans", "Navy Blue Shirt", None],
+        "gender": ["Men", "Women", "Men", "Women"],
+        "masterCategory": ["Apparel", "Apparel", "Apparel", "Accessories"],
+        "baseColour": ["Red", "Blue", "Navy Blue", None],
+        "year": [2012, 2013, 2014, 2015],
+    })
+    (tmp_path / "42.jpg").write_bytes(b"")
+    return CatalogStore(products, images_dir=tmp_path, image_base_url="http://img/")
+
+
+def test_rows_for_ids(catalog):
+    rows = catalog.rows_for_ids([42, 15, 99, -1, 7])
+    assert rows.tolist() == [2, 0, -1, -1, 3]
+    assert catalog.rows_for_ids(np.array(["3", "x", "42"], dtype=object)).tolist() == [1, -1, 2]
+    assert catalog.row_for_id("15") == 0 and catalog.row_for_id(1000) is None
+    assert catalog.contains(7) and not catalog.contains(8)
+
+
+def test_filter_mask(catalog):
+    assert catalog.filter_mask(None) is None
+    assert catalog.filter_mask({"gender": "men"}).tolist() == [True, False, True, False]
+    # Values of one key are OR-ed, keys are AND-ed; colours match exactly
+    mask = catalog.filter_mask({"color": ["blue", "red"], "gender": "Men"})
+    assert mask.tolist() == [True, False, False, False]
+    assert catalog.filter_mask({"baseColour": "Unknown"}).tolist() == [False, False, False, True]
+    assert not catalog.filter_mask({"category": "Footwear"}).any()
+
+    with pytest.raises(ValueError, match="Unsupported filter"):
+        catalog.filter_mask({"price": 10})
+
+
+def test_bitmaps_are_cached_and_read_only(catalog):
+    bitmap = catalog.bitmap("gender", "Men")
+    assert catalog.bitmap("gender", "MEN") is bitmap
+    with pytest.raises(ValueError):
+        bitmap[0] = False
+
+
+def test_products_and_display_columns(catalog):
+    products = catalog.products(np.array([2, -1, 3]))
+    assert [p["product_id"] for p in products] == [42, 7]
+    assert products[0]["color"] == "Navy Blue" and products[0]["year"] == 2014
+    assert products[1]["color"] == "Unknown"
+
+    columns = catalog.display_columns(np.array([2, 0]))
+    assert columns["product_name"].tolist() == ["Navy Blue Shirt", "Red Shirt"]
+    assert columns["image_url"].tolist() == ["http://img/42.jpg", None]
+    assert catalog.product(99) is None
+
+
+def test_fingerprint_tracks_product_text(catalog):
+    edited = catalog.df.copy()
+    edited.loc[0, "productDisplayName"] = "Crimson Shirt"
+    assert CatalogStore(catalog.df).fingerprint == catalog.fingerprint
+    assert CatalogStore(edited).fingerprint != catalog.fingerprint
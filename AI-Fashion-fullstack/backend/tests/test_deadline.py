@@ -0,0 +1,49 @@
+"""Per-request search deadline."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import deadline as deadline_module
+from app.core.deadline import Deadline
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Manual perf_counter (seconds) for the deadline module."""
+    now = [50.0]
+    monkeypatch.setattr(deadline_module, "time", SimpleNamespace(perf_counter=lambda: now[0]))
+    return now
+
+
+def test_stages_run_while_budget_remains(clock):
+    deadline = Deadline(100)
+    clock[0] += 0.080
+
+    assert deadline.remaining_ms() == pytest.approx(20)
+    assert deadline.allows("image_leg", 20)
+    assert not deadline.allows("personalization", 30)
+    assert not deadline.allows("personalization", 30)
+    assert deadline.skipped == ["personalization"]
+
+
+def test_report(clock):
+    deadline = Deadline(100)
+    deadline.degrade("ann", {"ef_search": 32})
+    deadline.skip("history")
+    clock[0] += 0.0125
+
+    assert deadline.report() == {
+        "budget_ms": 100,
+        "elapsed_ms": 12.5,
+        "skipped": ["history"],
+        "degraded": {"ann": {"ef_search": 32}},
+    }
+
+
+def test_zero_budget_is_unlimited(clock):
+    deadline = Deadline(0)
+    clock[0] += 3600
+
+    assert deadline.unlimited
+    assert deadline.allows("rerank", 1e9)
+    assert deadline.report()["budget_ms"] is None
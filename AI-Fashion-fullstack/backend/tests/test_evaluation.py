@@ -0,0 +1,65 @@
+"""Batched ranking metrics used by scripts/evaluate_baselines.py."""
+import numpy as np
+import pytest
+
+from app.services.evaluation import (
+    average_precision_at_k, bm25_rankings, bm25_retrieve, ndcg_at_k, rrf_aggregate, stack_rankings,
+    tfidf_retrieve, topk_to_ranked_lists,
+)
+
+CORPUS = ["red shirt", "blue jeans", "red summer dress", "black boots", "green hat"]
+
+
+def test_ndcg_at_k():
+    retrieved = np.array([[1, 2, 3], [2, 5, 9], [4, -1, -1], [7, 8, 9]])
+    relevant = [[2, 5], [2, 5], [6], []]
+
+    expected = [
+        (1 / np.log2(3)) / (1 + 1 / np.log2(3)),  # one hit at rank 2, two relevant
+        1.0,                                       # ideal order
+        0.0,                                       # miss (padding never counts)
+        0.0,                                       # nothing relevant
+    ]
+    np.testing.assert_allclose(ndcg_at_k(retrieved, relevant, k=3), expected)
+
+
+def test_average_precision_at_k():
+    retrieved = np.array([[1, 2, 3, 5], [5, 1, 2, 3], [9, 9, 9, 9]])
+    relevant = [[2, 5], [5, 2], [1]]
+
+    expected = [
+        (1 / 2 + 2 / 4) / 2,  # hits at ranks 2 and 4
+        (1 / 1 + 2 / 3) / 2,  # hits at ranks 1 and 3
+        0.0,
+    ]
+    np.testing.assert_allclose(average_precision_at_k(retrieved, relevant, k=4), expected)
+
+
+def test_metrics_cut_at_k():
+    retrieved = np.array([[1, 2, 3]])
+    assert ndcg_at_k(retrieved, [[3]], k=2)[0] == 0.0
+    assert average_precision_at_k(retrieved, [[3]], k=2)[0] == 0.0
+    assert ndcg_at_k(retrieved, [[1]], k=1)[0] == pytest.approx(1.0)
+
+
+def test_single_query_rrf():
+    assert rrf_aggregate([[1, 2, 3], [3, 4]], k=3) == [3, 1, 2]
+    assert rrf_aggregate([], k=3) == []
+
+
+@pytest.mark.parametrize("retrieve", [bm25_retrieve, tfidf_retrieve])
+def test_retrieve_returns_k_ids(retrieve):
+    red, unknown = retrieve(CORPUS, ["red", "unknown words"], k=4)
+    assert len(red) == 4 and set(red[:2]) == {0, 2} and len(set(red)) == 4
+    assert unknown == [4, 3, 2, 1]  # no hits: highest index first, as the original argsort
+    assert len(retrieve(CORPUS, ["red"], k=10)[0]) == len(CORPUS)
+
+
+def test_array_variants():
+    rows = bm25_rankings(CORPUS, ["red", "unknown words"], k=4)
+    assert rows.shape == (2, 4) and sorted(rows[0, :2]) == [0, 2]
+    assert (rows[0, 2:] == -1).all() and (rows[1] == -1).all()
+
+    rankings = {"a": [[1, 2], [3]], "b": [[4], [5, 6, 7]]}
+    assert topk_to_ranked_lists(rankings) == [[[1, 2], [4]], [[3], [5, 6, 7]]]
+    assert stack_rankings(rankings, k=2).tolist() == [[[1, 2], [4, -1]], [[3, -1], [5, 6]]]
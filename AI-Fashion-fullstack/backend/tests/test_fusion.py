@@ -0,0 +1,44 @@
+"""Vectorized reciprocal rank fusion."""
+import numpy as np
+
+from app.core.fusion import rrf_aggregate
+
+
+def rrf_reference(lists, k, c=60, weights=None):
+    """Dict-based RRF of one query; ties keep first appearance (lists in order)."""
+    weights = weights or [1.0] * len(lists)
+    scores = {}
+    for weight, rows in zip(weights, lists):
+        for rank, row in enumerate(rows, start=1):
+            if row >= 0:
+                scores[row] = scores.get(row, 0.0) + weight / (c + rank)
+    ranked = sorted(scores, key=lambda row: -scores[row])  # stable: dict order breaks ties
+    return [(row, scores[row]) for row in ranked[:k]]
+
+
+def test_matches_reference_on_random_batches():
+    rng = np.random.default_rng(0)
+    n_queries, depth, k = 20, 6, 8
+    lists = [
+        np.stack([rng.choice(12, depth, replace=False) for _ in range(n_queries)])
+        for _ in range(3)
+    ]
+    lists[1][:, -2:] = -1  # padded ranking
+    weights = [1.0, 0.5, 2.0]
+
+    scores, rows = rrf_aggregate(lists, k, c=10, weights=weights)
+    for q in range(n_queries):
+        expected = rrf_reference([l[q].tolist() for l in lists], k, c=10, weights=weights)
+        assert rows[q][:len(expected)].tolist() == [row for row, _ in expected]
+        np.testing.assert_allclose(scores[q][:len(expected)], [s for _, s in expected], rtol=1e-6)
+
+
+def test_ties_keep_first_appearance_and_pad():
+    scores, rows = rrf_aggregate([np.array([[3, -1]]), np.array([[7, 3]])], k=4)
+
+    # 3 appears in both lists; 7 ties with nothing, -1 entries never count
+    assert rows.tolist() == [[3, 7, -1, -1]]
+    np.testing.assert_allclose(scores[0], [1 / 61 + 1 / 62, 1 / 61, 0, 0], rtol=1e-6)
+
+    _, rows = rrf_aggregate([np.array([[5]]), np.array([[2]])], k=2)
+    assert rows.tolist() == [[5, 2]]
@@ -0,0 +1,58 @@
+"""Upload decoding for CLIP (draft-mode JPEG decode, resize and center crop)."""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, UnidentifiedImageError
+from PIL.JpegImagePlugin import JpegImageFile
+
+from app.services.image_preprocessing import CLIP_IMAGE_SIZE, decode_for_clip, resize_center_crop
+
+
+def encode(image: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def photo():
+    """Smooth 1600x1200 gradient (a stand-in for a large phone photo)."""
+    y, x = np.mgrid[0:1200, 0:1600]
+    pixels = np.stack([x * 255 // 1600, y * 255 // 1200, (x + y) * 255 // 2800], axis=-1)
+    return Image.fromarray(pixels.astype(np.uint8))
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+def test_decode_for_clip_matches_a_full_decode(photo, fmt):
+    contents = encode(photo, fmt)
+    pixels = decode_for_clip(contents)
+    assert pixels.shape == (CLIP_IMAGE_SIZE, CLIP_IMAGE_SIZE, 3) and pixels.dtype == np.uint8
+
+    full = resize_center_crop(Image.open(io.BytesIO(contents)))
+    assert np.abs(pixels.astype(np.int16) - full).mean() < 2
+
+
+def test_large_jpegs_are_draft_decoded(photo, monkeypatch):
+    requested = []
+    draft = JpegImageFile.draft
+
+    def recording_draft(self, mode, size):
+        requested.append(size)
+        return draft(self, mode, size)
+
+    monkeypatch.setattr(JpegImageFile, "draft", recording_draft)
+
+    decode_for_clip(encode(photo, "JPEG"))
+    assert len(requested) == 1 and min(requested[0]) >= CLIP_IMAGE_SIZE
+
+    decode_for_clip(encode(photo, "PNG"))
+    small = decode_for_clip(encode(photo.resize((100, 80)), "JPEG"))
+    assert len(requested) == 1  # no draft for PNGs or images already below CLIP size
+    assert small.shape == (CLIP_IMAGE_SIZE, CLIP_IMAGE_SIZE, 3)
+
+
+def test_decode_for_clip_converts_to_rgb(photo):
+    assert decode_for_clip(encode(photo.convert("L"), "PNG")).shape == (CLIP_IMAGE_SIZE, CLIP_IMAGE_SIZE, 3)
+    with pytest.raises(UnidentifiedImageError):
+        decode_for_clip(b"not an image")
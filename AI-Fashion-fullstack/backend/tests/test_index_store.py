@@ -0,0 +1,127 @@
+"""Persisted index store: build, memory-mapped load and staleness checks."""
+import os
+
+import numpy as np
+import pytest
+
+from app.core import index_store
+from app.core.index_factory import IndexSpec, build_faiss_index
+from app.core.embedding_builder import LEGACY_IMAGE_OUTPUT
+from app.core.index_store import INDEX_SOURCES, MmapAnnIndex, MmapFlatIndex, build_index_store, load_index_store
+from app.core.vector_ops import normalize_rows
+
+
+@pytest.fixture
+def embeddings_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / "embeddings"
+    path.mkdir()
+    np.save(path / "text.npy", rng.normal(size=(50, 8)).astype(np.float32))
+    return path
+
+
+def test_store_roundtrip(embeddings_dir, tmp_path):
+    store_dir = tmp_path / "indexes"
+    manifest = build_index_store(embeddings_dir, store_dir, sources={"text": "text.npy"})
+    assert manifest["indexes"]["text"]["ntotal"] == 50
+
+    indexes, loaded = load_index_store(store_dir, embeddings_dir)
+    index = indexes["text"]
+    assert isinstance(index, MmapFlatIndex)
+    assert isinstance(index.vectors, np.memmap)
+    np.testing.assert_allclose(np.linalg.norm(index.vectors, axis=1), 1.0, rtol=1e-5)
+
+    raw = np.load(embeddings_dir / "text.npy")
+    _, rows = index.search(raw[:3], k=1)
+    assert rows[:, 0].tolist() == [0, 1, 2]
+
+
+def test_changed_embeddings_make_the_store_stale(embeddings_dir, tmp_path):
+    store_dir = tmp_path / "indexes"
+    build_index_store(embeddings_dir, store_dir, sources={"text": "text.npy"})
+
+    source = embeddings_dir / "text.npy"
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_index_store(store_dir, embeddings_dir) is None
+
+    # Stores shipped without their raw embeddings still load
+    source.unlink()
+    assert load_index_store(store_dir, embeddings_dir) is not None
+
+
+def test_legacy_padded_image_embeddings_are_migrated(tmp_path):
+    native = normalize_rows(np.random.default_rng(3).normal(size=(20, 512)).astype(np.float32))
+    np.save(tmp_path / LEGACY_IMAGE_OUTPUT, np.pad(native, ((0, 0), (0, 256))))
+
+    manifest = build_index_store(tmp_path, tmp_path / "indexes")
+    assert manifest["indexes"]["image"]["dim"] == 512
+    np.testing.assert_allclose(np.load(tmp_path / INDEX_SOURCES["image"]), native, atol=1e-6)
+
+
+def test_legacy_image_embeddings_that_are_not_padding_are_refused(tmp_path):
+    np.save(tmp_path / LEGACY_IMAGE_OUTPUT, np.ones((4, 768), dtype=np.float32))
+    with pytest.raises(ValueError, match="not zero-padded"):
+        build_index_store(tmp_path, tmp_path / "indexes")
+    assert not (tmp_path / INDEX_SOURCES["image"]).exists()
+
+
+def test_missing_store(tmp_path):
+    assert load_index_store(tmp_path / "missing") is None
+
+
+@pytest.mark.parametrize("selected", [3, 40])  # sparse gather / dense mask paths
+def test_masked_flat_search(selected):
+    rng = np.random.default_rng(1)
+    vectors = normalize_rows(rng.normal(size=(100, 8)).astype(np.float32))
+    mask = np.zeros(100, dtype=bool)
+    mask[rng.choice(100, selected, replace=False)] = True
+
+    scores, rows = MmapFlatIndex(vectors).search(vectors[:2], k=5, mask=mask)
+    expected = np.argsort(-(vectors[:2] @ vectors.T) + np.where(mask, 0, 10), axis=1)
+    hits = min(5, selected)
+    assert rows[:, :hits].tolist() == expected[:, :hits].tolist()
+    assert (rows[:, hits:] == -1).all()
+    np.testing.assert_allclose(scores[:, :hits], np.take_along_axis(vectors[:2] @ vectors.T, rows[:, :hits], 1),
+                               rtol=1e-5)
+
+
+@pytest.mark.parametrize("exact_rows", [30, 0])  # small selection scanned / short queries re-run
+@pytest.mark.parametrize("spec", [
+    IndexSpec("HNSW", m=8, ef_construction=40, ef_search=16),
+    IndexSpec("IVF", nlist=64, nprobe=1),
+])
+def test_selective_filter_on_ann_index_returns_k_hits(spec, exact_rows, monkeypatch):
+    monkeypatch.setattr(index_store, "_ANN_EXACT_FILTER_ROWS", exact_rows)
+    rng = np.random.default_rng(2)
+    vectors = normalize_rows(rng.normal(size=(5000, 16)).astype(np.float32))
+    index = MmapAnnIndex(build_faiss_index(vectors, spec), vectors)
+    mask = np.zeros(5000, dtype=bool)
+    mask[rng.choice(5000, 30, replace=False)] = True
+
+    queries = vectors[:5]
+    for k in (20, 50):
+        scores, rows = index.search(queries, k, mask=mask)
+        assert ((rows >= 0).sum(axis=1) == min(k, 30)).all()
+        assert mask[rows[rows >= 0]].all()
+        exact_scores, _ = MmapFlatIndex(vectors).search(queries, k, mask=mask)
+        np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+
+
+@pytest.mark.parametrize("storage", ["fp16", "int8"])
+def test_quantized_store_reranks_with_exact_scores(embeddings_dir, tmp_path, storage):
+    store_dir = tmp_path / "indexes"
+    spec = IndexSpec("Flat", storage=storage, rerank_k=20)
+    manifest = build_index_store(embeddings_dir, store_dir, sources={"text": "text.npy"}, spec=spec)
+    assert manifest["indexes"]["text"]["rerank_k"] == 20
+
+    index = load_index_store(store_dir, embeddings_dir)[0]["text"]
+    assert isinstance(index, MmapAnnIndex) and index.rerank_k == 20
+    assert load_index_store(store_dir, embeddings_dir, rerank_k=5)[0]["text"].rerank_k == 5
+
+    queries = index.vectors[:10]
+    scores, rows = index.search(queries, k=5)
+    exact_scores, exact_rows = MmapFlatIndex(index.vectors).search(queries, k=5)
+    assert rows[:, 0].tolist() == list(range(10))
+    assert np.mean([len(set(a) & set(b)) / 5 for a, b in zip(rows, exact_rows)]) >= 0.9
+    np.testing.assert_allclose(scores, np.take_along_axis(queries @ index.vectors.T, rows, 1), rtol=1e-6)
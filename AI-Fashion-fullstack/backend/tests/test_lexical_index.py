@@ -0,0 +1,70 @@
+"""LexicalIndex against a plain-Python rank_bm25.BM25Okapi reference."""
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from app.core.lexical_index import TOKENIZERS, LexicalIndex
+
+CORPUS = [
+    "Blue denim shirt for men",
+    "Red cotton shirt",
+    "blue running shoes",
+    "Black leather shirt jacket",
+    "White cotton t-shirt shirt",
+    "Navy Blue jeans",
+    "silver watch",
+]
+
+
+def bm25okapi_scores(corpus, query, k1=1.5, b=0.75, epsilon=0.25):
+    """BM25Okapi.get_scores as written in rank_bm25 (per-term loops)."""
+    n_docs = len(corpus)
+    avgdl = sum(len(doc) for doc in corpus) / n_docs
+    doc_freqs = Counter(term for doc in corpus for term in set(doc))
+    idf = {term: math.log(n_docs - freq + 0.5) - math.log(freq + 0.5) for term, freq in doc_freqs.items()}
+    floor = epsilon * sum(idf.values()) / len(idf)
+    idf = {term: floor if value < 0 else value for term, value in idf.items()}
+
+    scores = np.zeros(n_docs)
+    for term in query:
+        for i, doc in enumerate(corpus):
+            tf = doc.count(term)
+            scores[i] += idf.get(term, 0.0) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avgdl))
+    return scores
+
+
+@pytest.mark.parametrize("tokenizer", ["lowercase", "word"])
+@pytest.mark.parametrize("query", ["blue shirt", "shirt", "cotton shirt shirt", "watch", "unknown words"])
+def test_bm25_matches_bm25okapi(tokenizer, query):
+    tokenize = TOKENIZERS[tokenizer]
+    index = LexicalIndex.build(CORPUS, scheme="bm25", tokenizer=tokenizer, k1=1.2, b=0.6, epsilon=0.3)
+
+    expected = bm25okapi_scores([tokenize(doc) for doc in CORPUS], tokenize(query), k1=1.2, b=0.6, epsilon=0.3)
+    np.testing.assert_allclose(index.scores([query])[0], expected, rtol=1e-5, atol=1e-6)
+
+
+def test_search_skips_non_matching_and_masked_documents():
+    index = LexicalIndex.build(CORPUS, tokenizer="word")
+    expected = bm25okapi_scores([TOKENIZERS["word"](doc) for doc in CORPUS], ["blue"])
+
+    scores, rows = index.search(["blue"], k=5)
+    matching = np.flatnonzero(expected > 0)
+    assert rows[0][:len(matching)].tolist() == matching[np.argsort(-expected[matching])].tolist()
+    assert (rows[0][len(matching):] == -1).all()
+
+    mask = np.ones(len(CORPUS), dtype=bool)
+    mask[0] = False
+    _, rows = index.search(["blue"], k=5, mask=mask)
+    assert 0 not in rows[0]
+
+
+def test_save_load_roundtrip(tmp_path):
+    for scheme in ("bm25", "tfidf"):
+        index = LexicalIndex.build(CORPUS, scheme=scheme, fingerprint="abc")
+        index.save(tmp_path / f"{scheme}.npz")
+        loaded = LexicalIndex.load(tmp_path / f"{scheme}.npz")
+
+        assert loaded.fingerprint == "abc" and loaded.scheme == scheme
+        np.testing.assert_allclose(loaded.scores(["blue shirt"]), index.scores(["blue shirt"]))
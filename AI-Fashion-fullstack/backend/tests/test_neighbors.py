@@ -0,0 +1,49 @@
+"""Blocked neighbor computation against a brute-force scan."""
+import numpy as np
+import pytest
+
+from app.core.neighbors import compute_neighbors
+from app.core.vector_ops import normalize_rows
+
+
+def brute_force(legs, weights, k):
+    scores = sum(w * (leg @ leg.T) for leg, w in zip(legs, weights)).astype(np.float64)
+    valid = np.all([np.abs(leg).sum(axis=1) > 0 for leg in legs], axis=0)
+    scores[:, ~valid] = -np.inf
+    np.fill_diagonal(scores, -np.inf)
+
+    rows = np.full((len(scores), k), -1)
+    unit = np.zeros((len(scores), k))
+    for i in np.flatnonzero(valid):
+        order = [j for j in np.argsort(-scores[i], kind="stable") if np.isfinite(scores[i, j])][:k]
+        rows[i, :len(order)] = order
+        unit[i, :len(order)] = np.clip((scores[i, order] + 1) / 2, 0, 1)
+    return unit, rows
+
+
+@pytest.mark.parametrize("block_rows", [1, 3, 64])
+def test_matches_brute_force(block_rows):
+    rng = np.random.default_rng(1)
+    text = normalize_rows(rng.normal(size=(9, 8)))
+    image = normalize_rows(rng.normal(size=(9, 4)))
+    image[4] = 0  # product without an image
+
+    k = 8  # more than the 7 other valid rows: the tail is padded
+    for legs, weights in (([text], [1.0]), ([text, image], [0.7, 0.3])):
+        scores, rows = compute_neighbors(legs, weights, k, block_rows=block_rows)
+        expected_scores, expected_rows = brute_force(legs, weights, k)
+
+        assert scores.dtype == np.float16 and rows.dtype == np.int32
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_allclose(scores.astype(np.float32), expected_scores, atol=1e-3)
+
+
+def test_self_and_zero_rows_excluded():
+    rng = np.random.default_rng(2)
+    vectors = normalize_rows(rng.normal(size=(6, 5)))
+    vectors[2] = 0
+
+    scores, rows = compute_neighbors([vectors], [1.0], k=5, block_rows=2)
+    assert (rows[2] == -1).all() and (scores[2] == 0).all()
+    for i in range(len(rows)):
+        assert i not in rows[i] and 2 not in rows[i]
@@ -0,0 +1,86 @@
+"""ContentBasedRecommender over the persisted product matrix."""
+import json
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from app.core.catalog import CatalogStore
+from app.core.personalization import ContentBasedRecommender, PreferenceEncoder
+from app.core.vector_ops import normalize_rows
+
+
+class BagOfWordsEncoder:
+    """Deterministic stand-in for PreferenceEncoder (hashed bag of words)."""
+
+    model_name = "bag-of-words"
+    product_text = staticmethod(PreferenceEncoder.product_text)
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode_texts(self, texts, batch_size=256):
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), 64), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i, zlib.crc32(word.encode()) % 64] += 1
+        return normalize_rows(vectors)
+
+    def encode_preferences(self, preferences):
+        return self.encode_texts([" ".join(sum(preferences.values(), []))])[0]
+
+
+@pytest.fixture
+def catalog():
+    return CatalogStore(pd.DataFrame({
+        "id": [1, 2, 3, 4, 5],
+        "productDisplayName": ["Red Summer Dress", "Red Evening Dress", "Blue Denim Jeans",
+                               "Black Leather Boots", "Blue Summer Dress"],
+        "masterCategory": ["Apparel", "Apparel", "Apparel", "Footwear", "Apparel"],
+        "baseColour": ["Red", "Red", "Blue", "Black", "Blue"],
+        "gender": ["Women"] * 5,
+    }))
+
+
+def test_matrix_is_built_only_when_allowed(catalog, tmp_path):
+    path = tmp_path / "products.npy"
+    encoder = BagOfWordsEncoder()
+    with pytest.raises(FileNotFoundError, match="build_recommender_embeddings"):
+        ContentBasedRecommender(catalog, encoder, path)
+    assert encoder.encoded == 0
+
+    ContentBasedRecommender(catalog, encoder, path, build_if_missing=True)
+    assert encoder.encoded == len(catalog)
+    assert json.loads(path.with_suffix(".json").read_text())["catalog_fingerprint"] == catalog.fingerprint
+
+    recommender = ContentBasedRecommender(catalog, encoder, path)
+    assert encoder.encoded == len(catalog)  # loaded, not re-encoded
+    assert isinstance(recommender.product_matrix, np.memmap)
+
+
+def test_stale_matrix_is_rejected(catalog, tmp_path):
+    path = tmp_path / "products.npy"
+    ContentBasedRecommender(catalog, BagOfWordsEncoder(), path, build_if_missing=True)
+
+    edited = catalog.df.copy()
+    edited.loc[0, "productDisplayName"] = "Green Summer Dress"
+    with pytest.raises(FileNotFoundError, match="stale"):
+        ContentBasedRecommender(CatalogStore(edited), BagOfWordsEncoder(), path)
+
+
+def test_recommendations(catalog, tmp_path):
+    recommender = ContentBasedRecommender(catalog, BagOfWordsEncoder(), tmp_path / "products.npy",
+                                          build_if_missing=True)
+
+    results = recommender.recommend_from_favorites([{"product_id": 1}], n=2, exclude_ids=["5"])
+    assert results[0].product_id == "2"
+    assert all(r.product_id not in ("1", "5") for r in results)
+    assert [r.score for r in results] == sorted((r.score for r in results), reverse=True)
+
+    results = recommender.recommend_from_preferences({"colors": ["Blue"], "style": [], "categories": []}, n=2)
+    assert {r.product_id for r in results} == {"3", "5"}
+    assert recommender.recommend_from_favorites([{"product_id": 99}]) == []
@@ -0,0 +1,48 @@
+"""Dictionary query rewrites and their notebook-pickle warm start."""
+import pickle
+import sys
+
+import pytest
+
+from app.core.query_expansion import QueryExpander, load_query_expander
+
+
+def test_expand_replaces_one_word_per_variant():
+    expander = QueryExpander(max_variants=3)
+    assert expander.expand("  Red Dress ") == ["red dress", "crimson dress", "scarlet dress", "red gown"]
+    assert expander.expand("plain tote") == ["plain tote"]
+    assert QueryExpander(max_variants=1).expand("red dress") == ["red dress", "crimson dress"]
+
+
+def test_variants_are_cached_per_normalized_query():
+    expander = QueryExpander(max_variants=2, cache_size=1)
+    expander.expand("black boots")
+    expander.expand("BLACK boots")
+    stats = expander.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    expander.expand("blue jeans")  # evicts the least recently used query
+    assert len(expander.cache) == 1 and expander.cache.get("black boots") is None
+
+
+class NotebookExpander:
+    """Stand-in for the class the phase 5 notebook pickled from __main__."""
+
+    __module__, __qualname__ = "__main__", "QueryExpander"
+
+
+def test_load_warm_starts_from_the_notebook_pickle(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys.modules["__main__"], "QueryExpander", NotebookExpander, raising=False)
+    pickled = NotebookExpander()
+    pickled.cache = {"Summer Dress": ["Summer Dress", "Summer Gown"]}
+    path = tmp_path / "query_expander.pkl"
+    path.write_bytes(pickle.dumps(pickled))
+
+    expander = QueryExpander.load(path, max_variants=3)
+    assert expander.expand("summer dress") == ["summer dress", "summer gown"]  # from the pickle, not the tables
+    assert QueryExpander.load(tmp_path / "missing.pkl").expand("summer dress")[1] == "summer gown"
+
+
+@pytest.mark.parametrize("max_variants", [0, -1])
+def test_disabled_expander(tmp_path, max_variants):
+    assert load_query_expander(tmp_path / "query_expander.pkl", max_variants, 100) is None
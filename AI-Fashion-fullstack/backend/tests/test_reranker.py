@@ -0,0 +1,89 @@
+"""Learned second-stage reranker: features, folded scoring and ordering."""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from app.core.catalog import CatalogStore
+from app.core.reranker import CandidateBatch, LearnedReranker, load_reranker
+
+FEATURE_NAMES = ["text_similarity", "color_match", "gender_match", "baseline_rank"]
+
+
+@pytest.fixture
+def catalog():
+    return CatalogStore(pd.DataFrame({
+        "id": [10, 11, 12, 13, 14],
+        "productDisplayName": ["Blue Shirt", "Red Dress", "Red Shirt", "Black Jeans", "Red Skirt"],
+        "gender": ["Men", "Women", "Men", "Men", "Women"],
+        "masterCategory": ["Apparel"] * 5,
+        "baseColour": ["Blue", "Red", "Red", "Black", "Red"],
+    }))
+
+
+def fitted(features: np.ndarray, labels: np.ndarray):
+    scaler = StandardScaler().fit(features)
+    return scaler, LogisticRegression().fit(scaler.transform(features), labels)
+
+
+def linear_reranker(weights, names=FEATURE_NAMES) -> LearnedReranker:
+    """Reranker over an unscaled logistic model sigmoid(x @ weights)."""
+    scaler = SimpleNamespace(mean_=np.zeros(len(weights)), scale_=np.ones(len(weights)))
+    model = SimpleNamespace(coef_=np.array([weights]), intercept_=np.array([0.0]))
+    return LearnedReranker("fusion", model, scaler, names)
+
+
+def test_features(catalog):
+    reranker = linear_reranker([1.0, 1.0, 0.0, 0.0])
+    assert reranker.feature_names[-1] == "baseline_rank_normalized"  # notebook alias
+
+    candidates = [(np.array([0.9, 0.8, 0.7, 0.6]), np.array([0, 2, -1, 3]))]
+    (_, rows), = reranker.rerank(["red shirt for men"], catalog, candidates, k=10)
+    assert rows.tolist() == [2, 0, 3]  # -1 candidates dropped
+
+    batch = CandidateBatch("red shirt for men", catalog, reranker.prepare(catalog),
+                           np.array([0, 2, 3]), np.array([0.9, 0.8, 0.6]))
+    np.testing.assert_allclose(reranker.features(batch), [
+        [0.9, 0, 1, 0.05],
+        [0.8, 1, 1, 0.10],
+        [0.6, 0, 1, 0.15],
+    ], rtol=1e-6)
+
+
+def test_folded_logistic_matches_sklearn(catalog):
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.random(200), rng.integers(0, 2, 200), rng.integers(0, 2, 200), rng.random(200)])
+    scaler, model = fitted(X, (X[:, 1] + 0.3 * X[:, 0] > 0.8).astype(int))
+    reranker = LearnedReranker("fusion", model, scaler, FEATURE_NAMES)
+
+    np.testing.assert_allclose(reranker.score(X.astype(np.float32)),
+                               model.predict_proba(scaler.transform(X))[:, 1], rtol=1e-4, atol=1e-6)
+
+    timings = {}
+    similarities = np.array([0.9, 0.85, 0.8, 0.75, 0.7])
+    (probabilities, rows), = reranker.rerank(["red dress"], catalog, [(similarities, np.arange(5))], k=3,
+                                             timings=timings)
+    assert set(rows.tolist()) == {1, 2, 4}  # colour matches move up
+    assert list(probabilities) == sorted(probabilities, reverse=True)
+    assert {"rerank_features_ms", "rerank_score_ms"} <= set(timings)
+
+
+def test_booster_models_are_scored_on_scaled_features():
+    lightgbm = pytest.importorskip("lightgbm")
+    rng = np.random.default_rng(1)
+    X = rng.random((300, 4)).astype(np.float32)
+    scaler = StandardScaler().fit(X)
+    model = lightgbm.LGBMClassifier(n_estimators=10, verbose=-1).fit(scaler.transform(X), X[:, 1] > 0.5)
+    reranker = LearnedReranker("advanced", model, scaler, FEATURE_NAMES)
+    np.testing.assert_allclose(reranker.score(X), model.predict_proba(scaler.transform(X))[:, 1], rtol=1e-5)
+
+
+def test_unknown_features_and_disabled_reranker(tmp_path):
+    with pytest.raises(ValueError, match="unsupported features"):
+        linear_reranker([1.0, 1.0], ["text_similarity", "price"])
+    assert load_reranker("none", tmp_path) is None
+    with pytest.raises(ValueError, match="Unknown reranker"):
+        load_reranker("bert", tmp_path)
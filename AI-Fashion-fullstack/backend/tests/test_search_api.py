@@ -0,0 +1,94 @@
+"""Search and product endpoints against an in-memory engine (no models, no database)."""
+import json
+
+import pytest
+from fastapi import FastAPI
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import products, search_updated
+from app.core.config import settings
+from app.services.async_search import AsyncFashionSearchEngine
+
+
+@pytest.fixture
+def client(engine):
+    app = FastAPI()
+    app.include_router(search_updated.router, prefix="/api/search")
+    app.include_router(products.router, prefix="/api/products")
+    app.state.search_engine = AsyncFashionSearchEngine(engine, max_workers=2, max_concurrency=2, decode_workers=1)
+    with TestClient(app) as client:
+        yield client
+    app.state.search_engine.shutdown()
+
+
+def test_batch_search(client):
+    response = client.post("/api/search/batch", data={
+        "queries": json.dumps(["product 5", "product 9"]), "k": 3, "filters": json.dumps({"gender": "Women"})
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["queries_count"] == 2 and "search_ms" in body["timings"]
+    first, second = body["results"]
+    assert first["query"] == "product 5" and first["results_count"] == 3
+    assert first["results"][0]["product_id"] == 1005
+    assert all(r["gender"] == "Women" for entry in body["results"] for r in entry["results"])
+
+
+def test_batch_search_validation(client, monkeypatch):
+    assert client.post("/api/search/batch", data={"queries": '["ok", ""]'}).status_code == 400
+    assert client.post("/api/search/batch", data={"queries": "[]"}).status_code == 400
+    files = [("images", ("a.jpg", b"jpeg", "image/jpeg"))]
+    response = client.post("/api/search/batch", data={"queries": '["a", "b"]'}, files=files)
+    assert response.status_code == 400 and "one of each" in response.json()["detail"]
+
+    monkeypatch.setattr(settings, "search_batch_max_queries", 1)
+    assert client.post("/api/search/batch", data={"queries": '["a", "b"]'}).status_code == 413
+
+
+def test_stream_search_ndjson(client):
+    response = client.post("/api/search/stream", data={"query": "product 5", "k": 3})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["event"] for e in events] == ["results", "done"]
+    results, done = events
+    assert results["query_type"] == "text" and results["results_count"] == 3
+    assert results["results"][0]["product_id"] == 1005
+    assert done["personalized"] is False and "first_results_ms" in done["timings"]
+
+
+def test_stream_search_sse(client):
+    response = client.post("/api/search/stream", data={"query": "product 5", "k": 3, "format": "sse"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = response.text.strip().split("\n\n")
+    assert [frame.split("\n")[0] for frame in frames] == ["event: results", "event: done"]
+    assert json.loads(frames[0].split("data: ", 1)[1])["results_count"] == 3
+
+
+def test_stream_search_reports_errors_in_band(client):
+    # The stub encoder only knows "product <n>" queries, so this one fails mid-stream
+    response = client.post("/api/search/stream", data={"query": "no such product"})
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert response.status_code == 200 and [e["event"] for e in events] == ["error"]
+
+
+def test_similar_products(client):
+    response = client.get("/api/products/1007/similar", params={"k": 4, "kind": "text"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["kind"] == "text" and body["results_count"] == 4 and body["sources"] == {"neighbors": "search"}
+    assert 1007 not in [r["product_id"] for r in body["results"]]
+
+    filters = json.dumps({"gender": "Men"})
+    body = client.get("/api/products/1007/similar", params={"k": 3, "filters": filters}).json()
+    assert all(r["gender"] == "Men" for r in body["results"])
+
+
+def test_similar_products_validation(client):
+    assert client.get("/api/products/999/similar").status_code == 404
+    assert client.get("/api/products/1007/similar", params={"kind": "audio"}).status_code == 400
+    assert client.get("/api/products/1007/similar", params={"filters": '{"price": 1}'}).status_code == 400
+    assert client.get("/api/products/1007/similar", params={"k": 0}).status_code == 422
@@ -0,0 +1,190 @@
+"""FashionSearchEngine over in-memory indexes and stub encoders (no models needed)."""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.core import deadline as deadline_module
+from app.core.batching import MicroBatcher
+from app.core.cache import ResponseCache
+from app.core.deadline import Deadline
+from app.core.fusion import cosine_to_unit
+from app.core.index_store import MmapFlatIndex
+from app.core.config import settings
+from app.core.lexical_index import build_lexical_index, load_lexical_index
+from app.core.neighbors import build_neighbor_table, load_neighbor_table
+from app.core.query_expansion import QueryExpander
+from app.core.reranker import LearnedReranker
+from app.services.search_engine import QueryImage
+
+
+def test_multimodal_scores_are_exact_fusion(engine):
+    text_vectors, image_vectors = engine.ml.text_index.vectors, engine.ml.image_index.vectors
+    image = QueryImage(("clip", "upload-7"), embedding=image_vectors[7])
+    results = engine.search(text="product 7", image=image, k=5, alpha=0.6)
+
+    assert results[0].product_id == 1007 and len(results) == 5
+    rows = np.array([r.product_id - 1000 for r in results])
+    expected = (0.6 * cosine_to_unit(text_vectors[rows] @ text_vectors[7])
+                + 0.4 * cosine_to_unit(image_vectors[rows] @ image_vectors[7]))
+    np.testing.assert_allclose([r.score for r in results], expected, rtol=1e-5)
+    assert [r.score for r in results] == sorted((r.score for r in results), reverse=True)
+
+
+def test_filters_are_applied_inside_the_search(engine):
+    results = engine.search(text="product 3", k=10, filters={"gender": "Women", "color": "Blue"})
+    assert len(results) == 10
+    assert all(r.gender == "Women" and r.color == "Blue" for r in results)
+
+
+def test_search_batch_matches_single_searches(engine):
+    texts = ["product 4", "Product 9", "product 4"]
+    batch = engine.search_batch(texts=texts, k=5, filters={"gender": "Women"})
+    assert engine.ml.encoded == [["product 4", "product 9"]]  # one pass over the unique misses
+
+    for text, results in zip(texts, batch):
+        single = engine.search(text=text, k=5, filters={"gender": "Women"})
+        assert [r.product_id for r in results] == [r.product_id for r in single]
+        np.testing.assert_allclose([r.score for r in results], [r.score for r in single], rtol=1e-6)
+    assert len(engine.ml.encoded) == 1  # singles were served from the query cache
+
+    with pytest.raises(ValueError, match="one of each per query"):
+        engine.search_batch(texts=texts, images=[b"jpeg"], k=5)
+
+
+def test_format_results(engine):
+    results = engine._format_results(np.array([12, -1, 3, 10**6]), np.array([0.9, 0.8, 0.7, 0.6]),
+                                     rerank_scores=np.array([0.5, 0.4, 0.3, 0.2]))
+    assert [(r.rank, r.product_id, r.product_name) for r in results] == [
+        (1, 1012, "Product 12"), (3, 1003, "Product 3")
+    ]
+    assert [r.score for r in results] == pytest.approx([0.9, 0.7])
+    assert [r.rerank_score for r in results] == pytest.approx([0.5, 0.3])
+    assert (results[1].gender, results[1].color, results[1].category) == ("Women", "Red", "Apparel")
+    assert all(type(r.product_id) is int and type(r.score) is float for r in results)
+
+    as_dict = results[0].to_dict()
+    as_dict["score"] = 0.0
+    assert results[0].score == pytest.approx(0.9)
+    assert engine._format_results(np.array([], dtype=np.int64), np.array([])) == []
+
+
+def test_response_cache_is_dropped_when_the_index_changes(engine):
+    engine.response_cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    sources = {}
+    first = engine.search(text="product 5", k=3, sources=sources)
+    assert sources == {"response_cache": "miss"}
+    assert engine.search(text="Product 5 ", k=3, sources=sources) == first
+    assert sources == {"response_cache": "hit"}
+    engine.search(text="product 5", k=4, sources=sources)
+    assert sources == {"response_cache": "miss"}
+
+    engine.ml.text_index = MmapFlatIndex(engine.ml.text_index.vectors)  # e.g. a rebuilt store
+    engine.search(text="product 5", k=3, sources=sources)
+    assert sources == {"response_cache": "miss"}
+    assert engine.response_cache.get_stats()["invalidations"] == 1
+
+
+def test_exhausted_deadline_skips_optional_legs(engine, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(deadline_module, "time", SimpleNamespace(perf_counter=lambda: now[0]))
+    engine.response_cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    deadline = Deadline(50)
+    now[0] += 0.049
+    image = QueryImage(("clip", "upload"), pixels=np.zeros((224, 224, 3), dtype=np.uint8))
+
+    results = engine.search(text="product 5", image=image, k=3, deadline=deadline)
+    assert results[0].product_id == 1005  # text-only fallback, no image encoded
+    report = deadline.report()
+    assert "image_leg" in report["skipped"] and "ann" in report["degraded"]
+    assert len(engine.response_cache) == 0  # reduced-effort answers are not cached
+
+
+def test_reranked_results_keep_retrieval_scores(engine):
+    scaler = SimpleNamespace(mean_=np.zeros(2), scale_=np.ones(2))
+    model = SimpleNamespace(coef_=np.array([[1.0, 5.0]]), intercept_=np.array([0.0]))
+    engine.ml.reranker = LearnedReranker("fusion", model, scaler, ["text_similarity", "color_match"])
+    timings = {}
+    results = engine.search(text="red product 5", k=5, timings=timings)
+
+    assert all(r.color == "Red" for r in results)  # colour matches reranked first
+    assert [r.rerank_score for r in results] == sorted((r.rerank_score for r in results), reverse=True)
+    text_vectors = engine.ml.text_index.vectors
+    rows = np.array([r.product_id - 1000 for r in results])
+    np.testing.assert_allclose([r.score for r in results], cosine_to_unit(text_vectors[rows] @ text_vectors[5]),
+                               rtol=1e-5)
+    assert "rerank_score_ms" in timings
+
+
+def test_lexical_fusion_keeps_exact_scores(engine, tmp_path):
+    build_lexical_index(engine.ml.catalog, tmp_path)
+    engine.ml.lexical_index = load_lexical_index(tmp_path, engine.ml.catalog, scheme="bm25")
+    results = engine.search(text="product 5", k=5)
+
+    assert results[0].product_id == 1005 and results[0].fusion_score == pytest.approx(1.0)
+    fusion_scores = [r.fusion_score for r in results]
+    assert fusion_scores == sorted(fusion_scores, reverse=True)  # ordered by RRF
+    text_vectors = engine.ml.text_index.vectors
+    rows = np.array([r.product_id - 1000 for r in results])
+    np.testing.assert_allclose([r.score for r in results], cosine_to_unit(text_vectors[rows] @ text_vectors[5]),
+                               rtol=1e-5)
+
+    engine.ml.lexical_index = None
+    assert all(r.fusion_score is None for r in engine.search(text="product 5", k=5))
+
+
+def test_rewrites_share_one_encoder_pass(engine):
+    engine.ml.query_expander = QueryExpander(max_variants=2)
+    results = engine.search(text="red product 5", k=5)
+
+    assert engine.ml.encoded == [["red product 5"], ["crimson product 5", "scarlet product 5"]]
+    assert results[0].product_id == 1005 and results[0].fusion_score == pytest.approx(1.0)
+    text_vectors = engine.ml.text_index.vectors
+    rows = np.array([r.product_id - 1000 for r in results])
+    np.testing.assert_allclose([r.score for r in results], cosine_to_unit(text_vectors[rows] @ text_vectors[5]),
+                               rtol=1e-5)
+
+
+def test_similar_from_table_matches_live_search(engine, tmp_path):
+    live_sources, table_sources = {}, {}
+    live = engine.similar(1007, k=5, kind="fused", sources=live_sources)
+    assert live_sources == {"neighbors": "search"} and 1007 not in [r.product_id for r in live]
+
+    indexes = {"text": engine.ml.text_index, "image": engine.ml.image_index}
+    build_neighbor_table(indexes, engine.ml.catalog, tmp_path, k=10, alpha=settings.neighbors_alpha)
+    engine.ml.neighbors = load_neighbor_table(tmp_path, engine.ml.catalog)
+    table = engine.similar(1007, k=5, kind="fused", sources=table_sources)
+    assert table_sources == {"neighbors": "table"}
+    assert [r.product_id for r in table] == [r.product_id for r in live]
+    np.testing.assert_allclose([r.score for r in table], [r.score for r in live], atol=1e-3)  # float16 table
+
+    filtered = engine.similar(1007, k=3, kind="fused", filters={"gender": "Women"})
+    assert len(filtered) == 3 and all(r.gender == "Women" for r in filtered)
+    assert engine.similar_from_table(1007, k=20) is None  # deeper than the table: live search
+    with pytest.raises(KeyError):
+        engine.similar(999, k=5)
+
+
+def test_cross_modal_leg_fuses_clip_text_scores(engine, monkeypatch):
+    monkeypatch.setattr(settings, "cross_modal_weight", 0.3)
+    text_vectors, image_vectors = engine.ml.text_index.vectors, engine.ml.image_index.vectors
+    clip_encoded = []
+
+    def encode_clip_texts(texts):
+        # "product 12" has product 12's image vector as CLIP text features
+        clip_encoded.append(list(texts))
+        return np.vstack([image_vectors[int(text.split()[-1])] for text in texts])
+
+    engine.ml.clip_text_batcher = MicroBatcher("clip_text", encode_clip_texts, max_wait_ms=1)
+    try:
+        results = engine.search(text="product 8", k=5)
+        engine.search(text="product 8", k=5)
+    finally:
+        engine.ml.clip_text_batcher.close()
+
+    assert clip_encoded == [["product 8"]]  # second search hit the query cache
+    rows = np.array([r.product_id - 1000 for r in results])
+    expected = (0.7 * cosine_to_unit(text_vectors[rows] @ text_vectors[8])
+                + 0.3 * cosine_to_unit(image_vectors[rows] @ image_vectors[8]))
+    np.testing.assert_allclose([r.score for r in results], expected, rtol=1e-5)
+    assert results[0].product_id == 1008
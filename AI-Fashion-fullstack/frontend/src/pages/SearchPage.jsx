@@ -1,7 +1,7 @@
 import { useState } from 'react';
 import { useAuth } from '../contexts/AuthContext';
 import { Search, Image as ImageIcon, Sparkles, Heart } from 'lucide-react';
-import api from '../services/api';
+import api, { streamSearch } from '../services/api';
 
 export default function SearchPage() {
   const { user } = useAuth();
@@ -23,56 +23,38 @@ export default function SearchPage() {
 
   const handleSearch = async (e) => {
     e.preventDefault();
-    setLoading(true);
 
+    // ✅ One streaming endpoint for all search types - FormData
+    const formData = new FormData();
+    if (searchType === 'text' && query) {
+      formData.append('query', query);
+    } else if (searchType === 'image' && imageFile) {
+      formData.append('image', imageFile);
+    } else if (searchType === 'multimodal' && query && imageFile) {
+      formData.append('query', query);
+      formData.append('image', imageFile);
+      formData.append('alpha', '0.7');
+    } else {
+      alert('Please provide required inputs');
+      return;
+    }
+    formData.append('k', '20');
+    formData.append('personalized', personalized);
+
+    setLoading(true);
     try {
-      if (searchType === 'text') {
-        // ✅ Text search - URLSearchParams kullan
-        const params = new URLSearchParams();
-        params.append('query', query);
-        params.append('k', '20');
-        params.append('personalized', personalized);
-        
-        const response = await api.post('/search/text', params, {
-          headers: { 'Content-Type': 'application/x-www-form-urlencoded' }
-        });
-        setResults(response.data.results || []);
-        
-      } else if (searchType === 'image' && imageFile) {
-        // ✅ Image search - FormData
-        const formData = new FormData();
-        formData.append('image', imageFile);
-        formData.append('k', '20');
-        formData.append('personalized', personalized);
-        
-        const response = await api.post('/search/image', formData, {
-          headers: { 'Content-Type': 'multipart/form-data' }
-        });
-        setResults(response.data.results || []);
-        
-      } else if (searchType === 'multimodal' && query && imageFile) {
-        // ✅ Multimodal search - FormData
-        const formData = new FormData();
-        formData.append('query', query);
-        formData.append('image', imageFile);
-        formData.append('k', '20');
-        formData.append('alpha', '0.7');
-        formData.append('personalized', personalized);
-        
-        const response = await api.post('/search/multimodal', formData, {
-          headers: { 'Content-Type': 'multipart/form-data' }
-        });
-        setResults(response.data.results || []);
-        
-      } else {
-        alert('Please provide required inputs');
-        setLoading(false);
-        return;
-      }
+      // Raw results render as soon as the index returns; personalized ranking replaces them
+      await streamSearch(formData, (frame) => {
+        if (frame.event === 'results' || frame.event === 'personalized') {
+          setResults(frame.results || []);
+          setLoading(false);
+        } else if (frame.event === 'error') {
+          throw new Error(frame.detail);
+        }
+      });
     } catch (error) {
       console.error('Search error:', error);
-      console.log('Error details:', error.response?.data);
-      alert('Search failed: ' + (error.response?.data?.error || error.response?.data?.detail || error.message));
+      alert('Search failed: ' + error.message);
     } finally {
       setLoading(false);
     }
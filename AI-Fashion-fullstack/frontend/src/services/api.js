@@ -79,4 +79,47 @@ api.interceptors.response.use(
   }
 );
 
+/**
+ * Streaming search (POST /search/stream, NDJSON).
+ * Calls onEvent({ event, ... }) for each frame as it arrives:
+ * "results" (raw top-k), "personalized" (re-ranked), then "done" or "error".
+ */
+export async function streamSearch(formData, onEvent) {
+  const headers = {};
+  const token = localStorage.getItem('access_token');
+  if (token) {
+    headers.Authorization = `Bearer ${token}`;
+  }
+
+  const response = await fetch(`${API_BASE_URL}/search/stream`, {
+    method: 'POST',
+    headers,
+    body: formData,
+  });
+  if (!response.ok) {
+    const error = await response.json().catch(() => ({}));
+    throw new Error(error.detail || `Search failed (${response.status})`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    for (const line of lines) {
+      if (line.trim()) {
+        onEvent(JSON.parse(line));
+      }
+    }
+  }
+  if (buffer.trim()) {
+    onEvent(JSON.parse(buffer));
+  }
+}
+
 export default api;
@@ -11,6 +11,12 @@ from typing import List, Dict
 import streamlit as st
 import os
 
+# FAISS index_factory string, e.g. "Flat", "HNSW32,Flat", "IVF1024,PQ64"
+INDEX_FACTORY = os.getenv("FAISS_INDEX_FACTORY", "Flat")
+# Default HNSW beam width / IVF cells probed
+INDEX_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "128"))
+INDEX_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+
 @st.cache_resource
 def load_models():
     """Load models (cached)"""
@@ -51,9 +57,7 @@ def load_data():
         text_embeddings = np.load(embeddings_path)
         
         # Create FAISS index
-        dimension = text_embeddings.shape[1]
-        index = faiss.IndexFlatIP(dimension)
-        index.add(text_embeddings.astype('float32'))
+        index = build_index(text_embeddings.astype('float32'))
         
         return {
             'products': products_df,
@@ -70,6 +74,24 @@ def load_data():
         st.info("💡 Make sure you've created the Hugging Face dataset with your data files")
         return None
 
+def build_index(embeddings: np.ndarray) -> faiss.Index:
+    """Build the inner-product index described by FAISS_INDEX_FACTORY"""
+    n, dimension = embeddings.shape
+    index = faiss.index_factory(dimension, INDEX_FACTORY, faiss.METRIC_INNER_PRODUCT)
+    
+    if not index.is_trained:
+        sample = embeddings[np.random.default_rng(42).choice(n, min(n, 100_000), replace=False)]
+        index.train(sample)
+    index.add(embeddings)
+    
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = INDEX_EF_SEARCH
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = INDEX_NPROBE
+    
+    return index
+
 def search_products(query: str, k: int = 10) -> List[Dict]:
     """
     Search for products using v2.4.5 multimodal system
@@ -106,6 +128,8 @@ def search_products(query: str, k: int = 10) -> List[Dict]:
     results = []
     
     for idx, score in zip(indices[0], scores[0]):
+        if idx < 0:
+            continue
         product = products_df.iloc[idx]
         
         # Construct image path
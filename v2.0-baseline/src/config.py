@@ -193,6 +193,7 @@ class APIConfig:
     # Caching
     enable_cache: bool = True
     cache_ttl: int = 3600  # seconds
+    embedding_cache_size: int = 10000  # max cached query embeddings (LRU)
     
     # Logging
     log_level: str = "INFO"
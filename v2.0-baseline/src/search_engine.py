@@ -18,7 +18,10 @@ from dataclasses import dataclass
 from sentence_transformers import SentenceTransformer
 from transformers import CLIPModel, CLIPProcessor
 from PIL import Image
+from collections import OrderedDict
 import re
+import threading
+import time
 
 try:
     from schema import normalize_text
@@ -29,6 +32,36 @@ except ImportError:
         return text
 
 
+def _get_config():
+    """Global project config (imported lazily: config.py resolves paths on import)"""
+    try:
+        from config import get_config
+    except ImportError:
+        from .config import get_config
+    return get_config()
+
+
+def search_parameters(index: faiss.Index, ef_search: Optional[int] = None,
+                      nprobe: Optional[int] = None, selector=None) -> Optional[faiss.SearchParameters]:
+    """Per-request FAISS search parameters (None when the index defaults apply)"""
+    if ef_search is None and nprobe is None and selector is None:
+        return None
+    
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = ef_search or base.hnsw.efSearch
+    elif isinstance(base, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = min(nprobe or base.nprobe, base.nlist)
+    else:
+        params = faiss.SearchParameters()
+    
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
 @dataclass
 class QueryIntent:
     """Query intent classification"""
@@ -105,10 +138,24 @@ class QueryUnderstanding:
         )
 
 
+# Filter key -> catalog column. Color keeps substring semantics ("blue" also
+# matches "Navy Blue"); the other attributes match exactly (case-insensitive).
+FILTER_COLUMNS = {
+    'gender': 'gender',
+    'color': 'baseColour',
+    'category': 'masterCategory',
+    'article_type': 'articleType',
+    'season': 'season',
+    'usage': 'usage',
+}
+SUBSTRING_FILTERS = {'color'}
+
+
 class FashionSearchEngine:
     """Production-grade fashion search engine"""
     
-    def __init__(self, index, products_df, text_model, clip_model, clip_processor, query_understander, device="cpu"):
+    def __init__(self, index, products_df, text_model, clip_model, clip_processor, query_understander, device="cpu",
+                 cache_size: Optional[int] = None, cache_ttl: Optional[float] = None):
         self.index = index
         self.df = products_df
         self.text_model = text_model
@@ -116,11 +163,78 @@ class FashionSearchEngine:
         self.clip_processor = clip_processor
         self.query_understander = query_understander
         self.device = device
-        self._embedding_cache = {}
+        # Bounded LRU: normalized query -> (stored_at, embedding), sized from APIConfig
+        # unless given; the lock covers API handlers encoding from several threads
+        if cache_size is None or cache_ttl is None:
+            api_config = _get_config().api
+            cache_size = api_config.embedding_cache_size if cache_size is None else cache_size
+            cache_ttl = api_config.cache_ttl if cache_ttl is None else cache_ttl
+        self._embedding_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        
+        # Dictionary-encoded filter columns; per-value bitmaps are cached on first use
+        self._filter_codes = {}
+        self._filter_values = {}
+        for column in FILTER_COLUMNS.values():
+            if column in self.df.columns:
+                values = pd.Categorical(self.df[column].fillna('Unknown').astype(str))
+                self._filter_codes[column] = values.codes
+                self._filter_values[column] = [str(v).lower() for v in values.categories]
+        self._bitmaps = {}
+    
+    def _bitmap(self, key: str, value: str) -> np.ndarray:
+        column = FILTER_COLUMNS[key]
+        value = str(value).lower()
+        cache_key = (key, value)
+        if cache_key not in self._bitmaps:
+            if key in SUBSTRING_FILTERS:
+                codes = [c for c, v in enumerate(self._filter_values[column]) if value in v]
+            else:
+                codes = [c for c, v in enumerate(self._filter_values[column]) if value == v]
+            self._bitmaps[cache_key] = np.isin(self._filter_codes[column], codes)
+        return self._bitmaps[cache_key]
+    
+    def filter_mask(self, filters: Dict) -> Optional[np.ndarray]:
+        """Row mask for {key: value or [values]} filters (OR within a key, AND across keys)."""
+        mask = None
+        for key, value in (filters or {}).items():
+            if FILTER_COLUMNS.get(key) not in self._filter_codes:
+                raise ValueError(f"Unsupported filter: {key}")
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            key_mask = np.zeros(len(self.df), dtype=bool)
+            for v in values:
+                key_mask |= self._bitmap(key, v)
+            mask = key_mask if mask is None else mask & key_mask
+        return mask
+    
+    def _cache_get(self, key: str) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            entry = self._embedding_cache.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.cache_ttl:
+                if entry is not None:
+                    del self._embedding_cache[key]
+                self.cache_stats['misses'] += 1
+                return None
+            self._embedding_cache.move_to_end(key)
+            self.cache_stats['hits'] += 1
+            return entry[1]
+    
+    def _cache_put(self, key: str, emb: np.ndarray):
+        with self._cache_lock:
+            self._embedding_cache[key] = (time.monotonic(), emb)
+            self._embedding_cache.move_to_end(key)
+            while len(self._embedding_cache) > self.cache_size:
+                self._embedding_cache.popitem(last=False)
+                self.cache_stats['evictions'] += 1
     
     def encode_text(self, text: str) -> np.ndarray:
-        if text in self._embedding_cache:
-            return self._embedding_cache[text]
+        text = normalize_text(text, mode="standard")
+        cached = self._cache_get(text)
+        if cached is not None:
+            return cached
         
         mpnet_emb = self.text_model.encode([text], convert_to_numpy=True)[0]
         inputs = self.clip_processor(text=[text], return_tensors="pt", padding=True, truncation=True)
@@ -129,7 +243,7 @@ class FashionSearchEngine:
             clip_text_emb = self.clip_model.get_text_features(**inputs).cpu().numpy()[0]
         
         combined = np.concatenate([mpnet_emb, clip_text_emb])
-        self._embedding_cache[text] = combined
+        self._cache_put(text, combined)
         return combined
     
     def encode_image(self, image: Image.Image) -> np.ndarray:
@@ -138,9 +252,15 @@ class FashionSearchEngine:
         with torch.no_grad():
             return self.clip_model.get_image_features(**inputs).cpu().numpy()[0]
     
-    def search(self, text=None, image=None, k=50, text_weight=0.7, apply_filters=True) -> List[SearchResult]:
+    def search(self, text=None, image=None, k=50, text_weight=0.7, apply_filters=True,
+               filters: Optional[Dict] = None, ef_search: Optional[int] = None,
+               nprobe: Optional[int] = None) -> List[SearchResult]:
         intent = self.query_understander.understand_query(text=text, image=image)
         
+        # Explicit filters override those detected in the query text
+        active_filters = dict(intent.filters or {}) if apply_filters else {}
+        active_filters.update(filters or {})
+        
         if text:
             text = intent.normalized_text
         
@@ -160,21 +280,23 @@ class FashionSearchEngine:
         hybrid_emb = hybrid_emb / np.linalg.norm(hybrid_emb)
         query_vec = hybrid_emb.astype('float32').reshape(1, -1)
         
-        retrieve_k = k * 3 if apply_filters and intent.has_filters else k
-        distances, indices = self.index.search(query_vec, retrieve_k)
+        # Filters are pushed into FAISS as an id selector, so k matches come back
+        # whenever k rows pass the filter (no over-fetch + post-filter).
+        # ef_search / nprobe tune HNSW / IVF indexes per request.
+        mask = self.filter_mask(active_filters)
+        selector = None
+        if mask is not None:
+            bitmap = np.packbits(mask, bitorder='little')
+            selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+        params = search_parameters(self.index, ef_search=ef_search, nprobe=nprobe, selector=selector)
+        distances, indices = self.index.search(query_vec, k, params=params)
         
         results = []
         for idx, dist in zip(indices[0], distances[0]):
+            if idx < 0:
+                continue
             product = self.df.iloc[idx]
             
-            if apply_filters and intent.has_filters:
-                if 'color' in intent.filters:
-                    if intent.filters['color'] not in str(product.get('baseColour', '')).lower():
-                        continue
-                if 'gender' in intent.filters:
-                    if intent.filters['gender'] not in str(product.get('gender', '')).lower():
-                        continue
-            
             similarity = 1 - dist
             results.append(SearchResult(
                 rank=len(results) + 1,
@@ -46,7 +46,11 @@ class FashionRAGPipeline:
         encoder_model: str = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
         llm_model: str = "llama-3.3-70b-versatile",
         temperature: float = 0.1,
-        max_tokens: int = 500
+        max_tokens: int = 500,
+        index_factory: str = "Flat",
+        index_path: Optional[str] = None,
+        ef_search: int = 128,
+        nprobe: int = 16
     ):
         """
         Initialize the RAG pipeline.
@@ -59,6 +63,12 @@ class FashionRAGPipeline:
             llm_model: GROQ LLM model name
             temperature: LLM temperature (0-1)
             max_tokens: Max tokens for LLM response
+            index_factory: FAISS index_factory string ("Flat", "HNSW32,Flat",
+                "IVF1024,Flat", "IVF1024,PQ64", ...), inner-product metric
+            index_path: Optional index file; loaded (memory-mapped) when it
+                matches the embeddings, otherwise built and written there
+            ef_search: Default HNSW search beam width
+            nprobe: Default IVF cells probed per query
         """
         print("Initializing FashionRAGPipeline...")
         
@@ -67,7 +77,10 @@ class FashionRAGPipeline:
             'encoder_model': encoder_model,
             'llm_model': llm_model,
             'temperature': temperature,
-            'max_tokens': max_tokens
+            'max_tokens': max_tokens,
+            'index_factory': index_factory,
+            'ef_search': ef_search,
+            'nprobe': nprobe
         }
         
         # Load data
@@ -82,10 +95,9 @@ class FashionRAGPipeline:
         # Setup encoder
         self.encoder = SentenceTransformer(encoder_model)
         
-        # Build FAISS index
+        # Build (or load) FAISS index
         dimension = self.embeddings_norm.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)
-        self.index.add(self.embeddings_norm.astype('float32'))
+        self.index = self._load_or_build_index(index_path)
         
         # Setup LLM client
         self.llm_client = Groq(api_key=groq_api_key)
@@ -101,6 +113,38 @@ class FashionRAGPipeline:
         print(f"   Products: {len(self.metadata):,}")
         print(f"   Index: {self.index.ntotal:,} vectors ({dimension}d)")
     
+    def _load_or_build_index(self, index_path: Optional[str]) -> faiss.Index:
+        """Load a persisted index if it matches the embeddings, else build (and save) one."""
+        n, dimension = self.embeddings_norm.shape
+        
+        if index_path and Path(index_path).exists():
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            if index.ntotal == n and index.d == dimension:
+                return index
+            print(f"⚠️ Index at {index_path} does not match embeddings, rebuilding")
+        
+        vectors = self.embeddings_norm.astype('float32')
+        index = faiss.index_factory(dimension, self.config['index_factory'], faiss.METRIC_INNER_PRODUCT)
+        if not index.is_trained:
+            sample = vectors[np.random.default_rng(42).choice(n, min(n, 100_000), replace=False)]
+            index.train(sample)
+        index.add(vectors)
+        
+        if index_path:
+            Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+            faiss.write_index(index, index_path)
+        return index
+    
+    def _search_params(self, ef_search: Optional[int] = None,
+                       nprobe: Optional[int] = None) -> Optional[faiss.SearchParameters]:
+        """HNSW / IVF search parameters, falling back to the configured defaults."""
+        base = faiss.downcast_index(self.index)
+        if isinstance(base, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(efSearch=ef_search or self.config['ef_search'])
+        if isinstance(base, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(nprobe=min(nprobe or self.config['nprobe'], base.nlist))
+        return None
+    
     def _create_documents(self) -> List[str]:
         """Create text documents from product metadata."""
         docs = []
@@ -114,13 +158,16 @@ Season: {row.get('season', 'All')}."""
             docs.append(doc)
         return docs
     
-    def retrieve(self, query: str, k: int = 5) -> Dict:
+    def retrieve(self, query: str, k: int = 5, ef_search: Optional[int] = None,
+                 nprobe: Optional[int] = None) -> Dict:
         """
         Retrieve relevant products using vector search.
         
         Args:
             query: Natural language query
             k: Number of products to retrieve
+            ef_search: HNSW beam width for this query (index default if None)
+            nprobe: IVF cells to probe for this query (index default if None)
             
         Returns:
             Dict with indices, scores, products
@@ -129,16 +176,18 @@ Season: {row.get('season', 'All')}."""
         query_emb = self.encoder.encode([query])[0]
         query_emb = query_emb / np.linalg.norm(query_emb)
         
-        # Search FAISS
+        # Search FAISS (per-query ANN parameters when given)
         scores, indices = self.index.search(
             query_emb.reshape(1, -1).astype('float32'),
-            k
+            k,
+            params=self._search_params(ef_search, nprobe)
         )
         
+        hits = [(i, s) for i, s in zip(indices[0], scores[0]) if i >= 0]
         return {
-            'indices': indices[0].tolist(),
-            'scores': scores[0].tolist(),
-            'products': [self.product_docs[i] for i in indices[0]]
+            'indices': [int(i) for i, _ in hits],
+            'scores': [float(s) for _, s in hits],
+            'products': [self.product_docs[i] for i, _ in hits]
         }
     
     def augment(self, query: str, retrieved: Dict) -> str: